@@ -1,23 +1,47 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import os
+import re
+import sys
+import contextlib
+from io import StringIO
+import subprocess
+import functools
 import threading
+import multiprocessing
 import time
 import uuid
+import json
+import math
+import bisect
+import shutil
+import hashlib
+import sqlite3
 import tempfile
 import logging
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 
+import numpy as np
+from PIL import Image
+
 # MoviePy import (editor 없이)
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from moviepy.audio.io.AudioFileClip import AudioFileClip
 from moviepy.video.VideoClip import ImageClip, TextClip
 from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
 from moviepy import concatenate_videoclips, concatenate_audioclips
+from moviepy.tools import find_extension
+from proglog import ProgressBarLogger
+from imageio.v2 import imread
 
 # MoviePy 설정 - 2.x.x 호환 with 안전한 FFmpeg 설정
 import moviepy.config as config
+import moviepy.video.io.ffmpeg_reader as ffmpeg_reader
+import moviepy.video.io.ffmpeg_writer as ffmpeg_writer
+import moviepy.audio.io.readers as audio_readers
 
 # FFmpeg 바이너리 안전하게 설정
 try:
@@ -86,6 +110,7 @@ logging.getLogger('imageio_ffmpeg').setLevel(logging.ERROR)
 # subprocess stdout/stderr 오류 방지 데코레이터
 def handle_subprocess_errors(func):
     """subprocess stdout/stderr 관련 오류를 처리하는 데코레이터"""
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
@@ -123,6 +148,8 @@ def handle_subprocess_errors(func):
             raise e
     return wrapper
 
+from moviepy.audio.AudioClip import AudioClip
+
 # CompositeAudioClip import 시도
 try:
     from moviepy.audio.AudioClip import CompositeAudioClip
@@ -143,48 +170,129 @@ try:
 except ImportError:
     volumex = None
 
+# 작업별로 스타일마다 처음 성공한 TextClip 생성 단계 (같은 작업에서 실패할 시도를 반복하지 않도록 기억)
+# 특정 텍스트의 글리프/폰트 문제로 낮아진 단계가 다른 작업에 번지지 않도록 작업 단위로만 유지하고 최근 것만 보관
+text_clip_tiers = OrderedDict()  # (task_id, 스타일) -> 단계
+TEXT_CLIP_TIERS_SIZE = 256
+
 # 안전한 TextClip 생성 함수
-def create_text_clip_safe(text, font_size=50, color='white', stroke_color='black', stroke_width=2):
+def create_text_clip_safe(text, font_size=50, color='white', stroke_color='black', stroke_width=2, font=None):
     """폰트 오류에 안전한 TextClip 생성 함수"""
-    try:
+    attempts = [
         # 첫 번째 시도: stroke 효과와 함께
-        return TextClip(
-            text,
+        ('stroke 효과로', lambda: TextClip(
+            font=font,
+            text=text,
             font_size=font_size,
             color=color,
             stroke_color=stroke_color,
             stroke_width=stroke_width
-        )
-    except Exception as e1:
-        print(f"Warning: stroke 효과로 자막 생성 실패: {e1}")
+        )),
+        # 두 번째 시도: stroke 없이
+        ('기본 설정으로', lambda: TextClip(font=font, text=text, font_size=font_size, color=color)),
+        # 세 번째 시도: 최소한의 설정
+        ('최소한의 설정으로', lambda: TextClip(font=font, text=text, font_size=font_size)),
+        # 마지막 시도: 매우 기본적인 설정
+        ('매우 기본적인 설정으로', lambda: TextClip(text=text))
+    ]
+    # 작업에 연결되지 않은 호출(기존 API)은 기억하지 않음
+    task_id = tracer.current()
+    key = (task_id, (font, font_size, color, stroke_color, stroke_width))
+    last_error = None
+    for tier in range(text_clip_tiers.get(key, 0) if task_id else 0, len(attempts)):
+        description, attempt = attempts[tier]
         try:
-            # 두 번째 시도: stroke 없이
-            return TextClip(
-                text,
-                font_size=font_size,
-                color=color
-            )
-        except Exception as e2:
-            print(f"Warning: 기본 설정으로 자막 생성 실패: {e2}")
-            try:
-                # 세 번째 시도: 최소한의 설정
-                return TextClip(text, font_size=font_size)
-            except Exception as e3:
-                print(f"Error: 자막 생성 완전 실패: {e3}")
-                # 마지막 시도: 매우 기본적인 설정
-                return TextClip(text)
+            clip = attempt()
+        except Exception as e:
+            print(f"Warning: {description} 자막 생성 실패: {e}")
+            last_error = e
+            continue
+        if task_id and tier > 0:
+            with subtitle_cache_lock:
+                text_clip_tiers[key] = tier
+                text_clip_tiers.move_to_end(key)
+                while len(text_clip_tiers) > TEXT_CLIP_TIERS_SIZE:
+                    text_clip_tiers.popitem(last=False)
+        return clip
+    print(f"Error: 자막 생성 완전 실패: {last_error}")
+    raise last_error
+
+# 렌더링된 자막 비트맵 캐시 (작업 간 공유)
+SUBTITLE_CACHE_SIZE = int(os.environ.get('SUBTITLE_CACHE_SIZE', 512))
+subtitle_raster_cache = OrderedDict()
+subtitle_cache_lock = threading.Lock()
+
+def rasterize_subtitle(text, font_size=50, color='white', stroke_color='black', stroke_width=2, font=None):
+    """자막을 (RGB 배열, 알파 배열)로 렌더링 - 같은 텍스트/스타일은 캐시에서 재사용"""
+    key = (text, font, font_size, color, stroke_color, stroke_width)
+    with subtitle_cache_lock:
+        raster = subtitle_raster_cache.get(key)
+        if raster is not None:
+            subtitle_raster_cache.move_to_end(key)
+            return raster
+    
+    txt_clip = create_text_clip_safe(text, font_size, color, stroke_color, stroke_width, font)
+    try:
+        rgb = np.asarray(txt_clip.get_frame(0), dtype=np.uint8)
+        if txt_clip.mask is not None:
+            alpha = np.asarray(txt_clip.mask.get_frame(0), dtype=np.float32)[:, :, None]
+        else:
+            alpha = np.ones(rgb.shape[:2] + (1,), dtype=np.float32)
+    finally:
+        txt_clip.close()
+    rgb.setflags(write=False)
+    alpha.setflags(write=False)
+    
+    with subtitle_cache_lock:
+        subtitle_raster_cache[key] = (rgb, alpha)
+        while len(subtitle_raster_cache) > SUBTITLE_CACHE_SIZE:
+            subtitle_raster_cache.popitem(last=False)
+    return rgb, alpha
+
+class SubtitleOverlay:
+    """자막 비트맵을 표시 구간의 프레임에만, 자막 영역(화면 하단 중앙)에만 합성하는 프레임 필터
+    
+    CompositeVideoClip은 자막마다 프레임 전체를 RGBA로 변환해 합성하므로
+    자막이 많은 긴 영상에서는 이 방식이 훨씬 가벼움
+    """
+    def __init__(self, entries):
+        # entries: [(시작, 끝, rgb, alpha), ...]
+        self.entries = sorted(entries, key=lambda entry: entry[0])
+        self.starts = [entry[0] for entry in self.entries]
+    
+    def __call__(self, get_frame, t):
+        frame = get_frame(t)
+        active = [entry for entry in self.entries[:bisect.bisect_right(self.starts, t)] if t < entry[1]]
+        if not active:
+            return frame
+        
+        # 리더가 캐시한 프레임을 건드리지 않도록 복사본에 합성
+        frame = np.array(frame, dtype=np.uint8, copy=True)
+        frame_height, frame_width = frame.shape[:2]
+        for _, _, rgb, alpha in active:
+            height, width = rgb.shape[:2]
+            x, y = (frame_width - width) // 2, frame_height - height
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + width, frame_width), min(y + height, frame_height)
+            if x0 >= x1 or y0 >= y1:
+                continue
+            region = frame[y0:y1, x0:x1].astype(np.float32)
+            source = rgb[y0 - y:y1 - y, x0 - x:x1 - x]
+            weight = alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+            frame[y0:y1, x0:x1] = (region + (source - region) * weight + 0.5).astype(np.uint8)
+        return frame
 
 # 안전한 VideoFileClip 로딩 함수
 @handle_subprocess_errors
-def safe_load_video(filepath):
-    """안전한 비디오 파일 로딩"""
+def safe_load_video(filepath, target_resolution=None):
+    """안전한 비디오 파일 로딩 (target_resolution=(너비, 높이)이면 ffmpeg가 디코딩 단계에서 크기 조정)"""
     try:
-        return VideoFileClip(filepath)
+        return VideoFileClip(filepath, target_resolution=target_resolution)
     except Exception as e:
         print(f"Warning: 비디오 로딩 실패: {e}")
         # 오디오 없이 로딩 시도
         try:
-            return VideoFileClip(filepath, audio=False)
+            return VideoFileClip(filepath, audio=False, target_resolution=target_resolution)
         except Exception as e2:
             print(f"Error: 오디오 없이도 로딩 실패: {e2}")
             raise e2
@@ -199,14 +307,126 @@ def safe_load_audio(filepath):
         print(f"Error: 오디오 로딩 실패: {e}")
         raise e
 
+# stdout/stderr 리다이렉션 상태 (여러 스레드가 동시에 저장해도 원래 스트림을 잃지 않도록 참조 카운트로 관리)
+stdio_redirect_lock = threading.Lock()
+stdio_redirect_state = {'depth': 0, 'stdout': None, 'stderr': None}
+
+@contextlib.contextmanager
+def redirect_stdio():
+    """표준 출력/에러를 임시로 문자열 버퍼로 리다이렉션"""
+    with stdio_redirect_lock:
+        if stdio_redirect_state['depth'] == 0:
+            # 표준 출력/에러 임시 저장
+            stdio_redirect_state['stdout'] = sys.stdout
+            stdio_redirect_state['stderr'] = sys.stderr
+            sys.stdout = StringIO()
+            sys.stderr = StringIO()
+        stdio_redirect_state['depth'] += 1
+    try:
+        yield
+    finally:
+        with stdio_redirect_lock:
+            stdio_redirect_state['depth'] -= 1
+            if stdio_redirect_state['depth'] == 0:
+                # 표준 출력/에러 복원
+                sys.stdout = stdio_redirect_state['stdout']
+                sys.stderr = stdio_redirect_state['stderr']
+
+class RenderCancelled(Exception):
+    """작업이 취소되어 인코딩을 중단할 때 진행 로거가 발생시키는 예외"""
+    pass
+
+class TaskProgressLogger(ProgressBarLogger):
+    """MoviePy 저장 진행 막대(proglog)를 TaskManager 진행상황에 연결하는 로거
+    
+    오디오 청크(chunk)와 프레임(frame_index) 카운터를 progress_range 안의 단계로 바꿔 보고하고,
+    갱신될 때마다 취소/일시정지를 확인함. 취소되면 RenderCancelled로 인코딩 루프를 빠져나가며,
+    이때 MoviePy writer가 ffmpeg 입력을 닫아 프로세스가 바로 종료됨
+    """
+    report_interval = 0.5
+    audio_share = 0.1  # 오디오를 먼저 인코딩하는 경우 그 구간이 차지하는 비율
+    
+    def __init__(self, task_id, progress_range=None, message="비디오 저장 중..."):
+        super().__init__()
+        self.task_id = task_id
+        self.progress_range = progress_range
+        self.message = message
+        self.audio_written = False
+        self.last_report = 0
+    
+    def check_task(self):
+        """취소되었으면 RenderCancelled, 일시정지 중이면 재개될 때까지 대기"""
+        if task_manager.is_cancelled(self.task_id):
+            raise RenderCancelled(self.task_id)
+        task_manager.wait_if_paused(self.task_id)
+        if task_manager.is_cancelled(self.task_id):
+            raise RenderCancelled(self.task_id)
+    
+    def bars_callback(self, bar, attr, value, old_value=None):
+        if attr != 'index' or bar not in ('chunk', 'frame_index'):
+            return
+        self.check_task()
+        total = self.bars[bar].get('total') or 0
+        if not total:
+            return
+        if bar == 'chunk':
+            self.audio_written = True
+            fraction = self.audio_share * value / total
+        else:
+            start = self.audio_share if self.audio_written else 0.0
+            fraction = start + (1.0 - start) * value / total
+        self.report(min(1.0, fraction))
+    
+    def report(self, fraction):
+        now = time.time()
+        if self.progress_range is None or (now - self.last_report < self.report_interval and fraction < 1.0):
+            return
+        self.last_report = now
+        start_step, end_step = self.progress_range
+        task_manager.update_progress(
+            self.task_id,
+            start_step + int((end_step - start_step) * fraction),
+            f"{self.message} {int(fraction * 100)}%"
+        )
+
+class AbortableVideoWriter(ffmpeg_writer.FFMPEG_VideoWriter):
+    """작업 취소(RenderCancelled)로 빠져나올 때는 남은 프레임을 마저 인코딩하지 않고 ffmpeg를 바로 종료
+    
+    기본 writer는 입력을 닫고 ffmpeg가 끝날 때까지 기다리므로, 인코더에 쌓인 프레임을
+    모두 처리하느라 취소 후에도 몇 초간 CPU를 계속 사용함
+    """
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and issubclass(exc_type, RenderCancelled) and self.proc:
+            self.proc.kill()
+            try:
+                self.close()
+            except OSError:
+                # 종료된 프로세스의 입력 버퍼를 비우다 생기는 파이프 오류는 무시
+                self.proc.wait()
+                self.proc = None
+            return False
+        return super().__exit__(exc_type, exc_value, traceback)
+
+# ffmpeg_write_video가 모듈 전역에서 writer 클래스를 찾으므로 교체
+ffmpeg_writer.FFMPEG_VideoWriter = AbortableVideoWriter
+
 # 안전한 비디오 저장 함수
 @handle_subprocess_errors
-def safe_write_videofile(clip, output_path, **kwargs):
-    """안전한 비디오 저장 함수 - stdout/stderr 오류 방지"""
-    # MoviePy 2.x.x: 임시 오디오 파일 경로를 temp 폴더로 강제 지정
-    if 'temp_audiofile' in kwargs:
-        temp_filename = kwargs['temp_audiofile']
-        if not os.path.isabs(temp_filename) and not temp_filename.startswith('temp'):
+def safe_write_videofile(clip, output_path, faststart=True, profile=None, **kwargs):
+    """안전한 비디오 저장 함수 - stdout/stderr 오류 방지
+    
+    logger로 TaskProgressLogger를 넘기면 작업 취소 시 인코딩을 중단하고 False를 반환 (완료 시 True).
+    faststart면 moov 정보를 파일 앞에 두어 다 받기 전에 재생을 시작할 수 있게 함
+    (나중에 스트림 복사로 합칠 중간 파일은 False로 한 번 더 쓰는 비용을 생략).
+    profile(ENCODER_PROFILES 이름)을 주면 그 프리셋/CRF/튜닝으로 인코딩하고 bitrate는 상한으로만 사용.
+    threads를 따로 주지 않으면 동시에 인코딩 중인 작업 수에 맞춰 스레드 예산을 나눠 받음
+    """
+    # MoviePy 2.x.x: 임시 오디오 파일을 항상 temp 폴더의 고유한 이름으로 지정
+    # (지정하지 않으면 현재 디렉터리에 <출력 이름>TEMP_MPY_wvf_snd.*를 만들고, 중단/실패 시 그대로 남음)
+    if kwargs.get('audio', True) is True and clip.audio is not None:
+        audio_ext = find_extension(kwargs.get('audio_codec') or 'aac')
+        temp_filename = kwargs.get('temp_audiofile') or f'temp-audio-{uuid.uuid4().hex[:8]}.{audio_ext}'
+        if not os.path.isabs(temp_filename):
             kwargs['temp_audiofile'] = os.path.join(config.TEMP_FOLDER, os.path.basename(temp_filename))
 
     # MoviePy 2.x.x에서 stdout/stderr 오류 방지
@@ -219,68 +439,424 @@ def safe_write_videofile(clip, output_path, **kwargs):
     
     # 기본값과 사용자 제공 kwargs 병합
     final_kwargs = {**default_kwargs, **kwargs}
+    if profile is not None:
+        preset, profile_params = encoder_options(profile, final_kwargs.pop('bitrate', None))
+        final_kwargs['preset'] = preset
+        final_kwargs['ffmpeg_params'] = list(final_kwargs.get('ffmpeg_params') or []) + profile_params
+    faststart_params = []
+    if faststart and os.path.splitext(output_path)[1].lower() in ('.mp4', '.mov', '.m4v'):
+        faststart_params = ['-movflags', '+faststart']
+        final_kwargs['ffmpeg_params'] = list(final_kwargs.get('ffmpeg_params') or []) + faststart_params
     
     try:
-        # stdout/stderr 리다이렉션으로 오류 방지
-        import sys
-        from io import StringIO
-        
-        # 표준 출력/에러 임시 저장
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        
-        # 임시로 출력을 문자열 버퍼로 리다이렉션
-        sys.stdout = StringIO()
-        sys.stderr = StringIO()
-        
+        with encode_slot() as threads, tracer.span('encode', 'encode', output=os.path.basename(output_path),
+                                                   profile=profile or 'default') as span_args:
+            final_kwargs.setdefault('threads', threads)
+            span_args['threads'] = final_kwargs['threads']
+            started = time.perf_counter()
+            try:
+                # stdout/stderr 리다이렉션으로 오류 방지
+                with redirect_stdio():
+                    clip.write_videofile(output_path, **final_kwargs)
+            except RenderCancelled:
+                raise
+            except Exception as e:
+                print(f"Error: 비디오 저장 실패: {e}")
+                # 대안 방법으로 재시도
+                try:
+                    print("기본 설정으로 재시도 중...")
+                    # 최소한의 설정으로 재시도 (취소 확인을 위해 로거는 유지)
+                    clip.write_videofile(
+                        output_path,
+                        codec='libx264',
+                        audio_codec='aac',
+                        ffmpeg_params=faststart_params or None,
+                        threads=final_kwargs['threads'],
+                        temp_audiofile=final_kwargs.get('temp_audiofile'),
+                        logger=final_kwargs['logger']
+                    )
+                except RenderCancelled:
+                    raise
+                except Exception as e2:
+                    print(f"Error: 재시도도 실패: {e2}")
+                    raise e2
+            record_encode(profile or 'default', clip.duration * (final_kwargs.get('fps') or clip.fps or 0),
+                          time.perf_counter() - started, final_kwargs['threads'])
+    except RenderCancelled:
+        remove_partial_output(output_path, final_kwargs.get('temp_audiofile'))
+        return False
+    except Exception:
+        remove_partial_output(output_path, final_kwargs.get('temp_audiofile'))
+        raise
+    return True
+
+def remove_partial_output(*paths):
+    """중단되거나 실패한 인코딩의 출력과 임시 오디오 파일 정리 (성공하면 MoviePy가 임시 오디오를 지움)"""
+    for path in paths:
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# ffmpeg -i 출력 파싱용 정규식
+FFMPEG_DURATION_RE = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+FFMPEG_BITRATE_RE = re.compile(r'Duration: .*?bitrate: (\d+) kb/s')
+FFMPEG_STREAM_RE = re.compile(r'Stream #\d+:\d+\S*: (Video|Audio): (.*)')
+FFMPEG_ROTATION_RE = re.compile(r'(?:rotation of (-?[\d.]+) degrees|rotate\s*:\s*(-?\d+))')
+FFMPEG_SHOWINFO_PTS_RE = re.compile(r'\] n:\s*\d+ pts:\s*-?\d+\s+pts_time:(-?[\d.]+)')
+
+def split_stream_fields(text):
+    """ffmpeg 스트림 설명을 괄호 밖의 쉼표 기준으로 분리"""
+    fields, depth, current = [], 0, ''
+    for char in text:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        if char == ',' and depth == 0:
+            fields.append(current.strip())
+            current = ''
+        else:
+            current += char
+    if current.strip():
+        fields.append(current.strip())
+    return fields
+
+def read_ffmpeg_infos(filepath):
+    """ffmpeg -i 출력(미디어 정보 텍스트)을 그대로 반환"""
+    result = subprocess.run(
+        [config.FFMPEG_BINARY, '-hide_banner', '-i', filepath],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, errors='replace', timeout=60
+    )
+    output = result.stderr
+    if 'Input #' not in output:
+        last_line = output.strip().splitlines()[-1] if output.strip() else ''
+        raise IOError(f"미디어 정보를 읽을 수 없습니다: {last_line}")
+    return output
+
+def probe_media(filepath):
+    """ffmpeg -i 한 번으로 미디어 정보(길이, 해상도, fps, 코덱 등)를 조회"""
+    return parse_media_infos(read_ffmpeg_infos(filepath))
+
+def read_keyframe_times(filepath):
+    """첫 영상 스트림의 키프레임 시각(초) 목록 (키프레임만 디코딩해 showinfo로 조회, ffprobe 불필요)"""
+    result = subprocess.run(
+        [config.FFMPEG_BINARY, '-hide_banner', '-nostats', '-skip_frame', 'nokey', '-i', filepath,
+         '-map', '0:v:0', '-vf', 'showinfo', '-fps_mode', 'passthrough', '-f', 'null', '-'],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True, errors='replace'
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"키프레임 조회 실패: {result.stderr.strip()[-500:]}")
+    return [float(value) for value in FFMPEG_SHOWINFO_PTS_RE.findall(result.stderr)]
+
+def parse_media_infos(output):
+    """ffmpeg -i 출력에서 길이, 해상도, fps, 코덱, 회전, 오디오 정보를 추출"""
+    info = {
+        'duration': None, 'bitrate': None,
+        'video': False, 'width': None, 'height': None, 'fps': None,
+        'video_codec': None, 'video_profile': None, 'pix_fmt': None, 'rotation': 0,
+        'audio': False, 'audio_codec': None, 'audio_sample_rate': None, 'audio_channels': None
+    }
+    match = FFMPEG_DURATION_RE.search(output)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = FFMPEG_BITRATE_RE.search(output)
+    if match:
+        info['bitrate'] = int(match.group(1))
+    match = FFMPEG_ROTATION_RE.search(output)
+    if match:
+        info['rotation'] = int(float(match.group(1) or match.group(2))) % 360
+    
+    for stream_type, description in FFMPEG_STREAM_RE.findall(output):
+        fields = split_stream_fields(description)
+        codec_field = fields[0] if fields else ''
+        codec = codec_field.split(' ')[0]
+        profile = re.match(r'\S+ \(([^)]*)\)', codec_field)
+        if stream_type == 'Video' and not info['video']:
+            info['video'] = True
+            info['video_codec'] = codec
+            info['video_profile'] = profile.group(1) if profile else None
+            if len(fields) > 1:
+                info['pix_fmt'] = fields[1].split('(')[0]
+            size = re.search(r'(\d{2,5})x(\d{2,5})', description)
+            if size:
+                info['width'], info['height'] = int(size.group(1)), int(size.group(2))
+            fps = re.search(r'([\d.]+)(k?) (?:fps|tbr)', description)
+            if fps:
+                info['fps'] = float(fps.group(1)) * (1000 if fps.group(2) else 1)
+        elif stream_type == 'Audio' and not info['audio']:
+            info['audio'] = True
+            info['audio_codec'] = codec
+            rate = re.search(r'(\d+) Hz', description)
+            if rate:
+                info['audio_sample_rate'] = int(rate.group(1))
+            if len(fields) > 2:
+                info['audio_channels'] = fields[2]
+    return info
+
+def run_ffmpeg(args, task_id=None, duration=None, progress_range=None, message=""):
+    """ffmpeg를 직접 실행 - 진행상황을 TaskManager에 반영하고 취소되면 프로세스를 종료
+    
+    취소로 중단되면 False, 정상 완료 시 True를 반환 (실패 시 RuntimeError)
+    """
+    with tracer.span('ffmpeg', 'ffmpeg', task_id=task_id, output=os.path.basename(str(args[-1]))):
+        cmd = [config.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-nostats',
+               '-progress', 'pipe:1', '-y'] + list(args)
+        process = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            text=True, errors='replace'
+        )
         try:
-            clip.write_videofile(output_path, **final_kwargs)
+            for line in process.stdout:
+                if task_id and task_manager.is_cancelled(task_id):
+                    process.kill()
+                    process.wait()
+                    return False
+                key, _, value = line.strip().partition('=')
+                if key != 'out_time_us' or not (task_id and duration and progress_range):
+                    continue
+                try:
+                    done = min(1.0, int(value) / 1_000_000 / duration)
+                except ValueError:
+                    continue
+                start_step, end_step = progress_range
+                task_manager.update_progress(
+                    task_id,
+                    start_step + int((end_step - start_step) * done),
+                    f"{message} {int(done * 100)}%" if message else ""
+                )
+            process.wait()
+            error_output = process.stderr.read()
         finally:
-            # 표준 출력/에러 복원
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
-            
-    except Exception as e:
-        print(f"Error: 비디오 저장 실패: {e}")
-        # 대안 방법으로 재시도
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if process.returncode != 0:
+            raise RuntimeError(f"ffmpeg 실행 실패: {error_output.strip()[-500:]}")
+        return True
+
+# 스트림 복사로 이어붙일 수 있는 코덱 (MP4 컨테이너 기준)
+STREAM_COPY_VIDEO_CODECS = {'h264', 'hevc'}
+STREAM_COPY_AUDIO_CODECS = {'aac', 'mp3'}
+
+def plan_stream_copy_concat(filepaths):
+    """입력 영상들이 재인코딩 없이 이어붙일 수 있는지 확인
+    
+    코덱/프로파일/해상도/fps/픽셀 포맷/회전/오디오 구성이 모두 같으면
+    각 파일의 정보 목록을, 아니면 None을 반환
+    """
+    infos = []
+    for filepath in filepaths:
         try:
-            print("기본 설정으로 재시도 중...")
-            # 최소한의 설정으로 재시도
-            clip.write_videofile(
-                output_path,
-                codec='libx264',
-                audio_codec='aac'
-            )
-        except Exception as e2:
-            print(f"Error: 재시도도 실패: {e2}")
-            raise e2
+            entry = get_indexed_entry(filepath)
+            infos.append(entry['info'] if entry is not None else probe_media(filepath))
+        except Exception as e:
+            print(f"Warning: 스트림 복사 판단용 정보 조회 실패: {e}")
+            return None
+    
+    keys = ('video_codec', 'video_profile', 'width', 'height', 'fps', 'pix_fmt', 'rotation',
+            'audio', 'audio_codec', 'audio_sample_rate', 'audio_channels')
+    first = infos[0]
+    if not first['video'] or not first['duration'] or first['video_codec'] not in STREAM_COPY_VIDEO_CODECS:
+        return None
+    if first['audio'] and first['audio_codec'] not in STREAM_COPY_AUDIO_CODECS:
+        return None
+    for info in infos[1:]:
+        if not info['duration'] or any(info[key] != first[key] for key in keys):
+            return None
+    return infos
+
+def concat_stream_copy(filepaths, output_path, task_id=None, duration=None, progress_range=None):
+    """ffmpeg concat demuxer로 재인코딩 없이 영상 이어붙이기"""
+    list_path = os.path.join(config.TEMP_FOLDER, f'concat-{uuid.uuid4().hex[:8]}.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for filepath in filepaths:
+            escaped = os.path.abspath(filepath).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        return run_ffmpeg(
+            ['-f', 'concat', '-safe', '0', '-i', list_path,
+             '-map', '0', '-c', 'copy', '-movflags', '+faststart', output_path],
+            task_id=task_id, duration=duration, progress_range=progress_range,
+            message="비디오를 이어붙이는 중..."
+        )
+    finally:
+        try:
+            os.remove(list_path)
+        except OSError:
+            pass
 
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# 작업당 초당 최대 진행상황 이벤트 수 (0이면 제한 없음)
+app.config['TASK_PROGRESS_RATE'] = float(os.environ.get('TASK_PROGRESS_RATE', 4))
+
+def task_room(task_id):
+    """작업 이벤트를 받을 클라이언트들이 들어가는 SocketIO 방 이름"""
+    return f'task:{task_id}'
+
+class TaskEventEmitter:
+    """작업 이벤트를 해당 작업의 방으로만 보내는 전용 전송 스레드
+    
+    TaskManager는 lock 안에서 이벤트를 넣기만 하고 실제 전송은 이 스레드가 lock 밖에서 함.
+    task_progress는 작업별로 최신 값만 남겨 초당 max_rate번까지만 보내고,
+    상태/완료/오류 이벤트는 합치지 않되 그 작업의 밀린 진행상황을 먼저 보내 최종 상태가 항상 전달됨
+    """
+    def __init__(self, max_rate):
+        self.interval = 1.0 / max_rate if max_rate > 0 else 0.0
+        self.cond = threading.Condition()
+        self.events = deque()          # (이벤트, 데이터) - 순서대로 전송
+        self.pending_progress = {}     # task_id -> 아직 보내지 않은 최신 진행상황
+        self.last_sent = {}            # task_id -> 마지막 진행상황 전송 시각
+        self.thread = None
+        self.counters = {'published': 0, 'coalesced': 0, 'emitted': 0}
+    
+    def publish(self, event, data, coalesce=False):
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.counters['published'] += 1
+            if coalesce:
+                if data['task_id'] in self.pending_progress:
+                    self.counters['coalesced'] += 1
+                self.pending_progress[data['task_id']] = data
+            else:
+                self.events.append((event, data))
+            self.cond.notify()
+    
+    def _next_batch(self):
+        """보낼 차례가 된 이벤트 목록 (없으면 다음 전송 시각까지 대기)"""
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                batch = []
+                while self.events:
+                    event, data = self.events.popleft()
+                    progress = self.pending_progress.pop(data['task_id'], None)
+                    if progress is not None:
+                        batch.append(('task_progress', progress))
+                        self.last_sent[data['task_id']] = now
+                    batch.append((event, data))
+                for task_id in list(self.pending_progress):
+                    if now - self.last_sent.get(task_id, 0) >= self.interval:
+                        batch.append(('task_progress', self.pending_progress.pop(task_id)))
+                        self.last_sent[task_id] = now
+                # 제한 시간이 지난 기록은 없는 것과 같으므로 정리
+                for task_id in [task_id for task_id, sent in self.last_sent.items()
+                                if now - sent >= self.interval and task_id not in self.pending_progress]:
+                    del self.last_sent[task_id]
+                if batch:
+                    self.counters['emitted'] += len(batch)
+                    return batch
+                timeout = None
+                if self.pending_progress:
+                    timeout = max(0.0, min(self.last_sent[task_id] for task_id in self.pending_progress) + self.interval - now)
+                self.cond.wait(timeout)
+    
+    def _run(self):
+        while True:
+            for event, data in self._next_batch():
+                try:
+                    socketio.emit(event, data, to=task_room(data['task_id']))
+                except Exception as e:
+                    print(f"Warning: 작업 이벤트 전송 실패 ({event}): {e}")
+    
+    def stats(self):
+        with self.cond:
+            return {**self.counters, 'pending': len(self.events) + len(self.pending_progress)}
+
 # 작업 상태 관리
 class TaskManager:
     def __init__(self):
         self.tasks = {}
-        self.lock = threading.Lock()
+        # cancel_task 등에서 lock을 잡은 채 set_status를 호출하므로 재진입 가능한 lock 사용
+        self.lock = threading.RLock()
+        self.events = TaskEventEmitter(app.config['TASK_PROGRESS_RATE'])
+        self.store = None  # 상태 변화를 기록할 TaskStore (워커 프로세스에서는 부모가 기록)
     
-    def create_task(self, task_id, task_type, total_steps=100):
+    def new_task(self, task_id, task_type, total_steps, status):
+        return {
+            'id': task_id,
+            'type': task_type,
+            'status': status,  # queued, running, paused, completed, cancelled, error
+            'progress': 0,
+            'total_steps': total_steps,
+            'current_step': 0,
+            'start_time': time.time(),
+            'estimated_time': None,
+            'message': '작업을 시작합니다...',
+            'queue_position': None,
+            'result_event': None,  # 늦게 구독한 클라이언트에게 보낼 완료/오류 이벤트
+            'cancel_flag': threading.Event(),
+            'pause_flag': threading.Event()
+        }
+    
+    def create_task(self, task_id, task_type, total_steps=100, status='running'):
         with self.lock:
-            self.tasks[task_id] = {
-                'id': task_id,
-                'type': task_type,
-                'status': 'running',  # running, paused, completed, cancelled, error
-                'progress': 0,
-                'total_steps': total_steps,
-                'current_step': 0,
-                'start_time': time.time(),
-                'estimated_time': None,
-                'message': '작업을 시작합니다...',
-                'cancel_flag': threading.Event(),
-                'pause_flag': threading.Event()
-            }
-        return self.tasks[task_id]
+            task = self.tasks.get(task_id)
+            if task is None:
+                task = self.new_task(task_id, task_type, total_steps, status)
+                self.tasks[task_id] = task
+            else:
+                # 대기열에서 꺼내진 작업: 취소/일시정지 플래그는 그대로 유지
+                task.update({
+                    'type': task_type,
+                    'status': 'paused' if task['pause_flag'].is_set() else status,
+                    'progress': 0,
+                    'total_steps': total_steps,
+                    'current_step': 0,
+                    'start_time': time.time(),
+                    'estimated_time': None,
+                    'message': '작업을 시작합니다...',
+                    'queue_position': None
+                })
+        self.persist(task_id)
+        return task
+    
+    def persist(self, task_id):
+        """현재 상태를 작업 저장소에 기록 (lock 밖에서 디스크에 씀)"""
+        if self.store is None:
+            return
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return
+            status, message, progress = task['status'], task['message'], task['progress']
+        try:
+            self.store.update_status(task_id, status, message, progress)
+        except Exception as e:
+            print(f"Warning: 작업 상태 저장 실패 ({task_id}): {e}")
+    
+    def restore_task(self, record):
+        """작업 저장소에서 읽은 끝난 작업을 조회용으로 메모리에 복원 (저장소에는 다시 쓰지 않음)"""
+        task = self.new_task(record['task_id'], record['type'], 100, record['status'])
+        task.update({
+            'progress': record['progress'],
+            'current_step': record['progress'],
+            'message': record['message'],
+            'result_event': record['result']
+        })
+        with self.lock:
+            self.tasks.setdefault(record['task_id'], task)
+    
+    def set_queue_position(self, task_id, position):
+        with self.lock:
+            if task_id in self.tasks:
+                task = self.tasks[task_id]
+                task['queue_position'] = position
+                task['message'] = f'대기열에서 차례를 기다리는 중입니다 ({position}번째)'
+                self.events.publish('task_status', {
+                    'task_id': task_id,
+                    'status': task['status'],
+                    'message': task['message'],
+                    'queue_position': position
+                })
     
     def update_progress(self, task_id, current_step, message=""):
         with self.lock:
@@ -298,16 +874,8 @@ class TaskManager:
                     remaining_steps = task['total_steps'] - current_step
                     task['estimated_time'] = remaining_steps * time_per_step
                 
-                # 클라이언트에게 진행상황 전송
-                socketio.emit('task_progress', {
-                    'task_id': task_id,
-                    'progress': task['progress'],
-                    'current_step': current_step,
-                    'total_steps': task['total_steps'],
-                    'message': task['message'],
-                    'estimated_time': task['estimated_time'],
-                    'status': task['status']
-                })
+                # 클라이언트에게 진행상황 전송 (작업별로 합쳐서 전송)
+                self.events.publish('task_progress', self.progress_event(task_id), coalesce=True)
     
     def set_status(self, task_id, status, message=""):
         with self.lock:
@@ -315,29 +883,76 @@ class TaskManager:
                 self.tasks[task_id]['status'] = status
                 if message:
                     self.tasks[task_id]['message'] = message
-                socketio.emit('task_status', {
+                self.events.publish('task_status', {
                     'task_id': task_id,
                     'status': status,
                     'message': message
                 })
+        self.persist(task_id)
+    
+    def progress_event(self, task_id):
+        task = self.tasks[task_id]
+        return {
+            'task_id': task_id,
+            'progress': task['progress'],
+            'current_step': task['current_step'],
+            'total_steps': task['total_steps'],
+            'message': task['message'],
+            'estimated_time': task['estimated_time'],
+            'status': task['status']
+        }
+    
+    def emit_event(self, event, data):
+        """작업 결과 이벤트(task_completed/task_error 등)를 작업 방으로 전송"""
+        with self.lock:
+            task = self.tasks.get(data['task_id'])
+            is_result = task is not None and event in ('task_completed', 'task_error')
+            if is_result:
+                # 늦게 구독한 클라이언트에게 다시 보내기 위해 보관
+                task['result_event'] = (event, data)
+        if is_result and self.store is not None:
+            try:
+                self.store.record_result(data['task_id'], event, data)
+            except Exception as e:
+                print(f"Warning: 작업 결과 저장 실패 ({data['task_id']}): {e}")
+        self.events.publish(event, data)
+    
+    def snapshot_events(self, task_id):
+        """새로 구독한 클라이언트에게 보낼 현재 상태 이벤트 목록"""
+        with self.lock:
+            task = self.tasks.get(task_id)
+            if task is None:
+                return []
+            events = [
+                ('task_progress', self.progress_event(task_id)),
+                ('task_status', {'task_id': task_id, 'status': task['status'], 'message': task['message'],
+                                 'queue_position': task['queue_position']})
+            ]
+            if task['result_event']:
+                events.append(task['result_event'])
+            return events
     
+    # 플래그만 lock 안에서 바꾸고 상태 기록(persist의 디스크 쓰기 포함)은 update_progress처럼 lock 밖에서
     def cancel_task(self, task_id):
         with self.lock:
-            if task_id in self.tasks:
-                self.tasks[task_id]['cancel_flag'].set()
-                self.set_status(task_id, 'cancelled', '작업이 취소되었습니다.')
+            if task_id not in self.tasks:
+                return
+            self.tasks[task_id]['cancel_flag'].set()
+        self.set_status(task_id, 'cancelled', '작업이 취소되었습니다.')
     
     def pause_task(self, task_id):
         with self.lock:
-            if task_id in self.tasks:
-                self.tasks[task_id]['pause_flag'].set()
-                self.set_status(task_id, 'paused', '작업이 일시정지되었습니다.')
+            if task_id not in self.tasks:
+                return
+            self.tasks[task_id]['pause_flag'].set()
+        self.set_status(task_id, 'paused', '작업이 일시정지되었습니다.')
     
     def resume_task(self, task_id):
         with self.lock:
-            if task_id in self.tasks:
-                self.tasks[task_id]['pause_flag'].clear()
-                self.set_status(task_id, 'running', '작업을 재개합니다.')
+            if task_id not in self.tasks:
+                return
+            self.tasks[task_id]['pause_flag'].clear()
+        self.set_status(task_id, 'running', '작업을 재개합니다.')
     
     def is_cancelled(self, task_id):
         return task_id in self.tasks and self.tasks[task_id]['cancel_flag'].is_set()
@@ -352,69 +967,1840 @@ class TaskManager:
 
 task_manager = TaskManager()
 
+class MetricsRegistry:
+    """Prometheus 텍스트 형식(/metrics)으로 내보내는 메트릭 저장소
+    
+    카운터와 히스토그램은 호출 시점에 누적하고, 작업 수/대기열 길이/메모리처럼 현재 값만 의미 있는
+    게이지는 수집 함수(collector)가 내보낼 때마다 계산함
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = OrderedDict()  # 이름 -> {'type', 'help', 'buckets', 'series': {라벨: 값}}
+        self.collectors = []
+    
+    def counter(self, name, help_text):
+        self.metrics[name] = {'type': 'counter', 'help': help_text, 'buckets': None, 'series': {}}
+    
+    def histogram(self, name, help_text, buckets):
+        self.metrics[name] = {'type': 'histogram', 'help': help_text, 'buckets': tuple(buckets), 'series': {}}
+    
+    def collector(self, func):
+        """func()는 (이름, 종류, 설명, [(라벨 dict, 값)]) 목록을 반환"""
+        self.collectors.append(func)
+        return func
+    
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.metrics[name]['series']
+            series[key] = series.get(key, 0) + value
+    
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            metric = self.metrics[name]
+            state = metric['series'].get(key)
+            if state is None:
+                state = metric['series'][key] = [[0] * len(metric['buckets']), 0.0, 0]
+            for i, bound in enumerate(metric['buckets']):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+    
+    @staticmethod
+    def format_labels(labels):
+        if not labels:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+        return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+    
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, metric in self.metrics.items():
+                lines += [f'# HELP {name} {metric["help"]}', f'# TYPE {name} {metric["type"]}']
+                for labels, state in sorted(metric['series'].items()):
+                    if metric['type'] == 'counter':
+                        lines.append(f'{name}{self.format_labels(labels)} {state}')
+                        continue
+                    counts, total, count = state
+                    for bound, bucket_count in zip(metric['buckets'], counts):
+                        lines.append(f'{name}_bucket{self.format_labels(labels + (("le", repr(float(bound))),))} {bucket_count}')
+                    lines.append(f'{name}_bucket{self.format_labels(labels + (("le", "+Inf"),))} {count}')
+                    lines.append(f'{name}_sum{self.format_labels(labels)} {total}')
+                    lines.append(f'{name}_count{self.format_labels(labels)} {count}')
+        for collect in self.collectors:
+            try:
+                for name, kind, help_text, samples in collect():
+                    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+                    lines += [f'{name}{self.format_labels(tuple(sorted(labels.items())))} {value}' for labels, value in samples]
+            except Exception as e:
+                print(f"Warning: 메트릭 수집 실패 ({collect.__name__}): {e}")
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+metrics.counter('video_editor_tasks_finished_total', '끝난 렌더 작업 수 (작업 종류, 최종 상태별)')
+metrics.histogram('video_editor_render_duration_seconds', '대기열에서 꺼낸 뒤 렌더 작업이 끝날 때까지 걸린 시간',
+                  (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+metrics.histogram('video_editor_queue_wait_seconds', '작업이 대기열에서 기다린 시간',
+                  (0.1, 1, 5, 10, 30, 60, 300, 600, 1800))
+metrics.histogram('video_editor_stage_duration_seconds', '렌더 단계별 소요 시간 (load, concatenate, audio_mix, subtitle, encode)',
+                  (0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800))
+metrics.histogram('video_editor_encode_fps', '완료된 인코딩의 실제 fps (출력 프레임 / 인코딩 시간, 인코딩 프로필별)',
+                  (1, 5, 10, 24, 30, 60, 120, 240, 480, 960))
+metrics.counter('video_editor_upload_bytes_total', '받은 업로드 데이터 (single: 단일 요청, chunked: 분할 업로드)')
+metrics.counter('video_editor_leaked_processes_total', '작업이 끝날 때까지 실행 중이어서 강제로 종료한 하위 프로세스 수')
+metrics.histogram('video_editor_upload_request_seconds', '업로드 요청(단일 업로드 전체 또는 청크 하나) 처리 시간',
+                  (0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+
+# 작업별 구간 기록: 메모리에 보관할 작업 수(0이면 기록 안 함), 작업당 최대 구간 수, 샘플링 프로파일러 간격(초)
+app.config['TRACE_MAX_TASKS'] = int(os.environ.get('TRACE_MAX_TASKS', 100))
+app.config['TRACE_MAX_EVENTS'] = int(os.environ.get('TRACE_MAX_EVENTS', 10000))
+app.config['PROFILE_SAMPLE_INTERVAL'] = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.01))
+
+class StackSampler:
+    """등록된 스레드들의 파이썬 호출 스택을 일정 간격으로 모으는 샘플링 프로파일러
+    
+    결과는 접힌 스택('바깥;...;안쪽' -> 샘플 수)이라 flamegraph.pl이나 speedscope에서 바로 열 수 있음
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.threads = set()  # threading.get_ident() 값
+        self.counts = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+    
+    def start(self):
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        return self.counts
+    
+    @staticmethod
+    def frame_name(frame):
+        code = frame.f_code
+        return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self.threads):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(self.frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    key = ';'.join(reversed(stack))
+                    self.counts[key] = self.counts.get(key, 0) + 1
+
+class TaskTracer:
+    """작업별 구간(span) 기록 - Chrome trace event JSON으로 내보냄 (chrome://tracing, ui.perfetto.dev)
+    
+    구간은 현재 스레드에 연결된(bind) 작업에 붙음. 시각은 perf_counter(Linux에서는 프로세스 간에
+    공유되는 CLOCK_MONOTONIC) 기준이라 워커 프로세스에서 기록한 구간도 같은 시간 축에 놓임.
+    최근 max_tasks개 작업만 메모리에 보관하므로 서버를 재시작하면 사라짐
+    """
+    def __init__(self, max_tasks, max_events):
+        self.max_tasks = max_tasks
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.traces = OrderedDict()  # 작업 ID -> {'events', 'threads', 'dropped', 'profile'}
+        self.local = threading.local()
+        self.profile_requests = set()  # 실행될 때 샘플링 프로파일러를 붙일 작업 ID
+        self.samplers = {}  # 작업 ID -> 실행 중인 StackSampler
+    
+    def current(self):
+        """이 스레드에 연결된 작업 ID"""
+        return getattr(self.local, 'task_id', None)
+    
+    @contextlib.contextmanager
+    def bind(self, task_id):
+        """이 스레드에서 기록하는 구간을 task_id에 붙임 (구간 병렬 인코딩 스레드 등에서 사용)"""
+        previous = self.current()
+        self.local.task_id = task_id
+        ident = threading.get_ident()
+        sampler = self.samplers.get(task_id) if previous != task_id else None
+        if sampler is not None:
+            sampler.threads.add(ident)
+        try:
+            yield
+        finally:
+            self.local.task_id = previous
+            if sampler is not None:
+                sampler.threads.discard(ident)
+    
+    def request_profile(self, task_id):
+        with self.lock:
+            self.profile_requests.add(task_id)
+    
+    def take_profile_request(self, task_id):
+        """task_id에 프로파일러가 요청되어 있었는지 (요청은 한 번만 사용)"""
+        with self.lock:
+            if task_id in self.profile_requests:
+                self.profile_requests.discard(task_id)
+                return True
+            return False
+    
+    @contextlib.contextmanager
+    def task(self, task_id, name, sample=False):
+        """작업 실행 전체를 최상위 구간으로 기록 (sample이면 실행하는 동안 샘플링 프로파일러를 붙임)"""
+        sampler = None
+        if sample:
+            sampler = self.samplers[task_id] = StackSampler(app.config['PROFILE_SAMPLE_INTERVAL'])
+            sampler.start()
+        try:
+            with self.bind(task_id), self.span(name, 'task', sampled=sample):
+                yield
+        finally:
+            if sampler is not None:
+                self.samplers.pop(task_id, None)
+                self.save_profile(task_id, sampler.stop())
+    
+    @contextlib.contextmanager
+    def span(self, name, category='stage', task_id=None, **args):
+        """with 블록을 구간으로 기록 (task_id가 없으면 현재 스레드의 작업, 둘 다 없으면 기록 안 함)
+        
+        블록 안에서 반환된 args에 값을 추가할 수 있고, 예외로 빠져나가면 예외 이름을 error로 남김
+        """
+        task_id = task_id or self.current()
+        started = time.perf_counter()
+        try:
+            yield args
+        except BaseException as e:
+            args['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(task_id, name, category, started, time.perf_counter() - started, args)
+    
+    def record(self, task_id, name, category, started, duration, args=None):
+        """perf_counter 기준 started부터 duration초 동안의 구간 기록"""
+        if task_id is None or self.max_tasks <= 0:
+            return
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round(started * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': thread.native_id,
+            'args': args or {}
+        }
+        self.add(task_id, event, thread.name)
+    
+    def entry(self, task_id):
+        """task_id의 기록 (없으면 만들고 오래된 작업부터 정리, lock을 잡은 채 호출)"""
+        trace = self.traces.get(task_id)
+        if trace is None:
+            trace = self.traces[task_id] = {'events': [], 'threads': {}, 'dropped': 0, 'profile': None}
+            while len(self.traces) > self.max_tasks:
+                self.traces.popitem(last=False)
+        return trace
+    
+    def add(self, task_id, event, thread_name):
+        with self.lock:
+            trace = self.entry(task_id)
+            trace['threads'][(event['pid'], event['tid'])] = thread_name
+            if len(trace['events']) >= self.max_events:
+                trace['dropped'] += 1
+                return
+            trace['events'].append(event)
+    
+    def save_profile(self, task_id, counts):
+        with self.lock:
+            self.entry(task_id)['profile'] = counts
+    
+    def profile(self, task_id):
+        """샘플링 프로파일러 결과 {접힌 스택: 샘플 수} (없으면 None)"""
+        with self.lock:
+            trace = self.traces.get(task_id)
+            return dict(trace['profile']) if trace and trace['profile'] is not None else None
+    
+    def export(self, task_id):
+        """Chrome trace event 형식 dict (기록이 없으면 None), 시각은 첫 구간 기준 마이크로초"""
+        with self.lock:
+            trace = self.traces.get(task_id)
+            if trace is None:
+                return None
+            events = list(trace['events'])
+            threads = dict(trace['threads'])
+            dropped = trace['dropped']
+        origin = min((event['ts'] for event in events), default=0)
+        metadata = [
+            {'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+             'args': {'name': 'server' if pid == os.getpid() else f'render worker {pid}'}}
+            for pid in sorted({pid for pid, _ in threads})
+        ]
+        metadata += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for (pid, tid), name in sorted(threads.items())
+        ]
+        # 같은 시각에 시작한 구간은 긴 것(바깥 구간)이 먼저 오도록 정렬
+        events.sort(key=lambda event: (event['ts'], -event['dur']))
+        return {
+            'traceEvents': metadata + [{**event, 'ts': round(event['ts'] - origin, 1)} for event in events],
+            'displayTimeUnit': 'ms',
+            'otherData': {'task_id': task_id, 'dropped_events': dropped}
+        }
+
+tracer = TaskTracer(app.config['TRACE_MAX_TASKS'], app.config['TRACE_MAX_EVENTS'])
+
+def observe_stage(stage, started):
+    """perf_counter 기준 started부터 지금까지를 렌더 단계 소요 시간으로 기록 (현재 작업의 구간으로도 남김)"""
+    elapsed = time.perf_counter() - started
+    metrics.observe('video_editor_stage_duration_seconds', elapsed, stage=stage)
+    tracer.record(tracer.current(), stage, 'stage', started, elapsed)
+
 # 설정
 UPLOAD_FOLDER = 'uploads'
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'blobs')  # 내용 해시로 저장되는 실제 파일
+PARTIAL_FOLDER = os.path.join(BLOB_FOLDER, 'partial')  # 분할 업로드 중인 파일 (blob과 같은 파일시스템)
 OUTPUT_FOLDER = 'outputs'
 TEMP_FOLDER = 'temp'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
 app.config['TEMP_FOLDER'] = TEMP_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB 제한
+app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB 제한 (단일 요청 기준, 분할 업로드는 청크마다 적용)
+
+# 다운로드: 출력 파일 캐시 시간(초, 0이면 매번 ETag로 재검증), 앞단 웹 서버의 X-Sendfile 사용 여부
+app.config['DOWNLOAD_MAX_AGE'] = int(os.environ.get('DOWNLOAD_MAX_AGE', 0))
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# 분할 업로드: 권장 청크 크기, 파일 최대 크기, 마지막 청크 이후 세션 보관 시간(초)
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024))
+app.config['UPLOAD_MAX_SIZE'] = int(os.environ.get('UPLOAD_MAX_SIZE', 8 * 1024 * 1024 * 1024))
+app.config['UPLOAD_SESSION_TTL'] = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
 
 # 폴더 생성
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(BLOB_FOLDER, exist_ok=True)
+os.makedirs(PARTIAL_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 os.makedirs(TEMP_FOLDER, exist_ok=True)
 
-# 시작 시 temp 파일 정리 함수
-def cleanup_temp_files():
-    """서버 시작 시 temp 파일들을 정리"""
-    try:
-        # temp 폴더의 모든 파일 삭제
-        for filename in os.listdir(TEMP_FOLDER):
-            filepath = os.path.join(TEMP_FOLDER, filename)
-            if os.path.isfile(filepath):
-                os.remove(filepath)
-                print(f"Cleaned up temp file: {filename}")
-        
-        # 프로젝트 루트의 임시 파일들도 정리
-        for filename in os.listdir('.'):
-            if (filename.startswith('temp-audio') or 
-                filename.startswith('My_Video') or 
-                filename.endswith('.m4a')):
-                try:
-                    os.remove(filename)
-                    print(f"Cleaned up root temp file: {filename}")
-                except:
-                    pass
-    except Exception as e:
-        print(f"Error during temp file cleanup: {e}")
+# 렌더 슬롯 수와 대기열 길이 (환경 변수로 조정 가능)
+app.config['RENDER_WORKERS'] = int(os.environ.get('RENDER_WORKERS', max(1, (os.cpu_count() or 4) // 4)))
+app.config['RENDER_QUEUE_SIZE'] = int(os.environ.get('RENDER_QUEUE_SIZE', 20))
 
-# 서버 시작 시 temp 파일 정리 실행
-cleanup_temp_files()
+# 렌더 실행 방식: 'thread' (Flask 프로세스 내 스레드) 또는 'process' (미리 fork된 워커 프로세스)
+app.config['RENDER_EXECUTOR'] = os.environ.get('RENDER_EXECUTOR', 'thread')
 
-# 허용된 파일 확장자
-ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
-ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp'}
-ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'aac', 'm4a', 'ogg'}
+# 워커 프로세스 안에서 사용하는 TaskManager / SocketIO 대체 객체
+class WorkerTaskManager(TaskManager):
+    """워커 프로세스용 TaskManager - 상태 변경을 파이프로 부모 프로세스에 전달"""
+    def __init__(self, conn, cancel_flag, pause_flag):
+        super().__init__()
+        self.conn = conn
+        self.conn_lock = threading.Lock()
+        self.cancel_flag = cancel_flag
+        self.pause_flag = pause_flag
+    
+    def send(self, message):
+        with self.conn_lock:
+            self.conn.send(message)
+    
+    def create_task(self, task_id, task_type, total_steps=100, status='running'):
+        task = super().create_task(task_id, task_type, total_steps, status)
+        # 부모 프로세스와 공유되는 이벤트로 취소/일시정지 상태 확인
+        task['cancel_flag'] = self.cancel_flag
+        task['pause_flag'] = self.pause_flag
+        self.send(('create_task', task_id, task_type, total_steps, status))
+        return task
+    
+    def update_progress(self, task_id, current_step, message=""):
+        with self.lock:
+            if task_id not in self.tasks:
+                return
+            task = self.tasks[task_id]
+            task['current_step'] = current_step
+            if message:
+                task['message'] = message
+            total_steps = task['total_steps']
+        self.send(('update_progress', task_id, current_step, total_steps, message))
+    
+    def set_status(self, task_id, status, message=""):
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]['status'] = status
+        self.send(('set_status', task_id, status, message))
+    
+    def emit_event(self, event, data):
+        self.send(('emit', event, data))
 
-def allowed_file(filename, extensions):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
+class SocketEmitRelay:
+    """워커 프로세스에서 호출된 socketio.emit을 부모 프로세스로 전달"""
+    def __init__(self, worker_task_manager):
+        self.worker_task_manager = worker_task_manager
+    
+    def emit(self, event, data=None, **kwargs):
+        self.worker_task_manager.send(('emit', event, data))
 
-# SocketIO 이벤트 핸들러
-@socketio.on('connect')
-def handle_connect():
-    print(f'클라이언트가 연결되었습니다: {request.sid}')
-    emit('connected', {'data': '서버에 연결되었습니다'})
+class MetricsRelay:
+    """워커 프로세스에서 기록한 메트릭을 부모 프로세스의 MetricsRegistry로 전달"""
+    def __init__(self, worker_task_manager):
+        self.worker_task_manager = worker_task_manager
+    
+    def inc(self, name, value=1, **labels):
+        self.worker_task_manager.send(('metric', 'inc', name, value, labels))
+    
+    def observe(self, name, value, **labels):
+        self.worker_task_manager.send(('metric', 'observe', name, value, labels))
 
-@socketio.on('disconnect')
-def handle_disconnect():
-    print(f'클라이언트가 연결을 해제했습니다: {request.sid}')
+class WorkerTaskTracer(TaskTracer):
+    """워커 프로세스용 TaskTracer - 기록한 구간과 프로파일 결과를 파이프로 부모 프로세스에 전달"""
+    def __init__(self, worker_task_manager):
+        super().__init__(app.config['TRACE_MAX_TASKS'], app.config['TRACE_MAX_EVENTS'])
+        self.worker_task_manager = worker_task_manager
+    
+    def add(self, task_id, event, thread_name):
+        self.worker_task_manager.send(('trace', task_id, event, thread_name))
+    
+    def save_profile(self, task_id, counts):
+        self.worker_task_manager.send(('profile', task_id, counts))
 
-@socketio.on('cancel_task')
-def handle_cancel_task(data):
+def reset_forked_state():
+    """fork된 워커 프로세스에서 부모의 lock과 sqlite 연결, 풀 상태를 버리고 새로 만듦
+    
+    워커는 보통 다른 스레드가 없는 모듈 로드 시점에 fork되지만, 비정상 종료 후 다시 fork할 때는
+    부모의 다른 스레드가 lock을 잡고 있던 상태 그대로 복사될 수 있음
+    """
+    global subtitle_cache_lock, stdio_redirect_lock
+    subtitle_cache_lock = threading.Lock()
+    stdio_redirect_lock = threading.Lock()
+    for store in (media_index, task_store, render_cache):
+        store.lock = threading.Lock()
+        store.conn = None
+    # 풀에 남은 리더의 ffmpeg는 부모 프로세스 소유이므로 닫지 않고 버림
+    clip_pool.lock = threading.Lock()
+    clip_pool.idle_readers = OrderedDict()
+    clip_pool.leases = {}
+    TaskResources.scopes_lock = threading.Lock()
+    TaskResources.scopes = {}
+
+def render_process_main(conn, cancel_flag, pause_flag):
+    """렌더 워커 프로세스 진입점 - 파이프로 받은 작업을 순서대로 실행"""
+    global task_manager, socketio, metrics, tracer
+    reset_forked_state()
+    task_manager = WorkerTaskManager(conn, cancel_flag, pause_flag)
+    socketio = SocketEmitRelay(task_manager)
+    metrics = MetricsRelay(task_manager)
+    tracer = WorkerTaskTracer(task_manager)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        func_name, data, task_id, sample = job
+        try:
+            with tracer.task(task_id, func_name, sample):
+                globals()[func_name](data, task_id)
+        except Exception as e:
+            print(f"Error: 워커 프로세스에서 작업 실패 ({task_id}): {e}")
+            task_manager.set_status(task_id, 'error', f'오류가 발생했습니다: {str(e)}')
+        finally:
+            task_manager.tasks.pop(task_id, None)
+            task_manager.send(('done', task_id))
+
+class RenderProcess:
+    """MoviePy가 로드된 상태로 미리 fork된 렌더 워커 프로세스 (렌더 슬롯 하나에 대응)"""
+    def __init__(self):
+        self.ctx = multiprocessing.get_context('fork')
+        self.cancel_flag = self.ctx.Event()
+        self.pause_flag = self.ctx.Event()
+        self.spawn()
+    
+    def spawn(self):
+        parent_conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=render_process_main,
+            args=(child_conn, self.cancel_flag, self.pause_flag),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+    
+    def run(self, func, data, task_id, sample=False):
+        """작업을 워커 프로세스로 보내고, 끝날 때까지 진행상황/구간 기록을 부모 프로세스로 중계"""
+        self.cancel_flag.clear()
+        self.pause_flag.clear()
+        # 부모 쪽 취소/일시정지 요청이 워커에 바로 보이도록 공유 이벤트로 교체
+        with task_manager.lock:
+            task = task_manager.tasks.get(task_id)
+            if task is not None:
+                if task['cancel_flag'].is_set():
+                    self.cancel_flag.set()
+                if task['pause_flag'].is_set():
+                    self.pause_flag.set()
+                task['cancel_flag'] = self.cancel_flag
+                task['pause_flag'] = self.pause_flag
+        
+        try:
+            self.conn.send((func.__name__, data, task_id, sample))
+            while True:
+                message = self.conn.recv()
+                if message[0] == 'done':
+                    break
+                self.apply(message)
+        except (EOFError, OSError) as e:
+            print(f"Error: 렌더 워커 프로세스 비정상 종료 ({task_id}): {e}")
+            task_manager.set_status(task_id, 'error', '렌더 워커 프로세스가 비정상 종료되었습니다')
+            task_manager.emit_event('task_error', {'task_id': task_id, 'error': '렌더 워커 프로세스가 비정상 종료되었습니다'})
+            self.process.join(timeout=1)
+            self.spawn()
+        finally:
+            # 다음 작업이 공유 이벤트를 재사용하므로 끝난 작업에는 현재 상태를 복사해 둠
+            with task_manager.lock:
+                task = task_manager.tasks.get(task_id)
+                if task is not None:
+                    task['cancel_flag'] = threading.Event()
+                    task['pause_flag'] = threading.Event()
+                    if self.cancel_flag.is_set():
+                        task['cancel_flag'].set()
+                    if self.pause_flag.is_set():
+                        task['pause_flag'].set()
+    
+    def apply(self, message):
+        kind = message[0]
+        if kind == 'create_task':
+            _, task_id, task_type, total_steps, status = message
+            task_manager.create_task(task_id, task_type, total_steps, status)
+        elif kind == 'update_progress':
+            _, task_id, current_step, total_steps, text = message
+            with task_manager.lock:
+                if task_id in task_manager.tasks:
+                    task_manager.tasks[task_id]['total_steps'] = total_steps
+            task_manager.update_progress(task_id, current_step, text)
+        elif kind == 'set_status':
+            _, task_id, status, text = message
+            task_manager.set_status(task_id, status, text)
+        elif kind == 'metric':
+            _, method, name, value, labels = message
+            getattr(metrics, method)(name, value, **labels)
+        elif kind == 'trace':
+            _, task_id, event, thread_name = message
+            tracer.add(task_id, event, thread_name)
+        elif kind == 'profile':
+            _, task_id, counts = message
+            tracer.save_profile(task_id, counts)
+        elif kind == 'emit':
+            _, event, data = message
+            if isinstance(data, dict) and 'task_id' in data:
+                task_manager.emit_event(event, data)
+            else:
+                socketio.emit(event, data)
+
+# 렌더 작업 대기열
+class RenderQueue:
+    """고정된 수의 렌더 슬롯과 길이 제한이 있는 대기열로 작업 실행을 관리
+    
+    durable이면 대기열에 들어온 작업을 작업 저장소에 기록해 서버 재시작 후 이어서 진행함
+    """
+    def __init__(self, workers, max_backlog, executor='thread', name='render', durable=True):
+        self.workers = workers
+        self.max_backlog = max_backlog
+        self.executor = executor
+        self.name = name
+        self.durable = durable
+        self.backlog = deque()
+        self.active = set()
+        self.cond = threading.Condition()
+        self.threads = []
+    
+    def start(self):
+        with self.cond:
+            if self.threads:
+                return
+            # 프로세스 모드에서는 슬롯마다 워커 프로세스를 미리 fork (중계 스레드를 띄우기 전에 모두 fork)
+            processes = [RenderProcess() if self.executor == 'process' else None for _ in range(self.workers)]
+            for i, process in enumerate(processes):
+                thread = threading.Thread(target=self._worker_loop, args=(process,), name=f'{self.name}-worker-{i}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+    
+    def submit(self, func, data, task_id, task_type):
+        """작업을 대기열에 추가하고 대기 순번을 반환 (대기열이 가득 차면 None)"""
+        self.start()
+        with self.cond:
+            if len(self.backlog) >= self.max_backlog:
+                return None
+            if self.durable and task_manager.store is not None:
+                task_manager.store.record_job(task_id, task_type, func.__name__, data)
+            task_manager.create_task(task_id, task_type, 100, status='queued')
+            self.backlog.append((task_id, func, data))
+            position = len(self.backlog)
+            self.cond.notify()
+        task_manager.set_queue_position(task_id, position)
+        return position
+    
+    def cancel(self, task_id):
+        """아직 시작되지 않은 작업을 대기열에서 제거"""
+        with self.cond:
+            for entry in self.backlog:
+                if entry[0] == task_id:
+                    self.backlog.remove(entry)
+                    break
+            else:
+                return False
+        render_cache.release(task_id)
+        self._broadcast_positions()
+        return True
+    
+    def position(self, task_id):
+        with self.cond:
+            for i, entry in enumerate(self.backlog):
+                if entry[0] == task_id:
+                    return i + 1
+        return None
+    
+    def stats(self):
+        with self.cond:
+            return {
+                'workers': self.workers,
+                'executor': self.executor,
+                'active': len(self.active),
+                'queued': len(self.backlog),
+                'max_queue': self.max_backlog
+            }
+    
+    def _broadcast_positions(self):
+        with self.cond:
+            queued = [entry[0] for entry in self.backlog]
+        for i, task_id in enumerate(queued):
+            task_manager.set_queue_position(task_id, i + 1)
+    
+    def _worker_loop(self, process=None):
+        while True:
+            with self.cond:
+                while not self.backlog:
+                    self.cond.wait()
+                task_id, func, data = self.backlog.popleft()
+                self.active.add(task_id)
+            self._broadcast_positions()
+            started = time.perf_counter()
+            task = task_manager.tasks.get(task_id)
+            if task is not None:
+                waited = time.time() - task['start_time']
+                metrics.observe('video_editor_queue_wait_seconds', waited, queue=self.name)
+                tracer.record(task_id, 'queue_wait', 'queue', started - waited, waited, {'queue': self.name})
+            skipped = task_manager.is_cancelled(task_id)
+            sample = tracer.take_profile_request(task_id)
+            try:
+                if skipped:
+                    pass
+                elif process is not None:
+                    process.run(func, data, task_id, sample)
+                else:
+                    with tracer.task(task_id, func.__name__, sample):
+                        func(data, task_id)
+            except Exception as e:
+                print(f"Error: 렌더 작업 실행 실패 ({task_id}): {e}")
+            finally:
+                with self.cond:
+                    self.active.discard(task_id)
+                # 렌더 캐시의 실행 중 등록은 요청을 받은 이 프로세스에 있으므로 워커가 아니라 여기서 해제
+                render_cache.release(task_id)
+                task = task_manager.tasks.get(task_id)
+                if task is not None and not skipped:
+                    metrics.observe('video_editor_render_duration_seconds', time.perf_counter() - started,
+                                    operation=task['type'])
+                    metrics.inc('video_editor_tasks_finished_total', operation=task['type'], status=task['status'])
+
+render_queue = RenderQueue(
+    app.config['RENDER_WORKERS'],
+    app.config['RENDER_QUEUE_SIZE'],
+    app.config['RENDER_EXECUTOR']
+)
+
+# 미리보기 전용 대기열: 전체 렌더 뒤에 밀리지 않도록 별도 슬롯에서 실행 (결과가 금방 다시 만들어지므로 저장하지 않음)
+app.config['PREVIEW_WORKERS'] = int(os.environ.get('PREVIEW_WORKERS', 1))
+app.config['PREVIEW_QUEUE_SIZE'] = int(os.environ.get('PREVIEW_QUEUE_SIZE', 10))
+app.config['PREVIEW_EXECUTOR'] = os.environ.get('PREVIEW_EXECUTOR', 'thread')
+
+preview_queue = RenderQueue(
+    app.config['PREVIEW_WORKERS'],
+    app.config['PREVIEW_QUEUE_SIZE'],
+    app.config['PREVIEW_EXECUTOR'],
+    name='preview',
+    durable=False
+)
+
+# 업로드 파일 미디어 정보 인덱스
+app.config['MEDIA_INDEX_PATH'] = os.environ.get('MEDIA_INDEX_PATH', 'media_index.db')
+
+class MediaIndex:
+    """업로드 시 한 번 조회한 미디어 정보를 저장 파일명 기준으로 보관하는 디스크 인덱스 (sqlite)"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+    
+    def connect(self):
+        # fork된 워커 프로세스는 부모의 연결을 공유하지 않고 새로 연결
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS media ('
+                ' filename TEXT PRIMARY KEY,'
+                ' type TEXT,'
+                ' size INTEGER,'
+                ' mtime REAL,'
+                ' info TEXT,'
+                ' ffmpeg_output TEXT,'
+                ' content_hash TEXT)'
+            )
+            # 이전 버전 인덱스에는 content_hash 컬럼이 없으므로 추가
+            columns = [row[1] for row in self.conn.execute('PRAGMA table_info(media)')]
+            if 'content_hash' not in columns:
+                self.conn.execute('ALTER TABLE media ADD COLUMN content_hash TEXT')
+            if 'uploaded_at' not in columns:
+                self.conn.execute('ALTER TABLE media ADD COLUMN uploaded_at REAL')
+                self.conn.execute('UPDATE media SET uploaded_at = mtime')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS media_content_hash ON media (content_hash)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS media_type_uploaded ON media (type, uploaded_at)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS media_uploaded ON media (uploaded_at)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS media_size ON media (size)')
+            # 목록이 바뀔 때마다 올라가는 리비전 (/files ETag 용)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)")
+            self.conn.commit()
+            self.pid = os.getpid()
+        return self.conn
+    
+    def put(self, filename, file_type, filepath, info, ffmpeg_output, content_hash=None):
+        stat = os.stat(filepath)
+        with self.lock:
+            conn = self.connect()
+            row = conn.execute('SELECT uploaded_at FROM media WHERE filename = ?', (filename,)).fetchone()
+            uploaded_at = row[0] if row is not None and row[0] else time.time()
+            conn.execute(
+                'INSERT OR REPLACE INTO media (filename, type, size, mtime, info, ffmpeg_output, content_hash, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (filename, file_type, stat.st_size, stat.st_mtime, json.dumps(info), ffmpeg_output,
+                 content_hash, uploaded_at)
+            )
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+            conn.commit()
+    
+    def get(self, filename):
+        """저장된 정보를 반환 (없으면 None)"""
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT type, size, mtime, info, ffmpeg_output, content_hash FROM media WHERE filename = ?', (filename,)
+            ).fetchone()
+        return self._row_to_entry(row)
+    
+    def find_by_hash(self, content_hash):
+        """같은 내용의 파일이 이미 인덱스에 있으면 그 정보를 반환"""
+        with self.lock:
+            row = self.connect().execute(
+                'SELECT type, size, mtime, info, ffmpeg_output, content_hash FROM media WHERE content_hash = ? LIMIT 1',
+                (content_hash,)
+            ).fetchone()
+        return self._row_to_entry(row)
+    
+    def _row_to_entry(self, row):
+        if row is None:
+            return None
+        return {
+            'type': row[0],
+            'size': row[1],
+            'mtime': row[2],
+            'info': json.loads(row[3]),
+            'ffmpeg_output': row[4],
+            'content_hash': row[5]
+        }
+    
+    def remove(self, filename):
+        with self.lock:
+            conn = self.connect()
+            if conn.execute('DELETE FROM media WHERE filename = ?', (filename,)).rowcount:
+                conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+            conn.commit()
+    
+    def revision(self):
+        with self.lock:
+            return self.connect().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+    
+    def filenames(self):
+        with self.lock:
+            return {row[0] for row in self.connect().execute('SELECT filename FROM media')}
+    
+    def list_files(self, file_type=None, sort='uploaded_at', order='desc', limit=100, offset=0):
+        """목록 페이지 조회 - (파일 목록, 전체 개수)를 반환"""
+        where, params = '', []
+        if file_type:
+            where, params = 'WHERE type = ?', [file_type]
+        with self.lock:
+            conn = self.connect()
+            total = conn.execute(f'SELECT COUNT(*) FROM media {where}', params).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT filename, type, size, uploaded_at, info FROM media {where} '
+                f'ORDER BY {sort} {order}, filename LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+        files = []
+        for filename, row_type, size, uploaded_at, info in rows:
+            info = json.loads(info)
+            files.append({
+                'filename': filename,
+                'original_name': filename.split('_', 1)[1] if '_' in filename else filename,
+                'type': row_type,
+                'size': size,
+                'uploaded_at': uploaded_at,
+                'duration': info.get('duration'),
+                'width': info.get('width'),
+                'height': info.get('height')
+            })
+        return files, total
+
+media_index = MediaIndex(app.config['MEDIA_INDEX_PATH'])
+
+# 작업 저장소: 재시작 후에도 작업 상태를 유지하고 중단된 렌더를 이어서 진행
+app.config['TASK_STORE_PATH'] = os.environ.get('TASK_STORE_PATH', 'tasks.db')
+app.config['TASK_STORE_RETENTION_DAYS'] = float(os.environ.get('TASK_STORE_RETENTION_DAYS', 7))
+app.config['TASK_MAX_RESUMES'] = int(os.environ.get('TASK_MAX_RESUMES', 3))
+CHECKPOINT_FOLDER = os.path.join(TEMP_FOLDER, 'checkpoints')
+os.makedirs(CHECKPOINT_FOLDER, exist_ok=True)
+
+class TaskStore:
+    """작업 명세, 상태 변화, 완료된 렌더 구간을 보관하는 디스크 저장소 (sqlite)"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+    
+    def connect(self):
+        # fork된 워커 프로세스는 부모의 연결을 공유하지 않고 새로 연결
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS tasks ('
+                ' task_id TEXT PRIMARY KEY,'
+                ' type TEXT,'
+                ' func TEXT,'
+                ' data TEXT,'
+                ' status TEXT,'
+                ' message TEXT,'
+                ' progress INTEGER DEFAULT 0,'
+                ' result TEXT,'
+                ' attempts INTEGER DEFAULT 0,'
+                ' created_at REAL,'
+                ' updated_at REAL)'
+            )
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS checkpoints ('
+                ' task_id TEXT,'
+                ' idx INTEGER,'
+                ' start REAL,'
+                ' end REAL,'
+                ' path TEXT,'
+                ' PRIMARY KEY (task_id, idx))'
+            )
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS encode_stats ('
+                ' profile TEXT PRIMARY KEY,'
+                ' encodes INTEGER,'
+                ' frames INTEGER,'
+                ' seconds REAL,'
+                ' thread_seconds REAL,'
+                ' last_fps REAL,'
+                ' updated_at REAL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)')
+            self.conn.commit()
+            self.pid = os.getpid()
+        return self.conn
+    
+    def record_job(self, task_id, task_type, func_name, data):
+        """대기열에 들어온 작업의 명세를 저장 (다시 대기열에 넣을 때마다 시도 횟수 증가)"""
+        now = time.time()
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                'INSERT INTO tasks (task_id, type, func, data, status, message, attempts, created_at, updated_at) '
+                "VALUES (?, ?, ?, ?, 'queued', '', 1, ?, ?) "
+                "ON CONFLICT (task_id) DO UPDATE SET status = 'queued', attempts = attempts + 1, updated_at = excluded.updated_at",
+                (task_id, task_type, func_name, json.dumps(data), now, now)
+            )
+            conn.commit()
+    
+    def update_status(self, task_id, status, message, progress):
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                'UPDATE tasks SET status = ?, message = ?, progress = ?, updated_at = ? WHERE task_id = ?',
+                (status, message, progress, time.time(), task_id)
+            )
+            conn.commit()
+    
+    def record_result(self, task_id, event, data):
+        with self.lock:
+            conn = self.connect()
+            conn.execute('UPDATE tasks SET result = ?, updated_at = ? WHERE task_id = ?',
+                         (json.dumps([event, data]), time.time(), task_id))
+            conn.commit()
+    
+    def load_tasks(self, since):
+        """since 이후에 갱신된 작업 목록 (오래된 것부터)"""
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT task_id, type, func, data, status, message, progress, result, attempts '
+                'FROM tasks WHERE updated_at >= ? ORDER BY created_at', (since,)
+            ).fetchall()
+        return [{
+            'task_id': row[0],
+            'type': row[1],
+            'func': row[2],
+            'data': json.loads(row[3]) if row[3] else {},
+            'status': row[4],
+            'message': row[5] or '',
+            'progress': row[6] or 0,
+            'result': tuple(json.loads(row[7])) if row[7] else None,
+            'attempts': row[8] or 0
+        } for row in rows]
+    
+    def prune(self, before):
+        """before 이전에 끝난 작업 기록 삭제"""
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                "DELETE FROM tasks WHERE updated_at < ? AND status NOT IN ('queued', 'running', 'paused')", (before,)
+            )
+            conn.execute('DELETE FROM checkpoints WHERE task_id NOT IN (SELECT task_id FROM tasks)')
+            conn.commit()
+    
+    def add_checkpoint(self, task_id, index, start, end, path):
+        with self.lock:
+            conn = self.connect()
+            conn.execute('INSERT OR REPLACE INTO checkpoints (task_id, idx, start, end, path) VALUES (?, ?, ?, ?, ?)',
+                         (task_id, index, start, end, path))
+            conn.commit()
+    
+    def checkpoints(self, task_id):
+        """완료된 구간 {번호: (시작, 끝, 경로)}"""
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT idx, start, end, path FROM checkpoints WHERE task_id = ?', (task_id,)
+            ).fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+    
+    def clear_checkpoints(self, task_id):
+        with self.lock:
+            conn = self.connect()
+            conn.execute('DELETE FROM checkpoints WHERE task_id = ?', (task_id,))
+            conn.commit()
+    
+    def record_encode(self, profile, frames, seconds, threads):
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                'INSERT INTO encode_stats (profile, encodes, frames, seconds, thread_seconds, last_fps, updated_at) '
+                'VALUES (?, 1, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (profile) DO UPDATE SET encodes = encodes + 1, frames = frames + excluded.frames, '
+                'seconds = seconds + excluded.seconds, thread_seconds = thread_seconds + excluded.thread_seconds, '
+                'last_fps = excluded.last_fps, updated_at = excluded.updated_at',
+                (profile, frames, seconds, threads * seconds, frames / seconds if seconds else 0.0, time.time())
+            )
+            conn.commit()
+    
+    def encode_stats(self):
+        """프로필별 인코딩 통계 (평균 fps = 전체 프레임 / 전체 인코딩 시간)"""
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT profile, encodes, frames, seconds, thread_seconds, last_fps FROM encode_stats ORDER BY profile'
+            ).fetchall()
+        return {
+            row[0]: {
+                'encodes': row[1],
+                'frames': row[2],
+                'seconds': round(row[3], 2),
+                'fps': round(row[2] / row[3], 1) if row[3] else 0.0,
+                'avg_threads': round(row[4] / row[3], 1) if row[3] else 0.0,
+                'last_fps': round(row[5], 1)
+            } for row in rows
+        }
+
+task_store = TaskStore(app.config['TASK_STORE_PATH'])
+task_manager.store = task_store
+
+# 렌더 결과 캐시: 같은 작업 명세와 입력이면 기존 출력을 재사용 (전체 크기/마지막 사용 후 보관 기간 제한)
+app.config['RENDER_CACHE_PATH'] = os.environ.get('RENDER_CACHE_PATH', 'render_cache.db')
+app.config['RENDER_CACHE_MAX_BYTES'] = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 10 * 1024 * 1024 * 1024))
+app.config['RENDER_CACHE_MAX_AGE_DAYS'] = float(os.environ.get('RENDER_CACHE_MAX_AGE_DAYS', 7))
+
+# 렌더 결과가 달라지는 변경을 하면 올려서 기존 캐시를 무효화
+RENDER_CACHE_VERSION = 1
+
+class RenderCache:
+    """작업 지문(fingerprint) → 출력 파일 캐시 (sqlite)
+    
+    완료된 출력은 지문과 함께 기록되고, 같은 지문의 요청은 렌더링 없이 그 파일을 돌려받음.
+    실행 중인 같은 지문의 작업은 inflight에서 찾아 새 렌더를 시작하지 않고 그 작업에 붙임.
+    조회 통계(적중/실행 중 합류/미스)는 요청을 받는 프로세스 기준
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.pid = None
+        self.inflight = {}  # 지문 -> 실행 중인 task_id
+        self.hits = 0
+        self.joined = 0
+        self.misses = 0
+    
+    def connect(self):
+        # fork된 워커 프로세스는 부모의 연결을 공유하지 않고 새로 연결
+        if self.conn is None or self.pid != os.getpid():
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS renders ('
+                ' fingerprint TEXT PRIMARY KEY,'
+                ' output_file TEXT,'
+                ' size INTEGER,'
+                ' created_at REAL,'
+                ' last_used REAL)'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS renders_last_used ON renders (last_used)')
+            self.conn.commit()
+            self.pid = os.getpid()
+        return self.conn
+    
+    def lookup(self, fingerprint, task_id):
+        """('hit', 출력 파일) / ('inflight', 실행 중인 task_id) / ('miss', None)
+        
+        미스면 task_id를 실행 중으로 바로 등록해, 동시에 들어온 같은 요청이 두 번 렌더링되지 않게 함
+        (대기열에 넣지 못하면 abandon으로 해제)
+        """
+        with self.lock:
+            conn = self.connect()
+            row = conn.execute('SELECT output_file FROM renders WHERE fingerprint = ?', (fingerprint,)).fetchone()
+            if row is not None:
+                if os.path.exists(os.path.join(app.config['OUTPUT_FOLDER'], row[0])):
+                    conn.execute('UPDATE renders SET last_used = ? WHERE fingerprint = ?', (time.time(), fingerprint))
+                    conn.commit()
+                    self.hits += 1
+                    return 'hit', row[0]
+                # 출력 파일이 지워졌으면 캐시 항목도 제거
+                conn.execute('DELETE FROM renders WHERE fingerprint = ?', (fingerprint,))
+                conn.commit()
+            
+            running_id = self.inflight.get(fingerprint)
+            if running_id is not None:
+                task = task_manager.tasks.get(running_id)
+                # 방금 등록되어 아직 작업이 만들어지지 않은 경우도 실행 중으로 봄
+                if task is None or task['status'] in ('queued', 'running', 'paused'):
+                    self.joined += 1
+                    return 'inflight', running_id
+            self.inflight[fingerprint] = task_id
+            self.misses += 1
+            return 'miss', None
+    
+    def abandon(self, fingerprint, task_id):
+        with self.lock:
+            if self.inflight.get(fingerprint) == task_id:
+                del self.inflight[fingerprint]
+    
+    def release(self, task_id):
+        """끝났거나(완료/오류/취소) 대기열에서 빠진 작업의 실행 중 등록 해제"""
+        with self.lock:
+            for fingerprint in [f for f, running_id in self.inflight.items() if running_id == task_id]:
+                del self.inflight[fingerprint]
+    
+    def put(self, fingerprint, output_file):
+        """완료된 출력을 기록하고 보관 기간/전체 크기 제한에 맞게 오래된 출력부터 정리"""
+        now = time.time()
+        size = os.path.getsize(os.path.join(app.config['OUTPUT_FOLDER'], output_file))
+        with self.lock:
+            conn = self.connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO renders (fingerprint, output_file, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                (fingerprint, output_file, size, now, now)
+            )
+            conn.commit()
+            # 이제부터 같은 요청은 캐시 적중으로 처리
+            self.inflight.pop(fingerprint, None)
+        self.evict()
+    
+    def evict(self):
+        deadline = time.time() - app.config['RENDER_CACHE_MAX_AGE_DAYS'] * 86400
+        with self.lock:
+            conn = self.connect()
+            rows = conn.execute('SELECT fingerprint, output_file, size, last_used FROM renders ORDER BY last_used DESC').fetchall()
+            total = 0
+            evicted = []
+            for fingerprint, output_file, size, last_used in rows:
+                total += size or 0
+                if last_used < deadline or total > app.config['RENDER_CACHE_MAX_BYTES']:
+                    evicted.append((fingerprint, output_file))
+            conn.executemany('DELETE FROM renders WHERE fingerprint = ?', [(fingerprint,) for fingerprint, _ in evicted])
+            conn.commit()
+        for _, output_file in evicted:
+            path = os.path.join(app.config['OUTPUT_FOLDER'], output_file)
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                print(f"Warning: 캐시된 출력 삭제 실패 ({output_file}): {e}")
+    
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.joined + self.misses
+            row = self.connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM renders').fetchone()
+            return {
+                'hits': self.hits,
+                'joined': self.joined,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.joined) / lookups, 3) if lookups else 0.0,
+                'entries': row[0],
+                'bytes': row[1]
+            }
+
+render_cache = RenderCache(app.config['RENDER_CACHE_PATH'])
+
+def input_identity(filename):
+    """입력 파일 식별자 - 업로드 인덱스의 내용 해시, 없으면 크기와 수정 시각"""
+    if not filename:
+        return None
+    entry = media_index.get(filename)
+    if entry is not None and entry['content_hash']:
+        return entry['content_hash']
+    try:
+        stat = os.stat(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    except OSError:
+        return filename
+    return f'{filename}:{stat.st_size}:{stat.st_mtime_ns}'
+
+def render_fingerprint(data):
+    """최종 비디오 요청의 정규화된 지문
+    
+    출력 내용에 영향을 주는 값(입력 내용, 이미지 표시 시간, 배경음악과 볼륨, 자막, 출력 설정)만
+    정해진 순서로 직렬화해 해시함. 제목처럼 출력 내용과 무관한 값은 제외
+    """
+    audio_file = data.get('audio_file')
+    spec = {
+        'version': RENDER_CACHE_VERSION,
+        'files': [
+            [file_info['type'], input_identity(file_info['filename']),
+             float(file_info.get('duration', 3)) if file_info['type'] == 'image' else None]
+            for file_info in data.get('files', [])
+        ],
+        'audio': [input_identity(audio_file), float(data.get('audio_volume', 50))] if audio_file else None,
+        'subtitles': [
+            [subtitle['text'], float(subtitle['start_time']), float(subtitle['end_time'])]
+            for subtitle in data.get('subtitles', [])
+        ],
+        'output': get_output_setting(data),
+        'encoder_profile': get_encoder_profile(data),
+        'slideshow_fps': app.config['SLIDESHOW_FPS']
+    }
+    canonical = json.dumps(spec, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def index_upload(filename, file_type, content_hash=None):
+    """업로드 파일을 한 번 조회해 인덱스에 저장하고 미디어 정보를 반환
+    
+    같은 내용의 파일이 이미 조회되어 있으면 ffmpeg를 다시 실행하지 않음.
+    읽을 수 없거나 형식에 맞는 스트림이 없으면 IOError
+    """
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    known = media_index.find_by_hash(content_hash) if content_hash else None
+    ffmpeg_output = known['ffmpeg_output'] if known is not None else read_ffmpeg_infos(filepath)
+    info = parse_media_infos(ffmpeg_output)
+    if file_type == 'video' and not (info['video'] and info['duration']):
+        raise IOError('비디오 스트림을 읽을 수 없습니다')
+    if file_type == 'audio' and not (info['audio'] and info['duration']):
+        raise IOError('오디오 스트림을 읽을 수 없습니다')
+    if file_type == 'image' and not (info['width'] and info['height']):
+        raise IOError('이미지를 읽을 수 없습니다')
+    media_index.put(filename, file_type, filepath, info, ffmpeg_output, content_hash)
+    return info
+
+def sync_media_index():
+    """업로드 폴더와 인덱스를 맞춤 - 인덱스에 없는 기존 파일은 조회해 추가하고 사라진 파일은 제거"""
+    try:
+        upload_folder = app.config['UPLOAD_FOLDER']
+        on_disk = {
+            filename for filename in os.listdir(upload_folder)
+            if os.path.isfile(os.path.join(upload_folder, filename)) and get_file_type(filename)
+        }
+        indexed = media_index.filenames()
+        for filename in indexed - on_disk:
+            media_index.remove(filename)
+        for filename in on_disk - indexed:
+            get_indexed_entry(os.path.join(upload_folder, filename))
+    except Exception as e:
+        print(f"Warning: 미디어 인덱스 동기화 실패: {e}")
+
+def store_upload_stream(stream, filename):
+    """업로드 스트림을 해시하면서 디스크에 기록하고 내용 해시 기준 blob으로 저장
+    
+    같은 내용의 blob이 이미 있으면 새로 기록한 파일은 버리고 기존 blob을 사용.
+    사용자별 파일명(uuid_원본이름)은 blob에 대한 하드링크로 생성.
+    (저장 파일명, 내용 해시, 중복 여부)를 반환
+    """
+    hasher = hashlib.sha256()
+    temp_path = os.path.join(BLOB_FOLDER, f'.incoming-{uuid.uuid4().hex}')
+    try:
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                f.write(chunk)
+        content_hash = hasher.hexdigest()
+        unique_filename, deduplicated = store_upload_file(temp_path, content_hash, filename)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return unique_filename, content_hash, deduplicated
+
+def store_upload_file(temp_path, content_hash, filename):
+    """내용 해시를 아는 임시 파일을 blob으로 옮기고 사용자 파일명 링크를 생성
+    
+    같은 내용의 blob이 이미 있으면 임시 파일은 버림. (저장 파일명, 중복 여부)를 반환
+    """
+    blob_path = os.path.join(BLOB_FOLDER, content_hash)
+    deduplicated = os.path.exists(blob_path)
+    if deduplicated:
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, blob_path)
+    
+    unique_filename = f"{uuid.uuid4()}_{filename}"
+    link_upload_reference(blob_path, os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
+    return unique_filename, deduplicated
+
+def index_stored_upload(unique_filename, filename, file_type, content_hash, deduplicated):
+    """저장된 업로드의 미디어 정보를 인덱스에 올리고 (응답 본문, 상태 코드)를 반환
+    
+    읽을 수 없는 파일이면 저장한 파일과 새로 만든 blob을 지우고 400
+    """
+    try:
+        metadata = index_upload(unique_filename, file_type, content_hash)
+    except Exception as e:
+        remove_upload(unique_filename)
+        blob_path = os.path.join(BLOB_FOLDER, content_hash)
+        if not deduplicated and os.path.exists(blob_path) and os.stat(blob_path).st_nlink <= 1:
+            os.remove(blob_path)
+        return {'error': f'손상되었거나 읽을 수 없는 파일입니다: {str(e)}'}, 400
+    
+    return {
+        'message': '파일이 성공적으로 업로드되었습니다',
+        'filename': unique_filename,
+        'type': file_type,
+        'original_name': filename,
+        'metadata': metadata,
+        'content_hash': content_hash,
+        'deduplicated': deduplicated
+    }, 200
+
+class UploadOffsetError(ValueError):
+    """청크 시작 위치가 서버가 받은 크기와 다름 (offset에 서버 기준 위치)"""
+    def __init__(self, offset):
+        super().__init__(f'업로드 위치가 맞지 않습니다 (서버 기준 {offset}바이트)')
+        self.offset = offset
+
+class UploadSessions:
+    """이어 받을 수 있는 분할 업로드 세션
+    
+    청크는 PARTIAL_FOLDER의 세션 파일(.part)에 바로 기록하면서 전체 sha256을 함께 갱신하므로
+    완료 시 파일을 다시 읽지 않고 blob으로 옮길 수 있음. 세션 정보(.json)는 디스크에 남아
+    서버가 다시 시작되어도 받은 위치부터 이어서 업로드할 수 있음 (해시 상태는 받은 부분을 한 번 다시 읽어 복원).
+    업로드 하나가 쓰는 메모리는 파일 크기와 무관하게 읽기 버퍼 하나
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.sessions = {}  # upload_id -> {'meta', 'hasher', 'lock'}
+    
+    def data_path(self, upload_id):
+        return os.path.join(self.folder, f'{upload_id}.part')
+    
+    def meta_path(self, upload_id):
+        return os.path.join(self.folder, f'{upload_id}.json')
+    
+    def create(self, filename, file_type, size, sha256=None):
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        meta = {
+            'upload_id': upload_id,
+            'filename': filename,
+            'type': file_type,
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': time.time()
+        }
+        open(self.data_path(upload_id), 'wb').close()
+        with open(self.meta_path(upload_id), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        with self.lock:
+            self.sessions[upload_id] = {'meta': meta, 'hasher': hashlib.sha256(), 'lock': threading.Lock()}
+        return meta
+    
+    def get(self, upload_id):
+        """세션을 반환 (메모리에 없으면 디스크의 세션 정보로 복원), 없으면 None"""
+        if not re.fullmatch(r'[0-9a-f]{32}', upload_id):
+            return None
+        with self.lock:
+            session = self.sessions.get(upload_id)
+            if session is None:
+                try:
+                    with open(self.meta_path(upload_id), encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    return None
+                if not os.path.exists(self.data_path(upload_id)):
+                    return None
+                session = {'meta': meta, 'hasher': None, 'lock': threading.Lock()}
+                self.sessions[upload_id] = session
+        return session
+    
+    def status(self, session):
+        meta = session['meta']
+        offset = os.path.getsize(self.data_path(meta['upload_id']))
+        return {
+            'upload_id': meta['upload_id'],
+            'offset': offset,
+            'size': meta['size'],
+            'progress': int(offset * 100 / meta['size']) if meta['size'] else 100,
+            'chunk_size': app.config['UPLOAD_CHUNK_SIZE']
+        }
+    
+    def _hasher(self, session, offset):
+        # 재시작 후 복원된 세션은 이미 받은 부분을 한 번 읽어 해시 상태를 다시 만듦
+        if session['hasher'] is None:
+            hasher = hashlib.sha256()
+            with open(self.data_path(session['meta']['upload_id']), 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            session['hasher'] = hasher
+        return session['hasher']
+    
+    def write_chunk(self, session, offset, stream, chunk_sha256=None):
+        """offset 위치에 청크를 기록하고 새 위치를 반환
+        
+        offset이 받은 크기와 다르면 UploadOffsetError, 체크섬이 맞지 않거나 선언한 크기를 넘으면 ValueError.
+        실패하거나 연결이 끊기면 청크 시작 위치로 되돌려 다시 보낼 수 있게 함
+        """
+        meta = session['meta']
+        path = self.data_path(meta['upload_id'])
+        with session['lock']:
+            current = os.path.getsize(path)
+            if offset != current:
+                raise UploadOffsetError(current)
+            hasher = self._hasher(session, current).copy()
+            chunk_hasher = hashlib.sha256()
+            written = 0
+            with open(path, 'r+b') as f:
+                f.seek(offset)
+                try:
+                    while True:
+                        chunk = stream.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        written += len(chunk)
+                        if offset + written > meta['size']:
+                            raise ValueError('선언한 파일 크기를 넘는 데이터입니다')
+                        hasher.update(chunk)
+                        chunk_hasher.update(chunk)
+                        f.write(chunk)
+                    if chunk_sha256 and chunk_hasher.hexdigest() != chunk_sha256.lower():
+                        raise ValueError('청크 체크섬이 일치하지 않습니다')
+                except BaseException:
+                    f.truncate(offset)
+                    raise
+            session['hasher'] = hasher
+            return offset + written
+    
+    def complete(self, session):
+        """모든 청크를 받았는지와 전체 체크섬을 확인하고 (파일 경로, 내용 해시)를 반환
+        
+        반환된 파일은 호출한 쪽이 옮기거나 지워야 함. 세션 정보는 여기서 제거
+        """
+        meta = session['meta']
+        path = self.data_path(meta['upload_id'])
+        with session['lock']:
+            received = os.path.getsize(path)
+            if received != meta['size']:
+                raise ValueError(f'아직 모든 데이터를 받지 못했습니다 ({received}/{meta["size"]}바이트)')
+            content_hash = self._hasher(session, received).hexdigest()
+            if meta['sha256'] and content_hash != meta['sha256']:
+                self.abort(meta['upload_id'])
+                raise ValueError('파일 체크섬이 일치하지 않습니다')
+            self._forget(meta['upload_id'])
+        return path, content_hash
+    
+    def abort(self, upload_id):
+        self._forget(upload_id)
+        if os.path.exists(self.data_path(upload_id)):
+            os.remove(self.data_path(upload_id))
+    
+    def _forget(self, upload_id):
+        with self.lock:
+            self.sessions.pop(upload_id, None)
+        if os.path.exists(self.meta_path(upload_id)):
+            os.remove(self.meta_path(upload_id))
+    
+    def expire(self):
+        """마지막 청크 이후 UPLOAD_SESSION_TTL이 지난 세션 정리"""
+        deadline = time.time() - app.config['UPLOAD_SESSION_TTL']
+        try:
+            for name in os.listdir(self.folder):
+                path = os.path.join(self.folder, name)
+                if os.path.getmtime(path) < deadline:
+                    upload_id = os.path.splitext(name)[0]
+                    data_path = self.data_path(upload_id)
+                    if not os.path.exists(data_path) or os.path.getmtime(data_path) < deadline:
+                        self._forget(upload_id)
+                        if os.path.exists(path):
+                            os.remove(path)
+        except OSError as e:
+            print(f"Warning: 만료된 업로드 세션 정리 실패: {e}")
+
+upload_sessions = UploadSessions(PARTIAL_FOLDER)
+
+def link_upload_reference(blob_path, reference_path):
+    """blob을 가리키는 사용자 파일 생성 (하드링크가 안 되면 복사)"""
+    try:
+        os.link(blob_path, reference_path)
+    except OSError:
+        shutil.copyfile(blob_path, reference_path)
+
+def remove_upload(filename):
+    """업로드 파일과 인덱스 항목을 삭제하고, 더 이상 참조되지 않는 blob도 정리"""
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    entry = media_index.get(filename)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+    media_index.remove(filename)
+    if entry is not None and entry['content_hash']:
+        blob_path = os.path.join(BLOB_FOLDER, entry['content_hash'])
+        # 하드링크가 하나(blob 자신)만 남았으면 참조하는 파일이 없는 것
+        if os.path.exists(blob_path) and os.stat(blob_path).st_nlink <= 1 \
+                and media_index.find_by_hash(entry['content_hash']) is None:
+            os.remove(blob_path)
+
+def get_indexed_entry(filepath):
+    """업로드 폴더의 파일이면 인덱스 항목을 반환 (없거나 파일이 바뀌었으면 새로 조회)"""
+    filepath = os.path.abspath(filepath)
+    if os.path.dirname(filepath) != os.path.abspath(app.config['UPLOAD_FOLDER']):
+        return None
+    filename = os.path.basename(filepath)
+    entry = media_index.get(filename)
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+        file_type = get_file_type(filename)
+        if file_type is None:
+            return None
+        try:
+            index_upload(filename, file_type)
+        except Exception as e:
+            print(f"Warning: 미디어 정보 인덱싱 실패: {e}")
+            return None
+        entry = media_index.get(filename)
+    return entry
+
+# MoviePy 리더가 파일을 열 때마다 ffmpeg로 다시 조회하지 않도록 인덱스의 출력을 재사용
+original_reader_parse_infos = ffmpeg_reader.ffmpeg_parse_infos
+
+def indexed_ffmpeg_parse_infos(filename, print_infos=False, check_duration=True, fps_source="fps", decode_file=False):
+    if not decode_file:
+        entry = get_indexed_entry(filename)
+        if entry is not None:
+            return ffmpeg_reader.FFmpegInfosParser(
+                entry['ffmpeg_output'],
+                filename,
+                fps_source=fps_source,
+                check_duration=check_duration,
+                decode_file=decode_file
+            ).parse()
+    return original_reader_parse_infos(
+        filename,
+        print_infos=print_infos,
+        check_duration=check_duration,
+        fps_source=fps_source,
+        decode_file=decode_file
+    )
+
+ffmpeg_reader.ffmpeg_parse_infos = indexed_ffmpeg_parse_infos
+audio_readers.ffmpeg_parse_infos = indexed_ffmpeg_parse_infos
+
+# 열린 비디오 리더 / 디코딩된 이미지 풀 설정
+app.config['CLIP_POOL_MAX_IDLE_READERS'] = int(os.environ.get('CLIP_POOL_MAX_IDLE_READERS', 8))
+app.config['CLIP_POOL_IDLE_TTL'] = float(os.environ.get('CLIP_POOL_IDLE_TTL', 300))
+app.config['CLIP_POOL_IMAGE_CACHE_MB'] = int(os.environ.get('CLIP_POOL_IMAGE_CACHE_MB', 256))
+
+class ClipPool:
+    """작업 간에 열린 비디오 리더와 디코딩된 이미지를 재사용하는 풀
+    
+    비디오 리더는 읽기 위치를 가진 상태 객체이므로 한 번에 한 작업에만 빌려주고
+    (사용 중인 리더는 leases로 추적), 반납되면 LRU로 보관했다가 다음 작업에 재사용.
+    이미지는 디코딩된 배열을 읽기 전용으로 공유하고 메모리 한도를 넘으면 오래된 것부터 제거.
+    """
+    def __init__(self, max_idle_readers, idle_ttl, image_cache_bytes):
+        self.max_idle_readers = max_idle_readers
+        self.idle_ttl = idle_ttl
+        self.image_cache_bytes = image_cache_bytes
+        self.lock = threading.Lock()
+        self.idle_readers = OrderedDict()  # id(clip) -> (key, clip, 반납 시각)
+        self.leases = {}  # id(clip) -> (key, clip)
+        self.images = OrderedDict()  # key -> 디코딩된 이미지 배열
+        self.image_bytes = 0
+        self.counters = {
+            'reader_hits': 0,
+            'reader_misses': 0,
+            'reader_evictions': 0,
+            'image_hits': 0,
+            'image_misses': 0,
+            'image_evictions': 0
+        }
+    
+    def file_key(self, filepath):
+        stat = os.stat(filepath)
+        return (os.path.abspath(filepath), stat.st_size, stat.st_mtime)
+    
+    def acquire_video(self, filepath, target_resolution=None):
+        """풀에 쉬고 있는 같은 파일(같은 출력 크기)의 리더가 있으면 빌려주고, 없으면 새로 열기"""
+        key = self.file_key(filepath) + (tuple(target_resolution) if target_resolution else None,)
+        expired = []
+        with self.lock:
+            expired = self._pop_expired()
+            for clip_id, (idle_key, clip, _) in self.idle_readers.items():
+                if idle_key == key:
+                    del self.idle_readers[clip_id]
+                    self.leases[clip_id] = (key, clip)
+                    self.counters['reader_hits'] += 1
+                    break
+            else:
+                clip = None
+                self.counters['reader_misses'] += 1
+        self._close_all(expired)
+        
+        if clip is None:
+            clip = safe_load_video(filepath, target_resolution)
+            with self.lock:
+                self.leases[id(clip)] = (key, clip)
+        return clip
+    
+    def release(self, clip):
+        """빌린 리더를 반납 (풀에서 빌린 것이 아니거나 이미 닫힌 리더는 닫기)"""
+        with self.lock:
+            key, _ = self.leases.pop(id(clip), (None, None))
+        if key is None or not self._reusable(clip):
+            clip.close()
+            return
+        with self.lock:
+            self.idle_readers[id(clip)] = (key, clip, time.time())
+            evicted = self._pop_expired()
+            while len(self.idle_readers) > self.max_idle_readers:
+                evicted.append(self.idle_readers.popitem(last=False)[1][1])
+                self.counters['reader_evictions'] += 1
+        self._close_all(evicted)
+    
+    def image_clip(self, filepath, duration, size=None):
+        """디코딩된 이미지를 재사용하는 ImageClip 생성 (size가 주어지면 그 크기로 한 번만 조정해 보관)"""
+        return ImageClip(self.image_array(filepath, size), duration=duration)
+    
+    def image_array(self, filepath, size=None):
+        """디코딩(및 크기 조정)된 이미지 배열을 캐시에서 꺼내거나 새로 만들기 (읽기 전용)"""
+        key = self.file_key(filepath) + (tuple(size) if size else None,)
+        with self.lock:
+            img = self.images.get(key)
+            if img is not None:
+                self.images.move_to_end(key)
+                self.counters['image_hits'] += 1
+            else:
+                self.counters['image_misses'] += 1
+        
+        if img is None:
+            img = imread(filepath)
+            if size and tuple(size) != (img.shape[1], img.shape[0]):
+                img = np.asarray(Image.fromarray(img).resize(tuple(size), Image.LANCZOS))
+            img.setflags(write=False)  # 여러 작업이 공유하므로 읽기 전용
+            with self.lock:
+                if key not in self.images:
+                    self.images[key] = img
+                    self.image_bytes += img.nbytes
+                while self.image_bytes > self.image_cache_bytes and len(self.images) > 1:
+                    _, evicted = self.images.popitem(last=False)
+                    self.image_bytes -= evicted.nbytes
+                    self.counters['image_evictions'] += 1
+        return img
+    
+    def reader_processes(self):
+        """풀의 리더(쉬고 있거나 빌려준 것)가 쓰고 있는 ffmpeg 프로세스의 id 집합"""
+        with self.lock:
+            clips = [clip for _, clip, _ in self.idle_readers.values()] + [clip for _, clip in self.leases.values()]
+        processes = set()
+        for clip in clips:
+            for reader in (getattr(clip, 'reader', None), getattr(getattr(clip, 'audio', None), 'reader', None)):
+                process = getattr(reader, 'proc', None)
+                if process is not None:
+                    processes.add(id(process))
+        return processes
+    
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                'readers_in_use': len(self.leases),
+                'readers_idle': len(self.idle_readers),
+                'images_cached': len(self.images),
+                'image_cache_bytes': self.image_bytes
+            }
+    
+    def _reusable(self, clip):
+        # 파생 클립의 close()로 공유 리더가 닫혔으면(proc가 None) 재사용하지 않음
+        # (끝까지 읽어 ffmpeg가 스스로 종료된 리더는 다음 읽기에서 다시 시작하므로 재사용 가능)
+        readers = [getattr(clip, 'reader', None)]
+        if clip.audio is not None:
+            readers.append(getattr(clip.audio, 'reader', None))
+        return all(reader is not None and getattr(reader, 'proc', None) is not None for reader in readers)
+    
+    def _pop_expired(self):
+        # lock을 잡은 상태에서 호출: 오래 쉰 리더를 꺼내 반환
+        now = time.time()
+        expired = []
+        for clip_id, (_, clip, released_at) in list(self.idle_readers.items()):
+            if now - released_at > self.idle_ttl:
+                del self.idle_readers[clip_id]
+                expired.append(clip)
+                self.counters['reader_evictions'] += 1
+        return expired
+    
+    def _close_all(self, clips):
+        for clip in clips:
+            try:
+                clip.close()
+            except Exception as e:
+                print(f"Warning: 풀 리더 닫기 실패: {e}")
+
+clip_pool = ClipPool(
+    app.config['CLIP_POOL_MAX_IDLE_READERS'],
+    app.config['CLIP_POOL_IDLE_TTL'],
+    app.config['CLIP_POOL_IMAGE_CACHE_MB'] * 1024 * 1024
+)
+
+class TaskResources:
+    """작업 하나가 연 클립과 하위 프로세스를 모아 두었다가 범위를 벗어날 때(완료, 오류, 취소) 한 번에 정리
+    
+    with TaskResources(task_id) as resources: 안에서 풀의 리더는 video()로 빌리고, 직접 만든 클립
+    (연결/합성 결과, 배경음악 등)은 track()으로 등록함. 범위를 벗어나면 등록한 클립을 역순으로 닫아
+    다른 클립이 아직 참조하는 오디오/리더가 먼저 닫히지 않게 하고, 빌린 리더는 풀에 반납함.
+    범위 안에서는 현재 스레드가 작업에 연결(tracer.bind)되므로, 그동안 시작된 ffmpeg 등 하위 프로세스는
+    작업의 가장 바깥 범위에 등록되고 그 범위가 끝날 때 풀의 리더가 쓰는 것을 빼고 모두 종료/회수됨.
+    task_id가 None이면 클립만 정리함
+    """
+    scopes = {}  # 작업 ID -> 가장 바깥 범위 (하위 프로세스 등록 대상)
+    scopes_lock = threading.Lock()
+    
+    def __init__(self, task_id):
+        self.task_id = task_id
+        self.lock = threading.Lock()
+        self.clips = []  # 닫을 클립 (등록 순)
+        self.leased = []  # 풀에서 빌린 리더
+        self.processes = []
+        self.owner = False
+        self.stack = contextlib.ExitStack()
+    
+    @classmethod
+    def scope_for(cls, task_id):
+        with cls.scopes_lock:
+            return cls.scopes.get(task_id)
+    
+    def __enter__(self):
+        if self.task_id is not None:
+            with self.scopes_lock:
+                if self.task_id not in self.scopes:
+                    self.scopes[self.task_id] = self
+                    self.owner = True
+            self.stack.enter_context(tracer.bind(self.task_id))
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        finally:
+            self.stack.close()
+        return False
+    
+    def video(self, filepath, target_resolution=None):
+        """풀에서 리더를 빌리고 범위가 끝날 때 반납"""
+        clip = clip_pool.acquire_video(filepath, target_resolution)
+        with self.lock:
+            self.leased.append(clip)
+        return clip
+    
+    def image(self, filepath, duration, size=None):
+        return self.track(clip_pool.image_clip(filepath, duration, size))
+    
+    def track(self, clip):
+        """범위가 끝날 때 닫을 클립 등록
+        
+        빌린 리더 자체, 이미 등록한 클립, 빌린 클립의 리더를 공유하는 파생 클립(transform, with_audio 등의
+        얕은 복사본)은 등록하지 않음 - 파생 클립을 닫으면 풀로 돌아갈 공유 리더가 닫히기 때문
+        """
+        with self.lock:
+            if clip is not None and not any(clip is known for known in self.leased + self.clips) \
+                    and not self._shares_leased_reader(clip):
+                self.clips.append(clip)
+        return clip
+    
+    def _shares_leased_reader(self, clip):
+        # lock을 잡은 상태에서 호출
+        leased_readers = set()
+        for leased in self.leased:
+            for reader in (getattr(leased, 'reader', None), getattr(getattr(leased, 'audio', None), 'reader', None)):
+                if reader is not None:
+                    leased_readers.add(id(reader))
+        return any(reader is not None and id(reader) in leased_readers
+                   for reader in (getattr(clip, 'reader', None), getattr(getattr(clip, 'audio', None), 'reader', None)))
+    
+    def add_process(self, process):
+        with self.lock:
+            # 이미 회수된 프로세스는 빼서 긴 작업에서도 목록이 커지지 않게 함
+            if len(self.processes) >= 64:
+                self.processes = [known for known in self.processes if known.returncode is None]
+            self.processes.append(process)
+    
+    def close(self):
+        with tracer.span('close', 'cleanup', task_id=self.task_id) as span_args:
+            with self.lock:
+                clips, self.clips = self.clips, []
+                leased, self.leased = self.leased, []
+            for clip in reversed(clips):
+                try:
+                    clip.close()
+                except Exception as e:
+                    print(f"Warning: 클립 닫기 실패: {e}")
+            for clip in leased:
+                try:
+                    clip_pool.release(clip)
+                except Exception as e:
+                    print(f"Warning: 리더 반납 실패: {e}")
+            if not self.owner:
+                return
+            with self.scopes_lock:
+                self.scopes.pop(self.task_id, None)
+            killed = self.reap_processes()
+            span_args['killed_processes'] = killed
+            if killed:
+                print(f"Warning: 작업이 끝난 뒤에도 실행 중인 하위 프로세스 {killed}개를 종료했습니다 ({self.task_id})")
+                metrics.inc('video_editor_leaked_processes_total', killed)
+    
+    def reap_processes(self):
+        """등록된 하위 프로세스 중 풀의 리더가 쓰는 것을 빼고 종료/회수, 강제로 종료한 수를 반환"""
+        owned = clip_pool.reader_processes()
+        with self.lock:
+            processes, self.processes = self.processes, []
+        killed = 0
+        for process in processes:
+            if id(process) in owned:
+                continue
+            if process.poll() is None:
+                process.kill()
+                killed += 1
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    print(f"Warning: 하위 프로세스가 종료되지 않습니다 (pid {process.pid})")
+            for stream in (process.stdin, process.stdout, process.stderr):
+                if stream is not None:
+                    try:
+                        stream.close()
+                    except OSError:
+                        pass
+        return killed
+
+untracked_popen = subprocess.Popen
+
+def tracked_popen(*args, **kwargs):
+    """하위 프로세스를 실행하고, 현재 스레드가 작업에 연결되어 있으면 그 작업의 TaskResources에 등록"""
+    process = untracked_popen(*args, **kwargs)
+    scope = TaskResources.scope_for(tracer.current())
+    if scope is not None:
+        scope.add_process(process)
+    return process
+
+# MoviePy 리더/writer와 subprocess.run 모두 모듈 속성으로 Popen을 찾으므로 교체로 충분
+subprocess.Popen = tracked_popen
+
+# 시작 시 temp 파일 정리 함수
+def cleanup_temp_files():
+    """서버 시작 시 temp 파일들을 정리"""
+    try:
+        # temp 폴더의 모든 파일 삭제
+        for filename in os.listdir(TEMP_FOLDER):
+            filepath = os.path.join(TEMP_FOLDER, filename)
+            if os.path.isfile(filepath):
+                os.remove(filepath)
+                print(f"Cleaned up temp file: {filename}")
+        
+        # 프로젝트 루트의 임시 파일들도 정리
+        for filename in os.listdir('.'):
+            if (filename.startswith('temp-audio') or 
+                'TEMP_MPY_' in filename or
+                filename.startswith('My_Video') or 
+                filename.endswith('.m4a')):
+                try:
+                    os.remove(filename)
+                    print(f"Cleaned up root temp file: {filename}")
+                except:
+                    pass
+    except Exception as e:
+        print(f"Error during temp file cleanup: {e}")
+
+# 서버 시작 시 temp 파일 정리 실행
+cleanup_temp_files()
+
+# 허용된 파일 확장자
+ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+ALLOWED_IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'bmp'}
+ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'aac', 'm4a', 'ogg'}
+
+def allowed_file(filename, extensions):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in extensions
+
+def get_file_type(filename):
+    """확장자로 파일 타입(video/image/audio) 판별 (지원하지 않으면 None)"""
+    if allowed_file(filename, ALLOWED_VIDEO_EXTENSIONS):
+        return 'video'
+    elif allowed_file(filename, ALLOWED_IMAGE_EXTENSIONS):
+        return 'image'
+    elif allowed_file(filename, ALLOWED_AUDIO_EXTENSIONS):
+        return 'audio'
+    return None
+
+# SocketIO 이벤트 핸들러
+@socketio.on('connect')
+def handle_connect():
+    print(f'클라이언트가 연결되었습니다: {request.sid}')
+    emit('connected', {'data': '서버에 연결되었습니다'})
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    print(f'클라이언트가 연결을 해제했습니다: {request.sid}')
+
+@socketio.on('cancel_task')
+def handle_cancel_task(data):
     task_id = data.get('task_id')
     if task_id:
+        render_queue.cancel(task_id)
+        preview_queue.cancel(task_id)
         task_manager.cancel_task(task_id)
         print(f'작업 취소 요청: {task_id}')
 
@@ -432,6 +2818,21 @@ def handle_resume_task(data):
         task_manager.resume_task(task_id)
         print(f'작업 재개 요청: {task_id}')
 
+@socketio.on('subscribe_task')
+def handle_subscribe_task(data):
+    """작업 방에 들어가 이후 이벤트를 받고, 현재 상태를 바로 전달"""
+    task_id = data.get('task_id')
+    if task_id:
+        join_room(task_room(task_id))
+        for event, payload in task_manager.snapshot_events(task_id):
+            emit(event, payload)
+
+@socketio.on('unsubscribe_task')
+def handle_unsubscribe_task(data):
+    task_id = data.get('task_id')
+    if task_id:
+        leave_room(task_room(task_id))
+
 @socketio.on('get_task_status')
 def handle_get_task_status(data):
     task_id = data.get('task_id')
@@ -452,6 +2853,7 @@ def index():
 @app.route('/upload', methods=['POST'])
 def upload_file():
     """파일 업로드 처리"""
+    started = time.perf_counter()
     try:
         if 'file' not in request.files:
             return jsonify({'error': '파일이 선택되지 않았습니다'}), 400
@@ -461,32 +2863,110 @@ def upload_file():
             return jsonify({'error': '파일이 선택되지 않았습니다'}), 400
         
         # 파일 타입 확인
-        file_type = None
-        if allowed_file(file.filename, ALLOWED_VIDEO_EXTENSIONS):
-            file_type = 'video'
-        elif allowed_file(file.filename, ALLOWED_IMAGE_EXTENSIONS):
-            file_type = 'image'
-        elif allowed_file(file.filename, ALLOWED_AUDIO_EXTENSIONS):
-            file_type = 'audio'
-        else:
+        file_type = get_file_type(file.filename)
+        if file_type is None:
             return jsonify({'error': '지원하지 않는 파일 형식입니다'}), 400
         
-        # 파일 저장
+        # 파일 저장 (내용 해시 기준으로 저장하고 중복 업로드는 기존 파일 재사용)
         filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(filepath)
+        unique_filename, content_hash, deduplicated = store_upload_stream(file.stream, filename)
+        metrics.inc('video_editor_upload_bytes_total',
+                    os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)), method='single')
+        metrics.observe('video_editor_upload_request_seconds', time.perf_counter() - started, method='single')
         
-        return jsonify({
-            'message': '파일이 성공적으로 업로드되었습니다',
-            'filename': unique_filename,
-            'type': file_type,
-            'original_name': filename
-        })
+        # 미디어 정보를 한 번 조회해 인덱스에 저장 (손상된 파일은 여기서 거부)
+        body, status = index_stored_upload(unique_filename, filename, file_type, content_hash, deduplicated)
+        return jsonify(body), status
     
     except Exception as e:
         return jsonify({'error': f'업로드 중 오류가 발생했습니다: {str(e)}'}), 500
 
+@app.route('/upload/init', methods=['POST'])
+def init_chunked_upload():
+    """분할 업로드 시작 - {filename, size, sha256(선택)}을 받아 업로드 ID와 청크 크기를 반환"""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = secure_filename(data.get('filename') or '')
+        if not filename:
+            return jsonify({'error': '파일이 선택되지 않았습니다'}), 400
+        file_type = get_file_type(filename)
+        if file_type is None:
+            return jsonify({'error': '지원하지 않는 파일 형식입니다'}), 400
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': '파일 크기가 필요합니다'}), 400
+        if size <= 0 or size > app.config['UPLOAD_MAX_SIZE']:
+            return jsonify({'error': f'파일 크기는 {app.config["UPLOAD_MAX_SIZE"] // (1024 * 1024)}MB 이하여야 합니다'}), 413
+        sha256 = data.get('sha256')
+        if sha256 and not re.fullmatch(r'[0-9a-fA-F]{64}', sha256):
+            return jsonify({'error': 'sha256 형식이 올바르지 않습니다'}), 400
+        
+        meta = upload_sessions.create(filename, file_type, size, sha256)
+        return jsonify(upload_sessions.status(upload_sessions.get(meta['upload_id']))), 201
+    except Exception as e:
+        return jsonify({'error': f'업로드를 시작하지 못했습니다: {str(e)}'}), 500
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """받은 위치와 진행률 (연결이 끊긴 뒤 이어 보낼 위치 확인용)"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return jsonify({'error': '업로드를 찾을 수 없습니다'}), 404
+    return jsonify(upload_sessions.status(session))
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+def put_upload_chunk(upload_id):
+    """청크 업로드 - 요청 본문을 ?offset= 위치에 그대로 기록 (X-Chunk-SHA256 헤더로 청크 검증)"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return jsonify({'error': '업로드를 찾을 수 없습니다'}), 404
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': 'offset이 필요합니다'}), 400
+    started = time.perf_counter()
+    try:
+        received = upload_sessions.write_chunk(session, offset, request.stream,
+                                               request.headers.get('X-Chunk-SHA256')) - offset
+        metrics.inc('video_editor_upload_bytes_total', received, method='chunked')
+        metrics.observe('video_editor_upload_request_seconds', time.perf_counter() - started, method='chunked')
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e), **upload_sessions.status(session)}), 400
+    except OSError as e:
+        return jsonify({'error': f'청크를 저장하지 못했습니다: {str(e)}'}), 500
+    return jsonify(upload_sessions.status(session))
+
+@app.route('/upload/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """분할 업로드 완료 - 전체 체크섬 확인 후 일반 업로드와 같은 방식으로 저장하고 인덱스에 올림"""
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        return jsonify({'error': '업로드를 찾을 수 없습니다'}), 404
+    meta = session['meta']
+    try:
+        path, content_hash = upload_sessions.complete(session)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        unique_filename, deduplicated = store_upload_file(path, content_hash, meta['filename'])
+    except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
+        return jsonify({'error': f'업로드 중 오류가 발생했습니다: {str(e)}'}), 500
+    body, status = index_stored_upload(unique_filename, meta['filename'], meta['type'], content_hash, deduplicated)
+    return jsonify(body), status
+
+@app.route('/upload/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """분할 업로드 취소 - 받은 데이터 삭제"""
+    if upload_sessions.get(upload_id) is None:
+        return jsonify({'error': '업로드를 찾을 수 없습니다'}), 404
+    upload_sessions.abort(upload_id)
+    return jsonify({'message': '업로드가 취소되었습니다'})
+
 @app.route('/process', methods=['POST'])
 def process_video():
     """비디오 처리 (합치기, 음악 추가, 자막 추가)"""
@@ -497,25 +2977,68 @@ def process_video():
         # 작업 ID 생성
         task_id = str(uuid.uuid4())
         
-        if operation == 'concatenate':
-            # 백그라운드에서 실행
-            thread = threading.Thread(target=concatenate_media_with_progress, args=(data, task_id))
-            thread.start()
-            return jsonify({'task_id': task_id, 'message': '비디오 합치기 작업이 시작되었습니다'})
-        elif operation == 'add_audio':
-            thread = threading.Thread(target=add_audio_to_video_with_progress, args=(data, task_id))
-            thread.start()
-            return jsonify({'task_id': task_id, 'message': '배경음악 추가 작업이 시작되었습니다'})
-        elif operation == 'add_subtitle':
-            thread = threading.Thread(target=add_subtitle_to_video_with_progress, args=(data, task_id))
-            thread.start()
-            return jsonify({'task_id': task_id, 'message': '자막 추가 작업이 시작되었습니다'})
-        elif operation == 'create_final_video':
-            thread = threading.Thread(target=create_final_video_with_progress, args=(data, task_id))
-            thread.start()
-            return jsonify({'task_id': task_id, 'message': '최종 비디오 생성 작업이 시작되었습니다'})
-        else:
+        pipelines = {
+            'concatenate': (concatenate_media_with_progress, '비디오 합치기 작업이 시작되었습니다'),
+            'add_audio': (add_audio_to_video_with_progress, '배경음악 추가 작업이 시작되었습니다'),
+            'add_subtitle': (add_subtitle_to_video_with_progress, '자막 추가 작업이 시작되었습니다'),
+            'create_final_video': (create_final_video_with_progress, '최종 비디오 생성 작업이 시작되었습니다')
+        }
+        if operation not in pipelines:
             return jsonify({'error': '지원하지 않는 작업입니다'}), 400
+        try:
+            get_encoder_profile(data)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'profiles': list(ENCODER_PROFILES)}), 400
+        
+        # 미리보기는 같은 타임라인을 낮은 해상도로 빠르게 만들어 전용 대기열에서 처리
+        queue = render_queue
+        func, message = pipelines[operation]
+        if data.get('preview'):
+            if operation != 'create_final_video':
+                return jsonify({'error': '미리보기는 최종 비디오 생성 작업에서만 지원합니다'}), 400
+            queue = preview_queue
+            func, message = create_preview_with_progress, '미리보기 생성 작업이 시작되었습니다'
+            operation = 'preview'
+        
+        # 같은 최종 비디오가 이미 있으면 바로 반환하고, 같은 작업이 실행 중이면 그 작업에 합류
+        fingerprint = None
+        if operation == 'create_final_video':
+            fingerprint = render_fingerprint(data)
+            state, found = render_cache.lookup(fingerprint, task_id)
+            if state == 'hit':
+                message = '같은 영상이 이미 만들어져 있어 기존 결과를 사용합니다'
+                task_manager.create_task(task_id, operation, 100, status='completed')
+                task_manager.update_progress(task_id, 100, message)
+                task_manager.emit_event('task_completed', {'task_id': task_id, 'output_file': found, 'message': message})
+                return jsonify({'task_id': task_id, 'message': message, 'queue_position': None, 'cached': True,
+                                'output_file': found, 'cache': render_cache.stats()})
+            if state == 'inflight':
+                return jsonify({'task_id': found, 'message': '같은 작업이 이미 진행 중이어서 그 작업에 연결합니다',
+                                'queue_position': queue.position(found), 'deduplicated': True,
+                                'cache': render_cache.stats()})
+        
+        # sample_profile이면 이 작업이 실행되는 동안 샘플링 프로파일러를 붙임 (/trace/<task_id>/profile)
+        if data.get('sample_profile'):
+            tracer.request_profile(task_id)
+        
+        # 렌더 대기열에 등록 (가득 차면 429)
+        position = queue.submit(func, data, task_id, operation)
+        if position is None:
+            if fingerprint is not None:
+                render_cache.abandon(fingerprint, task_id)
+            tracer.take_profile_request(task_id)
+            stats = queue.stats()
+            response = jsonify({
+                'error': '대기 중인 작업이 너무 많습니다. 잠시 후 다시 시도해주세요',
+                'queue_length': stats['queued'],
+                'max_queue': stats['max_queue']
+            })
+            response.headers['Retry-After'] = '30'
+            return response, 429
+        response = {'task_id': task_id, 'message': message, 'queue_position': position}
+        if fingerprint is not None:
+            response['cache'] = render_cache.stats()
+        return jsonify(response)
     except Exception as e:
         return jsonify({'error': f'처리 중 오류가 발생했습니다: {str(e)}'}), 500
 
@@ -525,151 +3048,852 @@ def concatenate_media(data):
     if len(files) < 2:
         return jsonify({'error': '최소 2개의 파일이 필요합니다'}), 400
     
-    clips = []
+    # 불러온 클립은 저장이 실패해도 범위를 벗어날 때 모두 닫힘
+    with TaskResources(None) as resources:
+        clips = []
+        
+        for file_info in files:
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+            
+            if file_info['type'] == 'video':
+                clip = resources.track(safe_load_video(filepath))
+            elif file_info['type'] == 'image':
+                # 이미지는 3초 동안 표시
+                duration = file_info.get('duration', 3)
+                clip = resources.track(ImageClip(filepath, duration=duration))
+            
+            clips.append(clip)
+        
+        # 클립들을 연결
+        final_clip = resources.track(concatenate_videoclips(clips, method="compose"))
+        
+        # 출력 파일명 생성
+        output_filename = f"concatenated_{uuid.uuid4()}.mp4"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        
+        # 비디오 저장
+        safe_write_videofile(final_clip, output_path)
+    
+    return jsonify({
+        'message': '비디오가 성공적으로 합쳐졌습니다',
+        'output_file': output_filename
+    })
+
+def add_audio_to_video(data):
+    """여러 영상을 합치고 전체에 배경음악 추가"""
+    files = data.get('files', [])
+    audio_file = data.get('audio_file')
+    
+    if len(files) < 1:
+        return jsonify({'error': '최소 1개의 비디오/이미지 파일이 필요합니다'}), 400
+    
+    if not audio_file:
+        return jsonify({'error': '배경음악 파일이 필요합니다'}), 400
+    
+    # 불러온 클립은 저장이 실패해도 범위를 벗어날 때 모두 닫힘
+    with TaskResources(None) as resources:
+        clips = []
+        
+        # 모든 비디오/이미지 클립 로드
+        for file_info in files:
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+            
+            if file_info['type'] == 'video':
+                clip = resources.track(safe_load_video(filepath))
+            elif file_info['type'] == 'image':
+                # 이미지는 지정된 시간 또는 기본 3초 동안 표시
+                duration = file_info.get('duration', 3)
+                clip = resources.track(ImageClip(filepath, duration=duration))
+            
+            clips.append(clip)
+        
+        # 모든 클립을 연결하여 하나의 비디오로 만들기
+        if len(clips) > 1:
+            combined_video = resources.track(concatenate_videoclips(clips, method="compose"))
+        else:
+            combined_video = clips[0]
+        
+        # 배경음악 로드
+        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
+        audio_clip = resources.track(safe_load_audio(audio_path))
+        
+        # 배경음악을 비디오 길이에 맞춤
+        if audio_clip.duration > combined_video.duration:
+            # 음악이 더 길면 비디오 길이에 맞춰 자르기
+            audio_clip = audio_clip.subclipped(0, combined_video.duration)
+        else:
+            # 음악이 더 짧으면 반복하여 비디오 길이에 맞춤
+            loops_needed = int(combined_video.duration / audio_clip.duration) + 1
+            repeated_clips = [audio_clip] * loops_needed
+            audio_clip = concatenate_audioclips(repeated_clips).subclipped(0, combined_video.duration)
+        
+        # 비디오에 배경음악 추가
+        final_clip = resources.track(combined_video.with_audio(audio_clip))
+        
+        # 출력 파일명 생성
+        output_filename = f"with_background_music_{uuid.uuid4()}.mp4"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        
+        # 비디오 저장
+        safe_write_videofile(final_clip, output_path)
+    
+    return jsonify({
+        'message': '배경음악이 포함된 비디오가 성공적으로 생성되었습니다',
+        'output_file': output_filename
+    })
+
+def add_subtitle_to_video(data):
+    """비디오에 자막 추가"""
+    video_file = data.get('video_file')
+    subtitle_text = data.get('subtitle_text', '')
+    start_time = data.get('start_time', 0)
+    end_time = data.get('end_time', 5)
+    
+    if not video_file:
+        return jsonify({'error': '비디오 파일이 필요합니다'}), 400
+    
+    video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_file)
+    
+    # 불러온 클립은 저장이 실패해도 범위를 벗어날 때 모두 닫힘
+    with TaskResources(None) as resources:
+        # 비디오 로드
+        video_clip = resources.track(safe_load_video(video_path))
+        
+        # 자막 생성
+        txt_clip = resources.track(create_text_clip_safe(
+            subtitle_text,
+            font_size=50,
+            color='white',
+            stroke_color='black',
+            stroke_width=2
+        ).with_position(('center', 'bottom')).with_duration(end_time - start_time).with_start(start_time))
+        
+        # 비디오에 자막 합성
+        final_clip = resources.track(CompositeVideoClip([video_clip, txt_clip]))
+        
+        # 출력 파일명 생성
+        output_filename = f"with_subtitle_{uuid.uuid4()}.mp4"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        
+        # 비디오 저장
+        safe_write_videofile(final_clip, output_path)
+    
+    return jsonify({
+        'message': '자막이 성공적으로 추가되었습니다',
+        'output_file': output_filename
+    })
+
+def fit_audio_to_duration(audio_clip, duration):
+    """배경음악을 영상 길이에 맞춤 (길면 자르고, 짧으면 반복)"""
+    if audio_clip.duration > duration:
+        return audio_clip.subclipped(0, duration)
+    elif audio_clip.duration < duration:
+        loops = int(duration / audio_clip.duration) + 1
+        repeated_clips = [audio_clip] * loops
+        return concatenate_audioclips(repeated_clips).subclipped(0, duration)
+    return audio_clip
+
+# 배경음악 PCM 디코딩 설정
+AUDIO_MIX_FPS = 44100
+AUDIO_MIX_CHANNELS = 2
+# 반복 한 주기가 이 길이(초)보다 긴 배경음악은 메모리에 디코딩하지 않고 파일에서 스트리밍
+app.config['AUDIO_PCM_MAX_SECONDS'] = float(os.environ.get('AUDIO_PCM_MAX_SECONDS', 600))
+
+def decode_audio_pcm(audio_path, duration=None, fps=AUDIO_MIX_FPS, nchannels=AUDIO_MIX_CHANNELS):
+    """오디오 파일을 한 번 디코딩해 int16 PCM 배열 (샘플 수, 채널 수)로 반환 (duration을 주면 앞에서부터 그 길이까지만)"""
+    limit = ['-t', f'{duration:.6f}'] if duration else []
+    result = subprocess.run(
+        [config.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-i', audio_path] + limit +
+        ['-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', str(nchannels), '-ar', str(fps), '-'],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        raise IOError(f"오디오 디코딩 실패: {result.stderr.decode('utf8', errors='ignore').strip()}")
+    samples = np.frombuffer(result.stdout, dtype=np.int16)
+    samples = samples[:len(samples) - len(samples) % nchannels].reshape(-1, nchannels)
+    if len(samples) == 0:
+        raise IOError("오디오 샘플이 없습니다")
+    return samples
+
+def load_music(audio_path, duration):
+    """duration초 동안 반복 재생할 배경음악 소스 준비
+    
+    반복 한 주기(파일 길이와 필요한 길이 중 짧은 쪽)만 PCM 배열로 디코딩하고,
+    그 주기가 AUDIO_PCM_MAX_SECONDS보다 길면 스트리밍하는 AudioFileClip을 반환 (호출한 쪽에서 닫아야 함)
+    """
+    period = duration
+    try:
+        entry = get_indexed_entry(audio_path)
+        info = entry['info'] if entry is not None else probe_media(audio_path)
+        if info['duration']:
+            period = min(duration, info['duration'])
+    except Exception as e:
+        print(f"Warning: 배경음악 길이 조회 실패, 필요한 길이만큼 디코딩합니다: {e}")
+    if period <= app.config['AUDIO_PCM_MAX_SECONDS']:
+        return decode_audio_pcm(audio_path, period)
+    return AudioFileClip(audio_path, fps=AUDIO_MIX_FPS)
+
+def looped_samples(samples, t, fps, gain):
+    """시간 t(스칼라 또는 배열)에 해당하는 반복 재생 샘플을 gain을 곱해 float로 반환"""
+    index = (np.asarray(t) * fps + 0.00001).astype(np.int64) % len(samples)
+    return samples[index] * (gain / 32768.0)
+
+def music_samples(source, t, fps, gain):
+    """반복 배경음악의 시간 t 샘플 (source: PCM 배열 또는 스트리밍 오디오 클립)"""
+    if isinstance(source, np.ndarray):
+        return looped_samples(source, t, fps, gain)
+    t = np.asarray(t) % source.duration
+    # 스트리밍 리더는 연속 구간만 버퍼링하므로 청크가 처음으로 되돌아가는 지점에서 나눠 읽기
+    if t.ndim and len(t) > 1 and np.any(np.diff(t) < 0):
+        cut = int(np.argmax(np.diff(t) < 0)) + 1
+        return np.concatenate([np.asarray(source.get_frame(t[:cut])), np.asarray(source.get_frame(t[cut:]))]) * gain
+    return np.asarray(source.get_frame(t)) * gain
+
+def close_music(source):
+    if not isinstance(source, np.ndarray):
+        source.close()
+
+class LoopedAudioClip(AudioClip):
+    """PCM 버퍼를 인덱스 연산으로 반복 재생하는 오디오 클립
+    
+    concatenate_audioclips([clip] * loops)와 달리 반복 횟수와 상관없이
+    청크마다 한 번의 배열 인덱싱으로 샘플을 만듦 (긴 배경음악은 스트리밍 클립을 반복)
+    """
+    def __init__(self, source, gain, duration, fps=AUDIO_MIX_FPS):
+        super().__init__(lambda t: music_samples(source, t, fps, gain), duration=duration, fps=fps)
+        self.source = source
+    
+    def close(self):
+        close_music(self.source)
+        super().close()
+
+class MixedAudioClip(AudioClip):
+    """기존 오디오 트랙들과 반복 배경음악을 청크 단위로 섞는 오디오 클립"""
+    def __init__(self, tracks, source, music_gain, duration, fps=AUDIO_MIX_FPS):
+        # tracks: [(오디오 클립, 볼륨 배율), ...]
+        def frame_function(t):
+            mixed = music_samples(source, t, fps, music_gain)
+            for clip, gain in tracks:
+                mixed = mixed + np.asarray(clip.get_frame(t)) * gain
+            return mixed
+        super().__init__(frame_function, duration=duration, fps=fps)
+        self.source = source
+    
+    def close(self):
+        close_music(self.source)
+        super().close()
+
+def load_soundtrack(audio_path, duration, audio_volume=100):
+    """배경음악을 필요한 만큼만 디코딩해 볼륨을 적용하고 영상 길이에 맞춰 반복하는 클립 반환"""
+    return LoopedAudioClip(load_music(audio_path, duration), audio_volume / 100.0, duration)
+
+def remux_with_soundtrack(video_path, audio_clip, output_path, task_id, duration, progress_range):
+    """영상 스트림은 복사하고 새 오디오 트랙만 인코딩해 합치기 (취소되면 False)"""
+    audio_temp = os.path.join(config.TEMP_FOLDER, f'soundtrack-{uuid.uuid4().hex[:8]}.m4a')
+    try:
+        try:
+            audio_clip.write_audiofile(audio_temp, fps=44100, codec='aac', logger=TaskProgressLogger(task_id))
+        except RenderCancelled:
+            return False
+        return run_ffmpeg(
+            ['-i', video_path, '-i', audio_temp,
+             '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy',
+             '-movflags', '+faststart', output_path],
+            task_id=task_id, duration=duration, progress_range=progress_range,
+            message="비디오를 저장 중..."
+        )
+    finally:
+        if os.path.exists(audio_temp):
+            os.remove(audio_temp)
+
+# 최종 비디오 출력 설정
+FINAL_VIDEO_CODEC_SETTINGS = {
+    '480p': {'width': 854, 'height': 480, 'bitrate': '1000k'},
+    '720p': {'width': 1280, 'height': 720, 'bitrate': '2500k'},
+    '1080p': {'width': 1920, 'height': 1080, 'bitrate': '5000k'},
+    'custom': {'bitrate': '3000k'}  # 사용자 정의는 기본 비트레이트만
+}
+
+def get_output_setting(data):
+    """요청의 output_quality에 맞는 출력 해상도/비트레이트 설정 반환"""
+    output_quality = data.get('output_quality', 'medium')
+    output_setting = dict(FINAL_VIDEO_CODEC_SETTINGS.get(output_quality, FINAL_VIDEO_CODEC_SETTINGS['720p']))
+    
+    # 사용자 정의 해상도 처리
+    if output_quality == 'custom' and 'custom_resolution' in data:
+        custom_res = data['custom_resolution']
+        output_setting['width'] = custom_res['width']
+        output_setting['height'] = custom_res['height']
+    return output_setting
+
+# 인코딩 프로필: x264 프리셋, 품질 기준(CRF), 튜닝, 요청 비트레이트를 상한(maxrate)으로 쓸지 여부
+# still_preset은 움직임 분석이 필요 없는 정지 화면 슬라이드쇼에 쓰는 프리셋
+ENCODER_PROFILES = {
+    'draft': {'preset': 'ultrafast', 'still_preset': 'ultrafast', 'crf': 30, 'tune': 'fastdecode', 'cap_bitrate': False},
+    'standard': {'preset': 'medium', 'still_preset': 'veryfast', 'crf': 23, 'tune': None, 'cap_bitrate': True},
+    'archive': {'preset': 'slow', 'still_preset': 'medium', 'crf': 18, 'tune': None, 'cap_bitrate': False}
+}
+app.config['ENCODER_PROFILE'] = os.environ.get('ENCODER_PROFILE', 'standard')
+
+# 동시에 실행되는 모든 인코딩이 나눠 쓰는 x264 스레드 수 (기본: CPU 코어 수)
+app.config['ENCODE_THREAD_BUDGET'] = int(os.environ.get('ENCODE_THREAD_BUDGET', os.cpu_count() or 4))
+
+class EncodeCounter:
+    """한 프로세스 안에서만 쓰는 실행 중인 인코딩 수 (multiprocessing.Value와 같은 value/get_lock 인터페이스)"""
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+    
+    def get_lock(self):
+        return self.lock
+
+# 실행 중인 인코딩 수: 프로세스 실행기를 쓸 때만 fork된 렌더 워커와 공유하는 공유 메모리 값을 만들고
+# 스레드 실행기만 쓰면 lock으로 보호하는 일반 정수로 충분
+if 'process' in (render_queue.executor, preview_queue.executor):
+    active_encodes = multiprocessing.get_context('fork').Value('i', 0)
+else:
+    active_encodes = EncodeCounter()
+
+def get_encoder_profile(data):
+    """요청의 encoder_profile (없으면 기본 프로필), 알 수 없는 이름이면 ValueError"""
+    profile = data.get('encoder_profile') or app.config['ENCODER_PROFILE']
+    if profile not in ENCODER_PROFILES:
+        raise ValueError(f'알 수 없는 인코딩 프로필입니다: {profile}')
+    return profile
+
+def encoder_options(profile, bitrate=None, still=False):
+    """프로필의 (x264 프리셋, 추가 ffmpeg 인자)"""
+    settings = ENCODER_PROFILES[profile]
+    params = ['-crf', str(settings['crf'])]
+    tune = 'stillimage' if still else settings['tune']
+    if tune:
+        params += ['-tune', tune]
+    if bitrate and settings['cap_bitrate']:
+        params += ['-maxrate', bitrate, '-bufsize', f'{int(bitrate.rstrip("k")) * 2}k']
+    return settings['still_preset' if still else 'preset'], params
+
+@contextlib.contextmanager
+def encode_slot():
+    """인코딩 하나를 등록하고 이 인코딩이 쓸 스레드 수를 반환
+    
+    스레드 예산을 그 시점에 실행 중인 인코딩 수로 나눠, 동시에 도는 렌더들이 각자 모든 코어를
+    잡아 서로 밀어내지 않게 함 (먼저 시작한 인코딩의 스레드 수는 바뀌지 않음)
+    """
+    with active_encodes.get_lock():
+        active_encodes.value += 1
+        active = active_encodes.value
+    try:
+        yield max(1, app.config['ENCODE_THREAD_BUDGET'] // active)
+    finally:
+        with active_encodes.get_lock():
+            active_encodes.value -= 1
+
+def record_encode(profile, frames, seconds, threads):
+    """완료된 인코딩의 프레임 수/소요 시간을 프로필별 통계와 메트릭에 누적"""
+    metrics.observe('video_editor_stage_duration_seconds', seconds, stage='encode')
+    if seconds > 0:
+        metrics.observe('video_editor_encode_fps', frames / seconds, profile=profile)
+    try:
+        task_store.record_encode(profile, int(frames), seconds, threads)
+    except Exception as e:
+        print(f"Warning: 인코딩 통계 기록 실패: {e}")
+
+def plan_input_sizes(files, output_size):
+    """입력별로 로딩할 크기와 세로 배율을 계산
     
+    기존에는 concatenate_videoclips(method="compose")가 가장 큰 입력 크기의 캔버스에
+    합성한 뒤 전체를 출력 해상도로 늘였으므로, 같은 결과가 되도록 각 입력을
+    (출력 크기 / 캔버스 크기) 배율로 미리 조정함. 입력 크기를 알 수 없으면 조정하지 않음.
+    ([입력별 (너비, 높이) 또는 None], 세로 배율)을 반환
+    """
+    no_scaling = ([None] * len(files), 1.0)
+    if output_size is None:
+        return no_scaling
+    
+    source_sizes = []
     for file_info in files:
+        entry = get_indexed_entry(os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename']))
+        if entry is None or not entry['info']['width'] or not entry['info']['height']:
+            return no_scaling
+        info = entry['info']
+        width, height = info['width'], info['height']
+        # 회전 메타데이터가 있는 영상은 화면에 보이는 방향 기준
+        if file_info['type'] == 'video' and info['rotation'] in (90, 270):
+            width, height = height, width
+        source_sizes.append((width, height))
+    
+    canvas_width = max(width for width, _ in source_sizes)
+    canvas_height = max(height for _, height in source_sizes)
+    scale_x = output_size[0] / canvas_width
+    scale_y = output_size[1] / canvas_height
+    
+    target_sizes = []
+    for width, height in source_sizes:
+        target = (max(1, round(width * scale_x)), max(1, round(height * scale_y)))
+        # 이미 출력 기준 크기와 같으면 조정하지 않음
+        target_sizes.append(None if target == (width, height) else target)
+    return target_sizes, scale_y
+
+def build_final_timeline(data, task_id, resources, report=None, video_only=False, shared=None):
+    """최종 비디오 타임라인 구성 (파일 로딩 → 연결 → 배경음악 → 자막 → 해상도 조정)
+    
+    불러온 클립과 결과 클립은 resources(TaskResources)에 등록되어 범위가 끝날 때 정리됨.
+    report(step_delta, message)가 주어지면 단계별 진행상황을 알림.
+    video_only면 배경음악 디코딩/믹싱을 건너뛰고 오디오 없는 타임라인을 만듦 (구간 병렬 인코딩용).
+    shared(dict)를 넘기면 처음 만든 자막 오버레이를 넣어 두고 같은 dict를 받은 다음 구성에서 재사용.
+    취소되면 None, 아니면 final_clip을 반환
+    """
+    if report is None:
+        report = lambda step_delta, message: None
+    
+    files = data.get('files', [])
+    audio_file = data.get('audio_file')
+    audio_volume = data.get('audio_volume', 50)
+    subtitles = data.get('subtitles', [])
+    clips = []
+    
+    # 입력마다 출력 해상도 기준 크기를 미리 계산 (합성 후가 아니라 로딩 시 한 번만 크기 조정)
+    output_setting = get_output_setting(data)
+    output_size = (output_setting['width'], output_setting['height']) if 'width' in output_setting else None
+    target_sizes, scale_y = plan_input_sizes(files, output_size)
+    
+    # 1단계: 모든 파일을 클립으로 변환
+    report(0, "파일을 로딩 중...")
+    stage_started = time.perf_counter()
+    for i, file_info in enumerate(files):
+        if task_manager.is_cancelled(task_id):
+            return None
+        task_manager.wait_if_paused(task_id)
+        
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
         
-        if file_info['type'] == 'video':
-            clip = safe_load_video(filepath)
-        elif file_info['type'] == 'image':
-            # 이미지는 3초 동안 표시
-            duration = file_info.get('duration', 3)
-            clip = ImageClip(filepath, duration=duration)
+        with tracer.span('load_file', 'load', filename=file_info['filename'], type=file_info['type']):
+            if file_info['type'] == 'video':
+                clip = resources.video(filepath, target_sizes[i])
+            elif file_info['type'] == 'image':
+                duration = file_info.get('duration', 3)
+                clip = resources.image(filepath, duration, target_sizes[i])
+        
+        clips.append(clip)
+        report(1, f"파일 {i+1}/{len(files)} 로딩 완료")
+    observe_stage('load', stage_started)
+    
+    # 2단계: 클립들을 연결
+    if task_manager.is_cancelled(task_id):
+        return None
+    task_manager.wait_if_paused(task_id)
+    
+    report(0, "비디오 클립을 연결 중...")
+    stage_started = time.perf_counter()
+    if len(clips) > 1:
+        final_clip = concatenate_videoclips(clips, method="compose")
+    else:
+        final_clip = clips[0]
+    # 이미지로만 구성되면 fps 정보가 없으므로 슬라이드쇼 기본값 사용
+    if final_clip.fps is None:
+        final_clip = final_clip.with_fps(app.config['SLIDESHOW_FPS'])
+    observe_stage('concatenate', stage_started)
+    report(10, "비디오 연결 완료")
+    
+    # 3단계: 배경음악 추가 (있는 경우)
+    if video_only:
+        final_clip = final_clip.without_audio()
+    elif audio_file:
+        if task_manager.is_cancelled(task_id):
+            return None
+        task_manager.wait_if_paused(task_id)
+        
+        report(0, "배경음악을 처리 중...")
+        stage_started = time.perf_counter()
+        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
+        with tracer.span('decode_audio', 'audio', filename=audio_file) as span_args:
+            music = load_music(audio_path, final_clip.duration)
+            if isinstance(music, np.ndarray):
+                span_args['samples'] = len(music)
+            else:
+                span_args['streamed'] = True
+                resources.track(music)
+        report(4, "배경음악 디코딩 완료")
+        
+        # 오디오 볼륨/길이 조정 (PCM 버퍼를 인덱스 연산으로 반복)
+        music_gain = audio_volume / 100.0
+        report(3, "오디오 길이 조정 완료")
+        
+        # 오디오 믹싱 (기존 오디오 70% + 배경음악 30%)
+        with tracer.span('build_audio_loop', 'audio', mixed=final_clip.audio is not None):
+            if final_clip.audio is not None:
+                final_audio = MixedAudioClip(
+                    [(final_clip.audio, 0.7)],
+                    music,
+                    music_gain * 0.3,
+                    final_clip.duration
+                )
+            else:
+                final_audio = LoopedAudioClip(music, music_gain, final_clip.duration)
+            
+            final_clip = final_clip.with_audio(final_audio)
+        observe_stage('audio_mix', stage_started)
+        report(3, "배경음악 추가 완료")
+    
+    # 4단계: 자막 추가 (있는 경우)
+    if shared is not None and 'subtitle_overlay' in shared:
+        if shared['subtitle_overlay'] is not None:
+            final_clip = final_clip.transform(shared['subtitle_overlay'])
+    elif subtitles:
+        if task_manager.is_cancelled(task_id):
+            return None
+        task_manager.wait_if_paused(task_id)
+        
+        report(0, "자막을 추가 중...")
+        stage_started = time.perf_counter()
+        overlay_entries = []
+        
+        for i, subtitle in enumerate(subtitles):
+            if task_manager.is_cancelled(task_id):
+                return None
+            task_manager.wait_if_paused(task_id)
+            
+            try:
+                # 출력 해상도에서 원래와 같은 비율의 크기로 렌더링
+                with tracer.span('rasterize_subtitle', 'subtitle', index=i, chars=len(subtitle['text'])):
+                    rgb, alpha = rasterize_subtitle(
+                        subtitle['text'],
+                        font_size=max(1, round(50 * scale_y)),
+                        color='white',
+                        stroke_color='black',
+                        stroke_width=max(1, round(2 * scale_y))
+                    )
+            except Exception as e:
+                # 안전한 함수 실행에도 실패하면 로그만 남기고 건너뛰기
+                print(f"Error: 자막 생성 완전 실패: {e}")
+                continue
+            
+            overlay_entries.append((subtitle['start_time'], subtitle['end_time'], rgb, alpha))
+            report(2, f"자막 {i+1}/{len(subtitles)} 추가 완료")
         
-        clips.append(clip)
-    
-    # 클립들을 연결
-    final_clip = concatenate_videoclips(clips, method="compose")
-    
-    # 출력 파일명 생성
-    output_filename = f"concatenated_{uuid.uuid4()}.mp4"
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        overlay = SubtitleOverlay(overlay_entries) if overlay_entries else None
+        if shared is not None:
+            shared['subtitle_overlay'] = overlay
+        if overlay is not None:
+            final_clip = final_clip.transform(overlay)
+        observe_stage('subtitle', stage_started)
     
-    # 비디오 저장
-    safe_write_videofile(final_clip, output_path)
+    # 5단계: 입력 정보가 없어 미리 조정하지 못한 경우에만 합성 결과의 해상도 조정
+    if output_size is not None and tuple(final_clip.size) != output_size:
+        final_clip = final_clip.resized(output_size)
     
-    # 메모리 정리
-    for clip in clips:
-        clip.close()
-    final_clip.close()
-    
-    return jsonify({
-        'message': '비디오가 성공적으로 합쳐졌습니다',
-        'output_file': output_filename
-    })
+    return resources.track(final_clip)
 
-def add_audio_to_video(data):
-    """여러 영상을 합치고 전체에 배경음악 추가"""
-    files = data.get('files', [])
-    audio_file = data.get('audio_file')
-    
-    if len(files) < 1:
-        return jsonify({'error': '최소 1개의 비디오/이미지 파일이 필요합니다'}), 400
+# 이미지 슬라이드쇼 출력 fps
+app.config['SLIDESHOW_FPS'] = int(os.environ.get('SLIDESHOW_FPS', 24))
+
+def compose_still_frame(img, canvas_size):
+    """이미지를 검은 캔버스 중앙에 합성한 RGB 프레임 (compose 방식 연결과 같은 배치)"""
+    if img.ndim == 2:
+        img = np.stack([img] * 3, axis=-1)
+    canvas_width, canvas_height = canvas_size
+    height, width = img.shape[:2]
+    rgb = img[:, :, :3]
+    if img.shape[2] == 4:
+        # 투명 영역은 검은 배경과 합성
+        rgb = (rgb * (img[:, :, 3:4] / 255.0)).astype(np.uint8)
+    if (width, height) == (canvas_width, canvas_height):
+        return rgb
+    frame = np.zeros((canvas_height, canvas_width, 3), dtype=np.uint8)
+    x, y = (canvas_width - width) // 2, (canvas_height - height) // 2
+    frame[y:y + height, x:x + width] = rgb
+    return frame
+
+def render_still_slideshow(files, output_path, task_id, progress_range, output_size=None,
+                           bitrate=None, subtitles=(), audio_path=None, audio_volume=100, profile='standard'):
+    """이미지로만 구성된 타임라인을 정지 화면 전용 방식으로 인코딩
     
-    if not audio_file:
-        return jsonify({'error': '배경음악 파일이 필요합니다'}), 400
+    이미지마다 디코딩/크기 조정/합성을 한 번만 하고(자막이 바뀌는 구간은 그 구간만 한 번 더),
+    그 결과를 ffmpeg concat demuxer에 표시 길이와 함께 넘겨 fps 필터가 같은 프레임을
+    복제하게 함. x264에는 정지 화면용 튜닝을 적용.
+    적용할 수 없으면 None, 취소되면 False, 완료되면 True를 반환
+    """
+    if not files or any(file_info['type'] != 'image' for file_info in files):
+        return None
     
-    clips = []
+    start_step, end_step = progress_range
+    prepare_end = start_step + (end_step - start_step) * 3 // 10
+    encode_end = start_step + (end_step - start_step) * 9 // 10 if audio_path else end_step
     
-    # 모든 비디오/이미지 클립 로드
-    for file_info in files:
+    # 1) 이미지를 출력 기준 크기로 한 번만 디코딩/조정
+    target_sizes, scale_y = plan_input_sizes(files, output_size)
+    images, durations = [], []
+    for i, file_info in enumerate(files):
+        if task_manager.is_cancelled(task_id):
+            return False
+        task_manager.wait_if_paused(task_id)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
-        
-        if file_info['type'] == 'video':
-            clip = safe_load_video(filepath)
-        elif file_info['type'] == 'image':
-            # 이미지는 지정된 시간 또는 기본 3초 동안 표시
-            duration = file_info.get('duration', 3)
-            clip = ImageClip(filepath, duration=duration)
-        
-        clips.append(clip)
-    
-    # 모든 클립을 연결하여 하나의 비디오로 만들기
-    if len(clips) > 1:
-        combined_video = concatenate_videoclips(clips, method="compose")
-    else:
-        combined_video = clips[0]
-    
-    # 배경음악 로드
-    audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
-    audio_clip = safe_load_audio(audio_path)
-    
-    # 배경음악을 비디오 길이에 맞춤
-    if audio_clip.duration > combined_video.duration:
-        # 음악이 더 길면 비디오 길이에 맞춰 자르기
-        audio_clip = audio_clip.subclipped(0, combined_video.duration)
-    else:
-        # 음악이 더 짧으면 반복하여 비디오 길이에 맞춤
-        loops_needed = int(combined_video.duration / audio_clip.duration) + 1
-        repeated_clips = [audio_clip] * loops_needed
-        audio_clip = concatenate_audioclips(repeated_clips).subclipped(0, combined_video.duration)
-    
-    # 비디오에 배경음악 추가
-    final_clip = combined_video.with_audio(audio_clip)
+        images.append(clip_pool.image_array(filepath, target_sizes[i]))
+        durations.append(float(file_info.get('duration', 3)))
+        task_manager.update_progress(
+            task_id, start_step + (prepare_end - start_step) * (i + 1) // (len(files) * 2),
+            f"이미지 {i+1}/{len(files)} 준비 완료"
+        )
     
-    # 출력 파일명 생성
-    output_filename = f"with_background_music_{uuid.uuid4()}.mp4"
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+    canvas_width = max(img.shape[1] for img in images)
+    canvas_height = max(img.shape[0] for img in images)
+    if output_size is not None and (canvas_width, canvas_height) != tuple(output_size):
+        # 입력 크기를 미리 알 수 없었던 경우는 일반 경로에서 처리
+        return None
+    canvas_size = (canvas_width, canvas_height)
+    total_duration = sum(durations)
     
-    # 비디오 저장
-    safe_write_videofile(final_clip, output_path)
+    # 2) 자막 비트맵 준비 (출력 해상도 기준 크기)
+    overlay_entries = []
+    for subtitle in subtitles:
+        try:
+            rgb, alpha = rasterize_subtitle(
+                subtitle['text'],
+                font_size=max(1, round(50 * scale_y)),
+                color='white',
+                stroke_color='black',
+                stroke_width=max(1, round(2 * scale_y))
+            )
+        except Exception as e:
+            print(f"Error: 자막 생성 완전 실패: {e}")
+            continue
+        overlay_entries.append((subtitle['start_time'], subtitle['end_time'], rgb, alpha))
+    overlay = SubtitleOverlay(overlay_entries)
     
-    # 메모리 정리
-    for clip in clips:
-        clip.close()
-    combined_video.close()
-    audio_clip.close()
-    final_clip.close()
+    # 3) 이미지/자막 경계로 나눈 구간마다 프레임을 한 번만 만들어 저장
+    image_starts = [0.0]
+    for duration in durations:
+        image_starts.append(image_starts[-1] + duration)
+    boundaries = set(image_starts)
+    for start, end, _, _ in overlay_entries:
+        boundaries.update(t for t in (start, end) if 0 < t < total_duration)
+    boundaries = sorted(boundaries)
     
-    return jsonify({
-        'message': '배경음악이 포함된 비디오가 성공적으로 생성되었습니다',
-        'output_file': output_filename
-    })
+    work_dir = tempfile.mkdtemp(prefix='slideshow-', dir=config.TEMP_FOLDER)
+    try:
+        frame_paths = {}
+        entries = []
+        for start, end in zip(boundaries, boundaries[1:]):
+            if end - start <= 0:
+                continue
+            index = bisect.bisect_right(image_starts, start) - 1
+            active = tuple(i for i, entry in enumerate(overlay.entries) if entry[0] <= start < entry[1])
+            key = (index, active)
+            if key not in frame_paths:
+                if task_manager.is_cancelled(task_id):
+                    return False
+                base = compose_still_frame(images[index], canvas_size)
+                frame = overlay(lambda t: base, start) if active else base
+                frame_paths[key] = os.path.join(work_dir, f'{len(frame_paths):05d}.png')
+                Image.fromarray(frame).save(frame_paths[key], compress_level=1)
+            entries.append((frame_paths[key], end - start))
+        task_manager.update_progress(task_id, prepare_end, "슬라이드쇼 프레임 준비 완료")
+        
+        # 이미지 demuxer 기본 시간 단위(1/25초)로 구간 경계가 밀리지 않도록 framerate를 지정하고,
+        # 마지막 항목의 길이가 반영되도록 파일을 한 번 더 적음
+        list_path = os.path.join(work_dir, 'slides.ffconcat')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write("ffconcat version 1.0\n")
+            for frame_path, duration in entries + [(entries[-1][0], None)]:
+                f.write(f"file '{os.path.abspath(frame_path)}'\noption framerate 1000\n")
+                if duration is not None:
+                    f.write(f"duration {duration:.3f}\n")
+        
+        video_path = os.path.join(work_dir, 'video.mp4') if audio_path else output_path
+        # 크기/픽셀 포맷 변환은 고유 프레임마다 한 번만 하고 fps 필터가 그 결과를 복제
+        # (구간 시작 이후 첫 프레임부터 해당 이미지가 보이도록 올림)
+        video_filter = (f"pad=ceil(iw/2)*2:ceil(ih/2)*2,format=yuv420p,"
+                        f"fps={app.config['SLIDESHOW_FPS']}:round=up")
+        # 같은 프레임이 반복되는 구간은 분석할 움직임이 없으므로 프로필의 정지 화면용 빠른 프리셋과
+        # 정지 화면 튜닝을 쓰고, 고정 비트레이트 대신 품질 기준(CRF)으로 인코딩 (비트레이트는 상한으로만 적용)
+        preset, profile_params = encoder_options(profile, bitrate, still=True)
+        with encode_slot() as threads:
+            args = ['-f', 'concat', '-safe', '0', '-i', list_path,
+                    '-vf', video_filter,
+                    '-t', f'{total_duration:.6f}',
+                    '-c:v', 'libx264', '-preset', preset, '-threads', str(threads)] + profile_params
+            args += ['-movflags', '+faststart', video_path]
+            started = time.perf_counter()
+            finished = run_ffmpeg(args, task_id=task_id, duration=total_duration,
+                                  progress_range=(prepare_end, encode_end), message="슬라이드쇼를 인코딩 중...")
+            if finished:
+                record_encode(f'{profile}/still', total_duration * app.config['SLIDESHOW_FPS'],
+                              time.perf_counter() - started, threads)
+        if not finished or not audio_path:
+            return finished
+        
+        # 4) 배경음악은 영상 스트림을 복사하며 한 번만 합치기
+        soundtrack = load_soundtrack(audio_path, total_duration, audio_volume)
+        try:
+            return remux_with_soundtrack(video_path, soundtrack, output_path, task_id,
+                                         total_duration, (encode_end, end_step))
+        finally:
+            soundtrack.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
-def add_subtitle_to_video(data):
-    """비디오에 자막 추가"""
-    video_file = data.get('video_file')
-    subtitle_text = data.get('subtitle_text', '')
-    start_time = data.get('start_time', 0)
-    end_time = data.get('end_time', 5)
-    
-    if not video_file:
-        return jsonify({'error': '비디오 파일이 필요합니다'}), 400
-    
-    video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_file)
+# 구간 병렬 렌더링 설정: 요청당 구간 수와 구간 하나의 최소 길이(초)
+app.config['RENDER_SEGMENTS'] = int(os.environ.get('RENDER_SEGMENTS', 1))
+app.config['SEGMENT_MIN_DURATION'] = float(os.environ.get('SEGMENT_MIN_DURATION', 30))
+# 긴 렌더는 이 길이(초) 단위 구간으로 나눠 완료될 때마다 체크포인트로 기록 (기본 0: 사용 안 함)
+# 값을 주면 RENDER_SEGMENTS=1이어도 이보다 긴 최종 영상은 한 번의 인코딩 대신
+# 구간을 순서대로 인코딩한 뒤 스트림 복사로 합치는 경로를 탐 (예: 60)
+app.config['CHECKPOINT_SEGMENT_DURATION'] = float(os.environ.get('CHECKPOINT_SEGMENT_DURATION', 0))
+
+class SegmentJoinError(RuntimeError):
+    """구간을 이어붙인 결과에서 구간 경계가 키프레임에 있지 않음"""
+    pass
+
+def verify_segment_joins(output_path, join_times, fps):
+    """이어붙인 영상의 각 구간 시작 시각이 키프레임인지 확인 (아니면 SegmentJoinError)"""
+    if not join_times:
+        return
+    keyframes = read_keyframe_times(output_path)
+    tolerance = 0.5 / fps
+    missing = [t for t in join_times if not any(abs(k - t) <= tolerance for k in keyframes)]
+    if missing:
+        raise SegmentJoinError(f"키프레임이 아닌 구간 경계 {len(missing)}곳: {', '.join(f'{t:.3f}s' for t in missing[:5])}")
+
+class SegmentProgressLogger(TaskProgressLogger):
+    """write_videofile의 프레임 진행상황을 구간별로 모아 TaskManager에 전달 (취소/일시정지 확인 포함)"""
+    def __init__(self, tracker, index):
+        super().__init__(tracker.task_id)
+        self.tracker = tracker
+        self.index = index
     
-    # 비디오 로드
-    video_clip = safe_load_video(video_path)
+    def report(self, fraction):
+        self.tracker.update(self.index, fraction)
+
+class SegmentProgressTracker:
+    """구간별 진행률을 합쳐 하나의 진행상황으로 보고"""
+    def __init__(self, task_id, segments, progress_range):
+        self.task_id = task_id
+        self.done = [0.0] * segments
+        self.progress_range = progress_range
+        self.lock = threading.Lock()
+        self.last_report = 0
     
-    # 자막 생성
-    txt_clip = create_text_clip_safe(
-        subtitle_text,
-        font_size=50,
-        color='white',
-        stroke_color='black',
-        stroke_width=2
-    ).with_position(('center', 'bottom')).with_duration(end_time - start_time).with_start(start_time)
+    def update(self, index, fraction):
+        with self.lock:
+            self.done[index] = fraction
+            now = time.time()
+            if now - self.last_report < 0.5 and fraction < 1.0:
+                return
+            self.last_report = now
+            overall = sum(self.done) / len(self.done)
+            finished = sum(1 for value in self.done if value >= 1.0)
+        start_step, end_step = self.progress_range
+        task_manager.update_progress(
+            self.task_id,
+            start_step + int((end_step - start_step) * overall),
+            f"구간 병렬 저장 중... {int(overall * 100)}% (완료 구간 {finished}/{len(self.done)})"
+        )
+
+def plan_segments(duration, fps, segments):
+    """타임라인을 프레임 경계에 맞춘 segments개의 (시작, 끝) 구간으로 분할"""
+    total_frames = int(round(duration * fps))
+    bounds = [int(round(total_frames * i / segments)) for i in range(segments + 1)]
+    return [(bounds[i] / fps, bounds[i + 1] / fps) for i in range(segments) if bounds[i + 1] > bounds[i]]
+
+def render_segments_parallel(final_clip, build_clip, output_path, task_id, segments, progress_range,
+                             workers=None, **write_kwargs):
+    """타임라인을 여러 구간으로 나눠 인코딩한 뒤 스트림 복사로 합치기
     
-    # 비디오에 자막 합성
-    final_clip = CompositeVideoClip([video_clip, txt_clip])
+    MoviePy 리더는 읽기 위치를 가진 상태 객체라 동시에 인코딩하는 구간마다 build_clip(resources)로
+    구간 전용 TaskResources에 독립된 영상 전용 타임라인을 새로 구성함 (workers가 1이면 final_clip을 순서대로 사용).
+    오디오는 구간 경계의 끊김을 피하기 위해 final_clip에서 한 번에 인코딩해 마지막에 합침.
+    구간마다 첫 프레임을 키프레임으로 인코딩하고, 합친 뒤 경계가 모두 키프레임인지 확인함 (아니면 SegmentJoinError).
+    완료된 구간은 작업별 체크포인트 폴더에 남기고 작업 저장소에 기록하므로, 서버가 중간에
+    종료되어도 다시 시작된 작업은 마지막으로 끝난 구간 다음부터 이어서 인코딩함.
+    취소되면 False, 완료되면 True를 반환
+    """
+    workers = max(1, min(workers or segments, segments))
+    fps = final_clip.fps or 24
+    ranges = plan_segments(final_clip.duration, fps, segments)
+    checkpoint_dir = os.path.join(CHECKPOINT_FOLDER, task_id)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    segment_paths = [os.path.join(checkpoint_dir, f'segment-{i}.mp4') for i in range(len(ranges))]
+    audio_path = os.path.join(checkpoint_dir, 'audio.m4a')
+    list_path = os.path.join(checkpoint_dir, 'segments.txt')
+    tracker = SegmentProgressTracker(task_id, len(ranges), progress_range)
     
-    # 출력 파일명 생성
-    output_filename = f"with_subtitle_{uuid.uuid4()}.mp4"
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+    # 이전 실행에서 끝낸 구간 중 같은 범위로 계획된 것은 재사용
+    finished = set()
+    for index, (start, end, path) in task_store.checkpoints(task_id).items():
+        if index == -1:
+            planned = (0.0, final_clip.duration)  # 오디오 트랙
+        elif index < len(ranges):
+            planned = ranges[index]
+        else:
+            continue
+        if os.path.exists(path) and abs(start - planned[0]) < 1e-6 and abs(end - planned[1]) < 1e-6:
+            finished.add(index)
+            if index >= 0:
+                tracker.done[index] = 1.0
+    if finished:
+        print(f"체크포인트에서 이어서 렌더링 ({task_id}): 완료 구간 {len(finished - {-1})}/{len(ranges)}")
     
-    # 비디오 저장
-    safe_write_videofile(final_clip, output_path)
+    def write_segment(index):
+        if task_manager.is_cancelled(task_id) or index in finished:
+            return
+        start, end = ranges[index]
+        # 스레드 풀에서 실행되므로 이 스레드의 구간 기록과 하위 프로세스를 작업에 연결
+        with tracer.bind(task_id), tracer.span('segment', 'segment', index=index, start=start, end=end), \
+                TaskResources(task_id) as segment_resources:
+            segment_clip = build_clip(segment_resources) if workers > 1 else final_clip
+            if segment_clip is None:
+                return
+            # 구간 첫 프레임을 키프레임(IDR)으로 고정해 스트림 복사로 이어붙인 경계에서 바로 디코딩되게 함
+            done = safe_write_videofile(
+                segment_clip.subclipped(start, end).with_fps(fps),
+                segment_paths[index],
+                audio=False,
+                faststart=False,
+                logger=SegmentProgressLogger(tracker, index),
+                ffmpeg_params=['-force_key_frames', 'expr:eq(n,0)'],
+                **write_kwargs
+            )
+            if done:
+                task_store.add_checkpoint(task_id, index, start, end, segment_paths[index])
     
-    # 메모리 정리
-    video_clip.close()
-    txt_clip.close()
-    final_clip.close()
+    def write_audio():
+        if final_clip.audio is None or -1 in finished or task_manager.is_cancelled(task_id):
+            return
+        with tracer.bind(task_id), tracer.span('audio_track', 'encode'):
+            try:
+                final_clip.audio.write_audiofile(audio_path, fps=44100, codec='aac',
+                                                 logger=TaskProgressLogger(task_id))
+            except RenderCancelled:
+                return
+        task_store.add_checkpoint(task_id, -1, 0.0, final_clip.duration, audio_path)
     
-    return jsonify({
-        'message': '자막이 성공적으로 추가되었습니다',
-        'output_file': output_filename
-    })
+    try:
+        # 오디오 트랙은 별도 스레드에서 인코딩 (같은 풀을 쓰면 오디오가 끝난 뒤 workers보다 많은 구간이
+        # 동시에 실행되어, workers가 1일 때 final_clip의 리더를 두 구간이 함께 읽게 됨)
+        with ThreadPoolExecutor(max_workers=1) as audio_executor, ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [audio_executor.submit(write_audio)]
+            futures += [executor.submit(write_segment, i) for i in range(len(ranges))]
+            for future in futures:
+                future.result()
+        if task_manager.is_cancelled(task_id):
+            return False
+        
+        # 구간들을 스트림 복사로 이어붙이고 오디오 트랙을 합침
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in segment_paths:
+                f.write(f"file '{os.path.abspath(path)}'\n")
+        args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+        if final_clip.audio is not None:
+            args += ['-i', audio_path, '-map', '0:v', '-map', '1:a']
+        args += ['-c', 'copy', '-movflags', '+faststart', output_path]
+        if not run_ffmpeg(args, task_id=task_id):
+            return False
+        verify_segment_joins(output_path, [start for start, _ in ranges[1:]], fps)
+        return True
+    finally:
+        # 서버가 비정상 종료된 경우에만 체크포인트가 남고, 그 외에는 항상 정리
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+        task_store.clear_checkpoints(task_id)
 
 @handle_subprocess_errors
 def create_final_video_with_progress(data, task_id):
@@ -680,210 +3904,222 @@ def create_final_video_with_progress(data, task_id):
         
         files = data.get('files', [])
         audio_file = data.get('audio_file')
-        audio_volume = data.get('audio_volume', 50)
         subtitles = data.get('subtitles', [])
-        output_quality = data.get('output_quality', 'medium')
         video_title = data.get('video_title', 'Final Video')
         
         if len(files) < 1:
             task_manager.set_status(task_id, 'error', '최소 1개의 비디오/이미지 파일이 필요합니다')
             return
         
-        clips = []
         total_steps = len(files) + (10 if audio_file else 0) + (len(subtitles) * 2) + 30
         task_manager.tasks[task_id]['total_steps'] = total_steps
-        current_step = 0
+        progress = {'step': 0}
         
-        # 1단계: 모든 파일을 클립으로 변환
-        task_manager.update_progress(task_id, current_step, "파일을 로딩 중...")
-        for i, file_info in enumerate(files):
-            if task_manager.is_cancelled(task_id):
-                return
-            task_manager.wait_if_paused(task_id)
-            
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
-            
-            if file_info['type'] == 'video':
-                clip = safe_load_video(filepath)
-            elif file_info['type'] == 'image':
-                duration = file_info.get('duration', 3)
-                clip = ImageClip(filepath, duration=duration)
-            
-            clips.append(clip)
-            current_step += 1
-            task_manager.update_progress(task_id, current_step, f"파일 {i+1}/{len(files)} 로딩 완료")
+        def report(step_delta, message):
+            progress['step'] += step_delta
+            task_manager.update_progress(task_id, progress['step'], message)
         
-        # 2단계: 클립들을 연결
-        if task_manager.is_cancelled(task_id):
-            return
-        task_manager.wait_if_paused(task_id)
+        output_setting = get_output_setting(data)
+        bitrate = output_setting['bitrate']
+        profile = get_encoder_profile(data)
         
-        task_manager.update_progress(task_id, current_step, "비디오 클립을 연결 중...")
-        if len(clips) > 1:
-            final_clip = concatenate_videoclips(clips, method="compose")
-        else:
-            final_clip = clips[0]
-        current_step += 10
-        task_manager.update_progress(task_id, current_step, "비디오 연결 완료")
+        safe_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:20]
+        if not safe_title:
+            safe_title = "Final_Video"
         
-        # 3단계: 배경음악 추가 (있는 경우)
-        if audio_file:
-            if task_manager.is_cancelled(task_id):
-                return
-            task_manager.wait_if_paused(task_id)
-            
-            task_manager.update_progress(task_id, current_step, "배경음악을 처리 중...")
-            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
-            audio_clip = safe_load_audio(audio_path)
-            current_step += 2
-            
-            # 오디오 볼륨 조정
-            if volumex is not None:
-                audio_clip = volumex(audio_clip, audio_volume / 100.0)
-            current_step += 2
-            task_manager.update_progress(task_id, current_step, "오디오 볼륨 조정 완료")
-            
-            # 오디오 길이 조정
-            if audio_clip.duration > final_clip.duration:
-                audio_clip = audio_clip.subclipped(0, final_clip.duration)
-            elif audio_clip.duration < final_clip.duration:
-                loops = int(final_clip.duration / audio_clip.duration) + 1
-                repeated_clips = [audio_clip] * loops
-                audio_clip = concatenate_audioclips(repeated_clips).subclipped(0, final_clip.duration)
-            current_step += 3
-            task_manager.update_progress(task_id, current_step, "오디오 길이 조정 완료")
-            
-            # 오디오 믹싱
-            if final_clip.audio is not None:
-                if CompositeAudioClip is not None:
-                    try:
-                        if volumex is not None:
-                            original_audio = volumex(final_clip.audio, 0.7)
-                            background_audio = volumex(audio_clip, 0.3)
-                        else:
-                            original_audio = final_clip.audio
-                            background_audio = audio_clip
-                        final_audio = CompositeAudioClip([original_audio, background_audio])
-                    except Exception as e:
-                        print(f"Warning: 오디오 믹싱 중 오류 발생: {e}. 배경음악만 사용합니다.")
-                        final_audio = audio_clip
-                else:
-                    final_audio = audio_clip
-            else:
-                final_audio = audio_clip
-            
-            final_clip = final_clip.with_audio(final_audio)
-            audio_clip.close()
-            current_step += 3
-            task_manager.update_progress(task_id, current_step, "배경음악 추가 완료")
+        output_filename = f"{safe_title}_{uuid.uuid4().hex[:8]}.mp4"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        finished = None
         
-        # 4단계: 자막 추가 (있는 경우)
-        if subtitles:
-            if task_manager.is_cancelled(task_id):
-                return
-            task_manager.wait_if_paused(task_id)
-            
-            task_manager.update_progress(task_id, current_step, "자막을 추가 중...")
-            video_clips = [final_clip]
+        # 불러온 클립, 결과 클립, ffmpeg 프로세스는 범위를 벗어날 때(완료, 오류, 취소) 모두 정리
+        with TaskResources(task_id) as resources:
+            # 이미지로만 구성된 슬라이드쇼는 정지 화면 전용 경로로 인코딩
+            if all(file_info['type'] == 'image' for file_info in files):
+                try:
+                    finished = render_still_slideshow(
+                        files, output_path, task_id, (0, total_steps),
+                        output_size=(output_setting['width'], output_setting['height']) if 'width' in output_setting else None,
+                        bitrate=bitrate,
+                        subtitles=subtitles,
+                        audio_path=os.path.join(app.config['UPLOAD_FOLDER'], audio_file) if audio_file else None,
+                        audio_volume=data.get('audio_volume', 50),
+                        profile=profile
+                    )
+                except Exception as e:
+                    print(f"Warning: 슬라이드쇼 전용 인코딩 실패, 일반 경로로 진행합니다: {e}")
+                    finished = None
+                if finished is False and os.path.exists(output_path):
+                    os.remove(output_path)
             
-            for i, subtitle in enumerate(subtitles):
+            if finished is None:
+                # 1~4단계: 파일 로딩, 연결, 배경음악, 자막, 해상도 조정
+                # 구간 병렬 인코딩에서 구간마다 다시 구성할 때 자막 오버레이를 재사용하도록 공유
+                shared = {}
+                final_clip = build_final_timeline(data, task_id, resources, report, shared=shared)
+                if final_clip is None:
+                    return
+                current_step = progress['step']
+                
+                # 5단계: 비디오 저장
                 if task_manager.is_cancelled(task_id):
                     return
                 task_manager.wait_if_paused(task_id)
                 
-                try:
-                    txt_clip = create_text_clip_safe(
-                        subtitle['text'],
-                        font_size=50,
-                        color='white',
-                        stroke_color='black',
-                        stroke_width=2
-                    ).with_position(('center', 'bottom')).with_duration(
-                        subtitle['end_time'] - subtitle['start_time']
-                    ).with_start(subtitle['start_time'])
-                except Exception as e:
-                    # 안전한 함수 실행에도 실패하면 로그만 남기고 건너뛰기
-                    print(f"Error: 자막 생성 완전 실패: {e}")
-                    continue
+                task_manager.update_progress(task_id, current_step, "최종 비디오를 저장 중...")
                 
-                video_clips.append(txt_clip)
-                current_step += 2
-                task_manager.update_progress(task_id, current_step, f"자막 {i+1}/{len(subtitles)} 추가 완료")
-            
-            final_clip = CompositeVideoClip(video_clips)
+                # 긴 타임라인은 구간별로 나눠 병렬 인코딩하고, 구간이 끝날 때마다 체크포인트로 기록
+                # (병렬 구간을 요청하지 않아도 CHECKPOINT_SEGMENT_DURATION보다 길면 구간을 순서대로 인코딩해 합침)
+                workers = int(data.get('segments', app.config['RENDER_SEGMENTS']))
+                workers = min(workers, int(final_clip.duration // app.config['SEGMENT_MIN_DURATION']))
+                segments = workers
+                if app.config['CHECKPOINT_SEGMENT_DURATION'] > 0:
+                    segments = max(segments, math.ceil(final_clip.duration / app.config['CHECKPOINT_SEGMENT_DURATION']))
+                
+                if segments > 1:
+                    try:
+                        finished = render_segments_parallel(
+                            final_clip,
+                            lambda segment_resources: build_final_timeline(data, task_id, segment_resources,
+                                                                           video_only=True, shared=shared),
+                            output_path,
+                            task_id,
+                            segments,
+                            (current_step, total_steps),
+                            workers=workers,
+                            profile=profile,
+                            bitrate=bitrate
+                        )
+                    except SegmentJoinError as e:
+                        print(f"Warning: 구간 경계가 키프레임에 맞지 않아 한 번에 다시 인코딩합니다 ({task_id}): {e}")
+                        finished = None
+                if finished is None:
+                    # 비디오 저장 (프레임 단위 진행상황 보고, 취소 시 인코딩 중단)
+                    finished = safe_write_videofile(
+                        final_clip,
+                        output_path, 
+                        profile=profile,
+                        bitrate=bitrate,
+                        logger=TaskProgressLogger(task_id, (current_step, total_steps))
+                    )
         
-        # 5단계: 비디오 저장
-        if task_manager.is_cancelled(task_id):
+        if finished and not task_manager.is_cancelled(task_id):
+            try:
+                render_cache.put(render_fingerprint(data), output_filename)
+            except Exception as e:
+                print(f"Warning: 렌더 결과 캐시 기록 실패: {e}")
+            task_manager.update_progress(task_id, total_steps, f'"{video_title}" 최종 영상이 성공적으로 생성되었습니다')
+            task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
+            # 결과 전송
+            task_manager.emit_event('task_completed', {
+                'task_id': task_id,
+                'output_file': output_filename,
+                'message': f'"{video_title}" 최종 영상이 성공적으로 생성되었습니다'
+            })
+    
+    except Exception as e:
+        task_manager.set_status(task_id, 'error', f'오류가 발생했습니다: {str(e)}')
+        task_manager.emit_event('task_error', {
+            'task_id': task_id,
+            'error': str(e)
+        })
+
+# 미리보기 출력 설정: 세로 해상도, fps, 출력 파일 보관 시간(초)
+app.config['PREVIEW_HEIGHT'] = int(os.environ.get('PREVIEW_HEIGHT', 360))
+app.config['PREVIEW_FPS'] = int(os.environ.get('PREVIEW_FPS', 12))
+app.config['PREVIEW_TTL'] = int(os.environ.get('PREVIEW_TTL', 3600))
+
+def preview_output_data(data):
+    """최종 비디오 요청을 미리보기 해상도(출력 비율 유지, 세로 PREVIEW_HEIGHT 이하)로 바꾼 요청"""
+    output_setting = get_output_setting(data)
+    if 'width' not in output_setting:
+        return data
+    width, height = output_setting['width'], output_setting['height']
+    preview_height = min(height, app.config['PREVIEW_HEIGHT'])
+    # libx264(yuv420p)는 짝수 크기만 허용
+    preview_width = max(2, round(width * preview_height / height / 2) * 2)
+    preview_height = max(2, preview_height // 2 * 2)
+    return {**data, 'output_quality': 'custom', 'custom_resolution': {'width': preview_width, 'height': preview_height}}
+
+def cleanup_previews():
+    """PREVIEW_TTL보다 오래된 미리보기 출력 삭제"""
+    deadline = time.time() - app.config['PREVIEW_TTL']
+    try:
+        for filename in os.listdir(app.config['OUTPUT_FOLDER']):
+            filepath = os.path.join(app.config['OUTPUT_FOLDER'], filename)
+            if filename.startswith('preview_') and os.path.getmtime(filepath) < deadline:
+                os.remove(filepath)
+    except OSError as e:
+        print(f"Warning: 오래된 미리보기 정리 실패: {e}")
+
+@handle_subprocess_errors
+def create_preview_with_progress(data, task_id):
+    """최종 비디오와 같은 타임라인을 낮은 해상도/fps, draft 인코딩 프로필로 미리보기 생성
+    
+    preview_start/preview_end(초)가 있으면 그 구간만 인코딩
+    """
+    try:
+        task_manager.create_task(task_id, 'preview', 100)
+        files = data.get('files', [])
+        if len(files) < 1:
+            task_manager.set_status(task_id, 'error', '최소 1개의 비디오/이미지 파일이 필요합니다')
             return
-        task_manager.wait_if_paused(task_id)
-        
-        task_manager.update_progress(task_id, current_step, "최종 비디오를 저장 중...")
-        
-        # 출력 설정
-        codec_settings = {
-            '480p': {'width': 854, 'height': 480, 'bitrate': '1000k'},
-            '720p': {'width': 1280, 'height': 720, 'bitrate': '2500k'},
-            '1080p': {'width': 1920, 'height': 1080, 'bitrate': '5000k'},
-            'custom': {'bitrate': '3000k'}  # 사용자 정의는 기본 비트레이트만
-        }
-        
-        output_setting = codec_settings.get(output_quality, codec_settings['720p'])
-        
-        # 사용자 정의 해상도 처리
-        if output_quality == 'custom' and 'custom_resolution' in data:
-            custom_res = data['custom_resolution']
-            output_setting['width'] = custom_res['width']
-            output_setting['height'] = custom_res['height']
+        cleanup_previews()
         
-        # 해상도 조정이 필요한 경우 적용
-        if 'width' in output_setting and 'height' in output_setting:
-            final_clip = final_clip.resized((output_setting['width'], output_setting['height']))
-        
-        bitrate = output_setting['bitrate']
-        
-        safe_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:20]
-        if not safe_title:
-            safe_title = "Final_Video"
+        total_steps = len(files) + (10 if data.get('audio_file') else 0) + (len(data.get('subtitles', [])) * 2) + 30
+        task_manager.tasks[task_id]['total_steps'] = total_steps
+        progress = {'step': 0}
         
-        output_filename = f"{safe_title}_{uuid.uuid4().hex[:8]}.mp4"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        def report(step_delta, message):
+            progress['step'] += step_delta
+            task_manager.update_progress(task_id, progress['step'], message)
         
-        # 커스텀 진행상황 콜백을 사용하여 비디오 저장
-        def progress_callback(chunk, file_size):
+        with TaskResources(task_id) as resources:
+            final_clip = build_final_timeline(preview_output_data(data), task_id, resources, report)
+            if final_clip is None:
+                return
+            preview_clip = final_clip
+            # 출력 크기를 알 수 없는 사용자 정의 해상도는 합성 결과를 줄임
+            if preview_clip.size[1] > app.config['PREVIEW_HEIGHT']:
+                preview_clip = preview_clip.resized(height=app.config['PREVIEW_HEIGHT'] // 2 * 2)
+            
+            start = max(0.0, float(data.get('preview_start') or 0))
+            end = min(final_clip.duration, float(data.get('preview_end') or final_clip.duration))
+            if end - start <= 0:
+                task_manager.set_status(task_id, 'error', '미리보기 구간이 올바르지 않습니다')
+                return
+            if start > 0 or end < final_clip.duration:
+                preview_clip = preview_clip.subclipped(start, end)
+            preview_clip = preview_clip.with_fps(min(final_clip.fps or app.config['PREVIEW_FPS'], app.config['PREVIEW_FPS']))
+            
             if task_manager.is_cancelled(task_id):
-                return False  # 작업 중단
-            task_manager.wait_if_paused(task_id)
-            # 저장 진행상황 업데이트 (마지막 20%에 해당)
-            save_progress = int((chunk / file_size) * 20)
-            total_progress = current_step + save_progress
-            task_manager.update_progress(task_id, total_progress, f"비디오 저장 중... {int((chunk/file_size)*100)}%")
-        
-        # 비디오 저장
-        safe_write_videofile(
-            final_clip,
-            output_path, 
-            bitrate=bitrate,
-            temp_audiofile=f'temp-audio-{uuid.uuid4().hex[:8]}.m4a'
-        )
-        
-        # 메모리 정리
-        for clip in clips:
-            clip.close()
-        final_clip.close()
+                return
+            task_manager.update_progress(task_id, progress['step'], "미리보기를 인코딩 중...")
+            output_filename = f"preview_{uuid.uuid4().hex[:12]}.mp4"
+            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+            finished = safe_write_videofile(
+                preview_clip,
+                output_path,
+                profile='draft',
+                audio_fps=22050,
+                audio_bitrate='64k',
+                logger=TaskProgressLogger(task_id, (progress['step'], total_steps), "미리보기를 인코딩 중...")
+            )
         
-        if not task_manager.is_cancelled(task_id):
-            task_manager.update_progress(task_id, 100, f'"{video_title}" 최종 영상이 성공적으로 생성되었습니다')
+        if finished and not task_manager.is_cancelled(task_id):
+            task_manager.update_progress(task_id, total_steps, '미리보기가 생성되었습니다')
             task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
-            # 결과 전송
-            socketio.emit('task_completed', {
+            task_manager.emit_event('task_completed', {
                 'task_id': task_id,
                 'output_file': output_filename,
-                'message': f'"{video_title}" 최종 영상이 성공적으로 생성되었습니다'
+                'preview': True,
+                'preview_start': start,
+                'preview_end': end,
+                'message': '미리보기가 생성되었습니다'
             })
     
     except Exception as e:
         task_manager.set_status(task_id, 'error', f'오류가 발생했습니다: {str(e)}')
-        socketio.emit('task_error', {
+        task_manager.emit_event('task_error', {
             'task_id': task_id,
             'error': str(e)
         })
@@ -904,49 +4140,114 @@ def concatenate_media_with_progress(data, task_id):
         task_manager.tasks[task_id]['total_steps'] = total_steps
         current_step = 0
         
-        # 파일 로딩
-        for i, file_info in enumerate(files):
+        # 모든 입력이 같은 형식의 영상이면 재인코딩 없이 스트림 복사로 이어붙이기
+        if all(file_info['type'] == 'video' for file_info in files):
+            task_manager.update_progress(task_id, current_step, "입력 영상 형식을 확인 중...")
+            filepaths = [os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename']) for file_info in files]
+            infos = plan_stream_copy_concat(filepaths)
+            if infos is not None:
+                output_filename = f"concatenated_{uuid.uuid4()}.mp4"
+                output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+                try:
+                    finished = concat_stream_copy(
+                        filepaths, output_path, task_id,
+                        duration=sum(info['duration'] for info in infos),
+                        progress_range=(len(files), total_steps)
+                    )
+                except Exception as e:
+                    print(f"Warning: 스트림 복사 합치기 실패, 재인코딩으로 진행합니다: {e}")
+                    finished = None
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                if finished is False:
+                    if os.path.exists(output_path):
+                        os.remove(output_path)
+                    return
+                if finished:
+                    task_manager.update_progress(task_id, total_steps, '비디오가 성공적으로 합쳐졌습니다')
+                    task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
+                    task_manager.emit_event('task_completed', {
+                        'task_id': task_id,
+                        'output_file': output_filename,
+                        'message': '비디오가 성공적으로 합쳐졌습니다'
+                    })
+                    return
+        
+        # 이미지로만 구성되면 정지 화면 전용 경로로 인코딩
+        if all(file_info['type'] == 'image' for file_info in files):
+            output_filename = f"concatenated_{uuid.uuid4()}.mp4"
+            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+            try:
+                finished = render_still_slideshow(files, output_path, task_id, (current_step, total_steps),
+                                                  profile=get_encoder_profile(data))
+            except Exception as e:
+                print(f"Warning: 슬라이드쇼 전용 인코딩 실패, 일반 경로로 진행합니다: {e}")
+                finished = None
+            if finished is False:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                return
+            if finished:
+                task_manager.update_progress(task_id, total_steps, '비디오가 성공적으로 합쳐졌습니다')
+                task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
+                task_manager.emit_event('task_completed', {
+                    'task_id': task_id,
+                    'output_file': output_filename,
+                    'message': '비디오가 성공적으로 합쳐졌습니다'
+                })
+                return
+        
+        # 불러온 클립과 ffmpeg 프로세스는 범위를 벗어날 때(완료, 오류, 취소) 모두 정리
+        with TaskResources(task_id) as resources:
+            # 파일 로딩
+            stage_started = time.perf_counter()
+            for i, file_info in enumerate(files):
+                if task_manager.is_cancelled(task_id):
+                    return
+                task_manager.wait_if_paused(task_id)
+                
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+                
+                with tracer.span('load_file', 'load', filename=file_info['filename'], type=file_info['type']):
+                    if file_info['type'] == 'video':
+                        clip = resources.video(filepath)
+                    elif file_info['type'] == 'image':
+                        duration = file_info.get('duration', 3)
+                        clip = resources.image(filepath, duration)
+                
+                clips.append(clip)
+                current_step += 1
+                task_manager.update_progress(task_id, current_step, f"파일 {i+1}/{len(files)} 로딩 완료")
+            observe_stage('load', stage_started)
+            
+            # 클립 연결
             if task_manager.is_cancelled(task_id):
                 return
             task_manager.wait_if_paused(task_id)
             
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+            task_manager.update_progress(task_id, current_step, "비디오를 합치는 중...")
+            stage_started = time.perf_counter()
+            final_clip = resources.track(concatenate_videoclips(clips, method="compose"))
+            if final_clip.fps is None:
+                final_clip = final_clip.with_fps(app.config['SLIDESHOW_FPS'])
+            observe_stage('concatenate', stage_started)
+            current_step += 10
             
-            if file_info['type'] == 'video':
-                clip = safe_load_video(filepath)
-            elif file_info['type'] == 'image':
-                duration = file_info.get('duration', 3)
-                clip = ImageClip(filepath, duration=duration)
+            # 파일 저장
+            output_filename = f"concatenated_{uuid.uuid4()}.mp4"
+            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
             
-            clips.append(clip)
-            current_step += 1
-            task_manager.update_progress(task_id, current_step, f"파일 {i+1}/{len(files)} 로딩 완료")
-        
-        # 클립 연결
-        if task_manager.is_cancelled(task_id):
-            return
-        task_manager.wait_if_paused(task_id)
-        
-        task_manager.update_progress(task_id, current_step, "비디오를 합치는 중...")
-        final_clip = concatenate_videoclips(clips, method="compose")
-        current_step += 10
-        
-        # 파일 저장
-        output_filename = f"concatenated_{uuid.uuid4()}.mp4"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        task_manager.update_progress(task_id, current_step, "비디오를 저장 중...")
-        safe_write_videofile(final_clip, output_path)
-        
-        # 메모리 정리
-        for clip in clips:
-            clip.close()
-        final_clip.close()
+            task_manager.update_progress(task_id, current_step, "비디오를 저장 중...")
+            finished = safe_write_videofile(
+                final_clip, output_path,
+                profile=get_encoder_profile(data),
+                logger=TaskProgressLogger(task_id, (current_step, total_steps))
+            )
         
-        if not task_manager.is_cancelled(task_id):
+        if finished and not task_manager.is_cancelled(task_id):
             task_manager.update_progress(task_id, 100, '비디오가 성공적으로 합쳐졌습니다')
             task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
-            socketio.emit('task_completed', {
+            task_manager.emit_event('task_completed', {
                 'task_id': task_id,
                 'output_file': output_filename,
                 'message': '비디오가 성공적으로 합쳐졌습니다'
@@ -972,74 +4273,106 @@ def add_audio_to_video_with_progress(data, task_id):
             return
         
         current_step = 0
+        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
+        audio_volume = data.get('audio_volume', 100)
         
-        # 비디오 클립 로딩
-        clips = []
-        for i, file_info in enumerate(files):
+        # 단일 비디오는 영상 스트림을 그대로 복사하고 오디오 트랙만 교체
+        if len(files) == 1 and files[0]['type'] == 'video':
+            video_path = os.path.join(app.config['UPLOAD_FOLDER'], files[0]['filename'])
+            entry = get_indexed_entry(video_path)
+            info = entry['info'] if entry is not None else None
+            if info and info['duration'] and info['video_codec'] in STREAM_COPY_VIDEO_CODECS:
+                output_filename = f"with_background_music_{uuid.uuid4()}.mp4"
+                output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+                task_manager.update_progress(task_id, 20, "배경음악을 로딩 중...")
+                try:
+                    with TaskResources(task_id) as resources:
+                        stage_started = time.perf_counter()
+                        audio_clip = resources.track(load_soundtrack(audio_path, info['duration'], audio_volume))
+                        observe_stage('audio_mix', stage_started)
+                        task_manager.update_progress(task_id, 40, "배경음악을 추가 중...")
+                        finished = remux_with_soundtrack(video_path, audio_clip, output_path, task_id, info['duration'], (40, 100))
+                except Exception as e:
+                    print(f"Warning: 영상 스트림 복사 실패, 재인코딩으로 진행합니다: {e}")
+                    finished = None
+                if not finished and os.path.exists(output_path):
+                    os.remove(output_path)
+                if finished is False:
+                    return
+                if finished:
+                    task_manager.update_progress(task_id, 100, '배경음악이 포함된 비디오가 성공적으로 생성되었습니다')
+                    task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
+                    task_manager.emit_event('task_completed', {
+                        'task_id': task_id,
+                        'output_file': output_filename,
+                        'message': '배경음악이 포함된 비디오가 성공적으로 생성되었습니다'
+                    })
+                    return
+        
+        # 불러온 클립과 ffmpeg 프로세스는 범위를 벗어날 때(완료, 오류, 취소) 모두 정리
+        with TaskResources(task_id) as resources:
+            # 비디오 클립 로딩
+            clips = []
+            stage_started = time.perf_counter()
+            for i, file_info in enumerate(files):
+                if task_manager.is_cancelled(task_id):
+                    return
+                task_manager.wait_if_paused(task_id)
+                
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+                
+                with tracer.span('load_file', 'load', filename=file_info['filename'], type=file_info['type']):
+                    if file_info['type'] == 'video':
+                        clip = resources.video(filepath)
+                    elif file_info['type'] == 'image':
+                        duration = file_info.get('duration', 3)
+                        clip = resources.image(filepath, duration)
+                
+                clips.append(clip)
+                current_step += 20
+                task_manager.update_progress(task_id, current_step, f"비디오 파일 {i+1}/{len(files)} 로딩 완료")
+            observe_stage('load', stage_started)
+            
+            # 비디오 합치기
             if task_manager.is_cancelled(task_id):
                 return
             task_manager.wait_if_paused(task_id)
             
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+            stage_started = time.perf_counter()
+            if len(clips) > 1:
+                combined_video = resources.track(concatenate_videoclips(clips, method="compose"))
+            else:
+                combined_video = clips[0]
+            observe_stage('concatenate', stage_started)
+            current_step += 20
+            task_manager.update_progress(task_id, current_step, "배경음악을 로딩 중...")
             
-            if file_info['type'] == 'video':
-                clip = safe_load_video(filepath)
-            elif file_info['type'] == 'image':
-                duration = file_info.get('duration', 3)
-                clip = ImageClip(filepath, duration=duration)
+            # 배경음악 처리 (볼륨 및 길이 조정)
+            stage_started = time.perf_counter()
+            with tracer.span('decode_audio', 'audio', filename=audio_file):
+                audio_clip = resources.track(load_soundtrack(audio_path, combined_video.duration, audio_volume))
+            current_step += 40
+            task_manager.update_progress(task_id, current_step, "배경음악을 추가 중...")
             
-            clips.append(clip)
-            current_step += 20
-            task_manager.update_progress(task_id, current_step, f"비디오 파일 {i+1}/{len(files)} 로딩 완료")
-        
-        # 비디오 합치기
-        if task_manager.is_cancelled(task_id):
-            return
-        task_manager.wait_if_paused(task_id)
-        
-        if len(clips) > 1:
-            combined_video = concatenate_videoclips(clips, method="compose")
-        else:
-            combined_video = clips[0]
-        current_step += 20
-        task_manager.update_progress(task_id, current_step, "배경음악을 로딩 중...")
-        
-        # 배경음악 처리
-        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
-        audio_clip = safe_load_audio(audio_path)
-        current_step += 20
-        
-        # 음악 길이 조정
-        if audio_clip.duration > combined_video.duration:
-            audio_clip = audio_clip.subclipped(0, combined_video.duration)
-        else:
-            loops_needed = int(combined_video.duration / audio_clip.duration) + 1
-            repeated_clips = [audio_clip] * loops_needed
-            audio_clip = concatenate_audioclips(repeated_clips).subclipped(0, combined_video.duration)
-        current_step += 20
-        task_manager.update_progress(task_id, current_step, "배경음악을 추가 중...")
-        
-        # 최종 비디오 생성
-        final_clip = combined_video.with_audio(audio_clip)
-        
-        # 저장
-        output_filename = f"with_background_music_{uuid.uuid4()}.mp4"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        task_manager.update_progress(task_id, current_step, "비디오를 저장 중...")
-        safe_write_videofile(final_clip, output_path)
-        
-        # 메모리 정리
-        for clip in clips:
-            clip.close()
-        combined_video.close()
-        audio_clip.close()
-        final_clip.close()
+            # 최종 비디오 생성
+            final_clip = resources.track(combined_video.with_audio(audio_clip))
+            observe_stage('audio_mix', stage_started)
+            
+            # 저장
+            output_filename = f"with_background_music_{uuid.uuid4()}.mp4"
+            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+            
+            task_manager.update_progress(task_id, current_step, "비디오를 저장 중...")
+            finished = safe_write_videofile(
+                final_clip, output_path,
+                profile=get_encoder_profile(data),
+                logger=TaskProgressLogger(task_id, (min(current_step, 90), 100))
+            )
         
-        if not task_manager.is_cancelled(task_id):
+        if finished and not task_manager.is_cancelled(task_id):
             task_manager.update_progress(task_id, 100, '배경음악이 포함된 비디오가 성공적으로 생성되었습니다')
             task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
-            socketio.emit('task_completed', {
+            task_manager.emit_event('task_completed', {
                 'task_id': task_id,
                 'output_file': output_filename,
                 'message': '배경음악이 포함된 비디오가 성공적으로 생성되었습니다'
@@ -1063,44 +4396,51 @@ def add_subtitle_to_video_with_progress(data, task_id):
         
         current_step = 0
         
-        # 비디오 로드
-        task_manager.update_progress(task_id, current_step, "비디오를 로딩 중...")
-        video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_file)
-        video_clip = safe_load_video(video_path)
-        current_step += 40
-        
-        # 자막 생성
-        task_manager.update_progress(task_id, current_step, "자막을 생성 중...")
-        txt_clip = create_text_clip_safe(
-            subtitle_text,
-            font_size=50,
-            color='white',
-            stroke_color='black',
-            stroke_width=2
-        ).with_position(('center', 'bottom')).with_duration(end_time - start_time).with_start(start_time)
-        current_step += 20
-        
-        # 자막 합성
-        task_manager.update_progress(task_id, current_step, "자막을 비디오에 합성 중...")
-        final_clip = CompositeVideoClip([video_clip, txt_clip])
-        current_step += 20
-        
-        # 저장
-        output_filename = f"with_subtitle_{uuid.uuid4()}.mp4"
-        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-        
-        task_manager.update_progress(task_id, current_step, "비디오를 저장 중...")
-        safe_write_videofile(final_clip, output_path)
-        
-        # 메모리 정리
-        video_clip.close()
-        txt_clip.close()
-        final_clip.close()
+        # 불러온 클립과 ffmpeg 프로세스는 범위를 벗어날 때(완료, 오류, 취소) 모두 정리
+        with TaskResources(task_id) as resources:
+            # 비디오 로드
+            task_manager.update_progress(task_id, current_step, "비디오를 로딩 중...")
+            video_path = os.path.join(app.config['UPLOAD_FOLDER'], video_file)
+            stage_started = time.perf_counter()
+            with tracer.span('load_file', 'load', filename=video_file, type='video'):
+                video_clip = resources.video(video_path)
+            observe_stage('load', stage_started)
+            current_step += 40
+            
+            # 자막 생성
+            task_manager.update_progress(task_id, current_step, "자막을 생성 중...")
+            stage_started = time.perf_counter()
+            with tracer.span('rasterize_subtitle', 'subtitle', index=0, chars=len(subtitle_text)):
+                rgb, alpha = rasterize_subtitle(
+                    subtitle_text,
+                    font_size=50,
+                    color='white',
+                    stroke_color='black',
+                    stroke_width=2
+                )
+            current_step += 20
+            
+            # 자막 합성 (자막 구간의 자막 영역만 합성)
+            task_manager.update_progress(task_id, current_step, "자막을 비디오에 합성 중...")
+            final_clip = resources.track(video_clip.transform(SubtitleOverlay([(start_time, end_time, rgb, alpha)])))
+            observe_stage('subtitle', stage_started)
+            current_step += 20
+            
+            # 저장
+            output_filename = f"with_subtitle_{uuid.uuid4()}.mp4"
+            output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+            
+            task_manager.update_progress(task_id, current_step, "비디오를 저장 중...")
+            finished = safe_write_videofile(
+                final_clip, output_path,
+                profile=get_encoder_profile(data),
+                logger=TaskProgressLogger(task_id, (current_step, 100))
+            )
         
-        if not task_manager.is_cancelled(task_id):
+        if finished and not task_manager.is_cancelled(task_id):
             task_manager.update_progress(task_id, 100, '자막이 성공적으로 추가되었습니다')
             task_manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
-            socketio.emit('task_completed', {
+            task_manager.emit_event('task_completed', {
                 'task_id': task_id,
                 'output_file': output_filename,
                 'message': '자막이 성공적으로 추가되었습니다'
@@ -1121,182 +4461,378 @@ def create_final_video(data):
     if len(files) < 1:
         return jsonify({'error': '최소 1개의 비디오/이미지 파일이 필요합니다'}), 400
     
-    clips = []
-    
-    # 1단계: 모든 파일을 클립으로 변환
-    for file_info in files:
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
-        
-        if file_info['type'] == 'video':
-            clip = safe_load_video(filepath)
-        elif file_info['type'] == 'image':
-            duration = file_info.get('duration', 3)
-            clip = ImageClip(filepath, duration=duration)
+    # 불러온 클립은 저장이 실패해도 범위를 벗어날 때 모두 닫힘
+    with TaskResources(None) as resources:
+        clips = []
         
-        clips.append(clip)
-    
-    # 2단계: 클립들을 연결
-    if len(clips) > 1:
-        final_clip = concatenate_videoclips(clips, method="compose")
-    else:
-        final_clip = clips[0]
-    
-    # 3단계: 배경음악 추가 (있는 경우)
-    if audio_file:
-        audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
-        audio_clip = safe_load_audio(audio_path)
+        # 1단계: 모든 파일을 클립으로 변환
+        for file_info in files:
+            filepath = os.path.join(app.config['UPLOAD_FOLDER'], file_info['filename'])
+            
+            if file_info['type'] == 'video':
+                clip = resources.track(safe_load_video(filepath))
+            elif file_info['type'] == 'image':
+                duration = file_info.get('duration', 3)
+                clip = resources.track(ImageClip(filepath, duration=duration))
+            
+            clips.append(clip)
         
-        # 오디오 볼륨 조정
-        if volumex is not None:
-            audio_clip = volumex(audio_clip, audio_volume / 100.0)
+        # 2단계: 클립들을 연결
+        if len(clips) > 1:
+            final_clip = resources.track(concatenate_videoclips(clips, method="compose"))
         else:
-            # volumex가 없으면 다른 방법 시도
-            try:
-                # AudioClip의 내장 메서드 시도
-                audio_clip = audio_clip.volumex(audio_volume / 100.0)
-            except AttributeError:
-                print(f"Warning: 볼륨 조정을 할 수 없습니다. 원본 볼륨으로 사용합니다.")
-                pass
-        
-        # 오디오가 비디오보다 길면 자르고, 짧으면 반복
-        if audio_clip.duration > final_clip.duration:
-            audio_clip = audio_clip.subclipped(0, final_clip.duration)
-        elif audio_clip.duration < final_clip.duration:
-            # 오디오를 반복해서 비디오 길이에 맞춤
-            loops = int(final_clip.duration / audio_clip.duration) + 1
-            repeated_clips = [audio_clip] * loops
-            audio_clip = concatenate_audioclips(repeated_clips).subclipped(0, final_clip.duration)
+            final_clip = clips[0]
         
-        # 기존 오디오와 배경음악 믹싱 (기존 오디오가 있는 경우)
-        if final_clip.audio is not None:
-            if CompositeAudioClip is not None:
-                # 볼륨 조정을 안전하게 처리
+        # 3단계: 배경음악 추가 (있는 경우)
+        if audio_file:
+            audio_path = os.path.join(app.config['UPLOAD_FOLDER'], audio_file)
+            audio_clip = resources.track(safe_load_audio(audio_path))
+            
+            # 오디오 볼륨 조정
+            if volumex is not None:
+                audio_clip = volumex(audio_clip, audio_volume / 100.0)
+            else:
+                # volumex가 없으면 다른 방법 시도
                 try:
-                    if volumex is not None:
-                        original_audio = volumex(final_clip.audio, 0.7)
-                        background_audio = volumex(audio_clip, 0.3)
-                    else:
-                        # volumex가 없으면 multiply_volume 시도
-                        try:
-                            original_audio = final_clip.audio.multiply_volume(0.7)
-                            background_audio = audio_clip.multiply_volume(0.3)
-                        except AttributeError:
-                            # multiply_volume도 없으면 원본 볼륨 사용
-                            original_audio = final_clip.audio
-                            background_audio = audio_clip
-                    
-                    final_audio = CompositeAudioClip([original_audio, background_audio])
-                except Exception as e:
-                    print(f"Warning: 오디오 믹싱 중 오류 발생: {e}. 배경음악만 사용합니다.")
+                    # AudioClip의 내장 메서드 시도
+                    audio_clip = audio_clip.volumex(audio_volume / 100.0)
+                except AttributeError:
+                    print(f"Warning: 볼륨 조정을 할 수 없습니다. 원본 볼륨으로 사용합니다.")
+                    pass
+            
+            # 오디오가 비디오보다 길면 자르고, 짧으면 반복
+            if audio_clip.duration > final_clip.duration:
+                audio_clip = audio_clip.subclipped(0, final_clip.duration)
+            elif audio_clip.duration < final_clip.duration:
+                # 오디오를 반복해서 비디오 길이에 맞춤
+                loops = int(final_clip.duration / audio_clip.duration) + 1
+                repeated_clips = [audio_clip] * loops
+                audio_clip = concatenate_audioclips(repeated_clips).subclipped(0, final_clip.duration)
+            
+            # 기존 오디오와 배경음악 믹싱 (기존 오디오가 있는 경우)
+            if final_clip.audio is not None:
+                if CompositeAudioClip is not None:
+                    # 볼륨 조정을 안전하게 처리
+                    try:
+                        if volumex is not None:
+                            original_audio = volumex(final_clip.audio, 0.7)
+                            background_audio = volumex(audio_clip, 0.3)
+                        else:
+                            # volumex가 없으면 multiply_volume 시도
+                            try:
+                                original_audio = final_clip.audio.multiply_volume(0.7)
+                                background_audio = audio_clip.multiply_volume(0.3)
+                            except AttributeError:
+                                # multiply_volume도 없으면 원본 볼륨 사용
+                                original_audio = final_clip.audio
+                                background_audio = audio_clip
+                        
+                        final_audio = CompositeAudioClip([original_audio, background_audio])
+                    except Exception as e:
+                        print(f"Warning: 오디오 믹싱 중 오류 발생: {e}. 배경음악만 사용합니다.")
+                        final_audio = audio_clip
+                else:
+                    # CompositeAudioClip이 없으면 배경음악만 사용
                     final_audio = audio_clip
             else:
-                # CompositeAudioClip이 없으면 배경음악만 사용
                 final_audio = audio_clip
-        else:
-            final_audio = audio_clip
-        
-        final_clip = final_clip.with_audio(final_audio)
-        audio_clip.close()
-    
-    # 4단계: 자막 추가 (있는 경우)
-    if subtitles:
-        video_clips = [final_clip]
+            
+            # 배경음악은 final_clip이 참조하므로 범위가 끝날 때 final_clip 다음에 닫힘
+            final_clip = resources.track(final_clip.with_audio(final_audio))
         
-        for subtitle in subtitles:
-            try:
-                txt_clip = create_text_clip_safe(
-                    subtitle['text'],
-                    font_size=50,
-                    color='white',
-                    stroke_color='black',
-                    stroke_width=2
-                ).with_position(('center', 'bottom')).with_duration(
-                    subtitle['end_time'] - subtitle['start_time']
-                ).with_start(subtitle['start_time'])
-            except Exception as e:
-                # 안전한 함수 실행에도 실패하면 로그만 남기고 건너뛰기
-                print(f"Error: 자막 생성 완전 실패: {e}")
-                continue
+        # 4단계: 자막 추가 (있는 경우)
+        if subtitles:
+            video_clips = [final_clip]
+            
+            for subtitle in subtitles:
+                try:
+                    txt_clip = create_text_clip_safe(
+                        subtitle['text'],
+                        font_size=50,
+                        color='white',
+                        stroke_color='black',
+                        stroke_width=2
+                    ).with_position(('center', 'bottom')).with_duration(
+                        subtitle['end_time'] - subtitle['start_time']
+                    ).with_start(subtitle['start_time'])
+                except Exception as e:
+                    # 안전한 함수 실행에도 실패하면 로그만 남기고 건너뛰기
+                    print(f"Error: 자막 생성 완전 실패: {e}")
+                    continue
+                
+                video_clips.append(txt_clip)
             
-            video_clips.append(txt_clip)
+            final_clip = resources.track(CompositeVideoClip(video_clips))
         
-        final_clip = CompositeVideoClip(video_clips)
-    
-    # 5단계: 출력 품질 설정
-    codec_settings = {
-        'low': {'bitrate': '500k'},
-        'medium': {'bitrate': '1000k'},
-        'high': {'bitrate': '2000k'}
-    }
-    
-    bitrate = codec_settings.get(output_quality, codec_settings['medium'])['bitrate']
-    
-    # 출력 파일명 생성
-    safe_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:20]
-    if not safe_title:
-        safe_title = "Final_Video"
-    
-    output_filename = f"{safe_title}_{uuid.uuid4().hex[:8]}.mp4"
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-    
-    # 비디오 저장
-    safe_write_videofile(
-        final_clip,
-        output_path, 
-        bitrate=bitrate,
-        temp_audiofile=f'temp-audio-{uuid.uuid4().hex[:8]}.m4a'
-    )
-    
-    # 메모리 정리
-    for clip in clips:
-        clip.close()
-    final_clip.close()
+        # 5단계: 출력 품질 설정
+        codec_settings = {
+            'low': {'bitrate': '500k'},
+            'medium': {'bitrate': '1000k'},
+            'high': {'bitrate': '2000k'}
+        }
+        
+        bitrate = codec_settings.get(output_quality, codec_settings['medium'])['bitrate']
+        
+        # 출력 파일명 생성
+        safe_title = "".join(c for c in video_title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:20]
+        if not safe_title:
+            safe_title = "Final_Video"
+        
+        output_filename = f"{safe_title}_{uuid.uuid4().hex[:8]}.mp4"
+        output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
+        
+        # 비디오 저장
+        safe_write_videofile(
+            final_clip,
+            output_path, 
+            bitrate=bitrate
+        )
     
     return jsonify({
         'message': f'"{video_title}" 최종 영상이 성공적으로 생성되었습니다',
         'output_file': output_filename
     })
 
+@app.route('/queue')
+def queue_status():
+    """렌더 대기열 상태 조회 (미리보기 대기열은 preview에)"""
+    return jsonify({**render_queue.stats(), 'preview': preview_queue.stats()})
+
+def read_proc_status(pid):
+    """/proc/<pid>/status의 (이름, 상태 문자, RSS 바이트), 읽을 수 없으면 None"""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                fields[key] = value.strip()
+    except OSError:
+        return None
+    rss = fields.get('VmRSS', '0 kB').split()[0]
+    return fields.get('Name', ''), fields.get('State', '?')[:1], int(rss) * 1024
+
+def process_tree():
+    """실행 중인 자손 프로세스 [(pid, 이름, RSS 바이트)] (종료 후 회수되지 않은 좀비는 제외, /proc가 없으면 빈 목록)"""
+    found, pending = [], [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        try:
+            for tid in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{tid}/children') as f:
+                    pending += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+        if pid == os.getpid():
+            continue
+        status = read_proc_status(pid)
+        if status is not None and status[1] != 'Z':
+            found.append((pid, status[0], status[2]))
+    return found
+
+@metrics.collector
+def collect_task_metrics():
+    with task_manager.lock:
+        counts = {}
+        for task in task_manager.tasks.values():
+            key = (task['type'], task['status'])
+            counts[key] = counts.get(key, 0) + 1
+    queues = [(queue.name, queue.stats()) for queue in (render_queue, preview_queue)]
+    cache = render_cache.stats()
+    return [
+        ('video_editor_tasks', 'gauge', '메모리에 있는 작업 수 (작업 종류, 상태별)',
+         [({'operation': operation, 'status': status}, count) for (operation, status), count in sorted(counts.items())]),
+        ('video_editor_queue_depth', 'gauge', '대기 중인 작업 수',
+         [({'queue': name}, stats['queued']) for name, stats in queues]),
+        ('video_editor_queue_active', 'gauge', '실행 중인 작업 수',
+         [({'queue': name}, stats['active']) for name, stats in queues]),
+        ('video_editor_queue_workers', 'gauge', '렌더 슬롯 수',
+         [({'queue': name}, stats['workers']) for name, stats in queues]),
+        ('video_editor_active_encodes', 'gauge', '실행 중인 인코딩 수 (스레드 예산을 나눠 쓰는 수)',
+         [({}, active_encodes.value)]),
+        ('video_editor_render_cache_lookups_total', 'counter', '렌더 결과 캐시 조회 수 (hit, joined, miss)',
+         [({'result': result}, cache[key]) for result, key in (('hit', 'hits'), ('joined', 'joined'), ('miss', 'misses'))]),
+        ('video_editor_upload_sessions', 'gauge', '진행 중인 분할 업로드 세션 수',
+         [({}, len(upload_sessions.sessions))])
+    ]
+
+@metrics.collector
+def collect_process_metrics():
+    children = process_tree()
+    return [
+        ('process_resident_memory_bytes', 'gauge', '서버 프로세스 RSS', [({}, (read_proc_status(os.getpid()) or ('', '', 0))[2])]),
+        ('video_editor_children_resident_memory_bytes', 'gauge', '자식 프로세스(렌더 워커, ffmpeg) RSS 합',
+         [({}, sum(rss for _, _, rss in children))]),
+        ('video_editor_ffmpeg_processes', 'gauge', '실행 중인 ffmpeg 하위 프로세스 수',
+         [({}, sum(1 for _, comm, _ in children if comm.startswith('ffmpeg')))])
+    ]
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus 텍스트 형식 메트릭"""
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/trace/<task_id>')
+def task_trace(task_id):
+    """작업의 단계별 구간 기록 (Chrome trace event JSON, chrome://tracing이나 ui.perfetto.dev에서 열기)"""
+    trace = tracer.export(task_id)
+    if trace is None:
+        return jsonify({'error': '작업 기록을 찾을 수 없습니다'}), 404
+    with task_manager.lock:
+        task = task_manager.tasks.get(task_id)
+        if task is not None:
+            trace['otherData'].update(type=task['type'], status=task['status'])
+    response = jsonify(trace)
+    if request.args.get('download'):
+        response.headers['Content-Disposition'] = f'attachment; filename=trace-{task_id}.json'
+    return response
+
+@app.route('/trace/<task_id>/profile')
+def task_profile(task_id):
+    """sample_profile로 요청한 작업의 샘플링 프로파일 (접힌 스택 텍스트, flamegraph.pl/speedscope 입력 형식)"""
+    counts = tracer.profile(task_id)
+    if counts is None:
+        return jsonify({'error': '프로파일 결과가 없습니다'}), 404
+    lines = [f'{stack} {count}\n' for stack, count in sorted(counts.items(), key=lambda item: -item[1])]
+    return app.response_class(''.join(lines), mimetype='text/plain; charset=utf-8')
+
+@app.route('/encoders')
+def encoder_status():
+    """인코딩 프로필, 스레드 예산, 프로필별 실제 인코딩 fps 조회"""
+    return jsonify({
+        'profiles': ENCODER_PROFILES,
+        'default': app.config['ENCODER_PROFILE'],
+        'thread_budget': app.config['ENCODE_THREAD_BUDGET'],
+        'active_encodes': active_encodes.value,
+        'stats': task_store.encode_stats()
+    })
+
+@app.route('/pool')
+def pool_status():
+    """리더/이미지 풀 적중률 조회"""
+    return jsonify(clip_pool.stats())
+
 @app.route('/download/<filename>')
 def download_file(filename):
-    """처리된 파일 다운로드"""
+    """처리된 파일 다운로드 (?inline=1이면 브라우저에서 바로 재생)
+    
+    Range 요청(206)과 ETag/Last-Modified 조건부 요청을 지원해 재생 위치 이동과 이어받기가 가능함.
+    본문은 wsgi.file_wrapper로 넘기므로 지원하는 서버(gunicorn 등)에서는 sendfile로 전송되고,
+    USE_X_SENDFILE이면 앞단 웹 서버가 파일을 직접 보냄
+    """
+    inline = request.args.get('inline', '').lower() in ('1', 'true', 'yes')
     try:
-        return send_file(
-            os.path.join(app.config['OUTPUT_FOLDER'], filename),
-            as_attachment=True,
-            download_name=filename
+        response = send_from_directory(
+            os.path.abspath(app.config['OUTPUT_FOLDER']),
+            filename,
+            as_attachment=not inline,
+            download_name=filename,
+            conditional=True,
+            etag=True,
+            max_age=app.config['DOWNLOAD_MAX_AGE']
         )
+        # 첫 응답부터 Range 지원을 알려 브라우저 플레이어가 바로 구간 요청을 쓰도록 함
+        response.headers['Accept-Ranges'] = 'bytes'
+        return response
     except Exception as e:
         return jsonify({'error': '파일을 찾을 수 없습니다'}), 404
 
+# /files 정렬 가능한 컬럼
+FILE_LIST_SORT_KEYS = {'time': 'uploaded_at', 'size': 'size', 'name': 'filename'}
+
 @app.route('/files')
 def list_files():
-    """업로드된 파일 목록 조회"""
+    """업로드된 파일 목록 조회 (인덱스 기반, 페이지/타입 필터/정렬/ETag 지원)"""
     try:
-        files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.isfile(file_path):
-                # 파일 타입 확인
-                file_type = None
-                if allowed_file(filename, ALLOWED_VIDEO_EXTENSIONS):
-                    file_type = 'video'
-                elif allowed_file(filename, ALLOWED_IMAGE_EXTENSIONS):
-                    file_type = 'image'
-                elif allowed_file(filename, ALLOWED_AUDIO_EXTENSIONS):
-                    file_type = 'audio'
-                
-                files.append({
-                    'filename': filename,
-                    'type': file_type,
-                    'size': os.path.getsize(file_path)
-                })
+        page = max(1, request.args.get('page', 1, type=int))
+        per_page = min(500, max(1, request.args.get('per_page', 100, type=int)))
+        file_type = request.args.get('type')
+        sort = FILE_LIST_SORT_KEYS.get(request.args.get('sort', 'time'), 'uploaded_at')
+        order = 'asc' if request.args.get('order', 'desc') == 'asc' else 'desc'
+        
+        # 목록이 바뀌지 않았으면 304로 응답
+        query = f'{page}:{per_page}:{file_type}:{sort}:{order}'
+        etag = f'files-{media_index.revision()}-{hashlib.md5(query.encode()).hexdigest()[:12]}'
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
         
-        return jsonify({'files': files})
+        files, total = media_index.list_files(file_type, sort, order, per_page, (page - 1) * per_page)
+        response = jsonify({
+            'files': files,
+            'page': page,
+            'per_page': per_page,
+            'total': total
+        })
+        response.set_etag(etag)
+        return response
     
     except Exception as e:
         return jsonify({'error': f'파일 목록을 불러올 수 없습니다: {str(e)}'}), 500
 
+@app.route('/files/<filename>', methods=['DELETE'])
+def delete_file(filename):
+    """업로드 파일 삭제"""
+    filename = secure_filename(filename)
+    if media_index.get(filename) is None and not os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+        return jsonify({'error': '파일을 찾을 수 없습니다'}), 404
+    try:
+        remove_upload(filename)
+        return jsonify({'message': '파일이 삭제되었습니다'})
+    except Exception as e:
+        return jsonify({'error': f'파일 삭제 중 오류가 발생했습니다: {str(e)}'}), 500
+
+def restore_tasks():
+    """서버 시작 시 저장된 작업 상태를 불러오고, 중단된 작업은 대기열에 다시 넣기
+    
+    create_final_video처럼 구간 체크포인트를 쓰는 작업은 마지막으로 끝난 구간 다음부터 이어서 진행됨
+    """
+    since = time.time() - app.config['TASK_STORE_RETENTION_DAYS'] * 86400
+    try:
+        task_store.prune(since)
+        records = task_store.load_tasks(since)
+    except Exception as e:
+        print(f"Warning: 작업 저장소를 읽지 못했습니다: {e}")
+        return
+    
+    resumed = set()
+    for record in records:
+        task_id = record['task_id']
+        if record['status'] not in ('queued', 'running', 'paused'):
+            task_manager.restore_task(record)
+            continue
+        
+        func = globals().get(record['func'])
+        if func is None or record['attempts'] > app.config['TASK_MAX_RESUMES']:
+            # 재시작할 때마다 서버를 멈추게 하는 작업이 반복되지 않도록 횟수 제한
+            task_manager.restore_task(record)
+            task_manager.set_status(task_id, 'error', '서버 재시작 후 작업을 다시 시작하지 못했습니다')
+            continue
+        if render_queue.submit(func, record['data'], task_id, record['type']) is None:
+            task_manager.set_status(task_id, 'error', '대기열이 가득 차 작업을 다시 시작하지 못했습니다')
+            continue
+        resumed.add(task_id)
+        print(f"중단된 작업을 다시 대기열에 넣었습니다: {task_id} ({record['type']})")
+    
+    # 이어서 진행하지 않는 작업의 체크포인트 정리
+    for name in os.listdir(CHECKPOINT_FOLDER):
+        if name not in resumed:
+            shutil.rmtree(os.path.join(CHECKPOINT_FOLDER, name), ignore_errors=True)
+            task_store.clear_checkpoints(name)
+
+# 프로세스 모드 렌더 워커는 요청 스레드에서 처음 작업이 들어올 때가 아니라 모듈을 불러올 때 미리 fork
+# (flask run / WSGI 서버 포함). 모든 함수가 정의된 뒤, 백그라운드 스레드가 lock이나 sqlite 연결을
+# 잡기 전이어야 하므로 아래 인덱싱 스레드보다 먼저 실행. python app.py 리로더의 감시 프로세스는 서버를 띄우지 않으므로 제외
+# 같은 조건에서 이전 실행의 작업 상태를 복원하고 중단된 작업을 다시 대기열에 넣음 (워커를 fork한 뒤)
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    for queue in (render_queue, preview_queue):
+        if queue.executor == 'process':
+            queue.start()
+    restore_tasks()
+
+# 인덱스에 없는 기존 업로드 파일은 백그라운드에서 인덱싱
+threading.Thread(target=sync_media_index, name='media-index-sync', daemon=True).start()
+
 if __name__ == '__main__':
     print("=== MoviePy 웹 비디오 에디터 ===")
     print("✅ MoviePy가 정상적으로 로드되었습니다.")
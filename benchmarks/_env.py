@@ -0,0 +1,34 @@
+"""벤치마크/검사 스크립트 공용 실행 환경
+
+app을 불러오기 전에 prepare_workdir를 호출해야 합니다. app은 불러올 때 sqlite 저장소
+(미디어 인덱스, 작업 저장소, 렌더 캐시)를 열고 중단된 작업을 복원하므로, 저장소 루트의 데이터를
+건드리지 않도록 이 경로들을 임시 작업 디렉터리로 돌립니다.
+"""
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# app 설정 이름 -> 작업 디렉터리 안의 파일 이름
+STORE_PATHS = (
+    ('MEDIA_INDEX_PATH', 'media_index.db'),
+    ('TASK_STORE_PATH', 'tasks.db'),
+    ('RENDER_CACHE_PATH', 'render_cache.db'),
+)
+
+
+def prepare_workdir(prefix, chdir=False):
+    """임시 작업 디렉터리를 만들고 app 저장소 경로를 그 안으로 지정한 뒤 경로를 반환
+
+    환경 변수로 이미 지정한 경로는 그대로 둠. chdir이면 작업 디렉터리로 이동
+    (app의 temp 폴더와 MoviePy 임시 파일이 현재 디렉터리 기준이므로)
+    """
+    workdir = tempfile.mkdtemp(prefix=prefix)
+    for name, filename in STORE_PATHS:
+        os.environ.setdefault(name, os.path.join(workdir, filename))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    if chdir:
+        os.chdir(workdir)
+    return workdir
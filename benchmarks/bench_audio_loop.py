@@ -0,0 +1,85 @@
+"""배경음악 반복 마이크로벤치마크
+
+짧은 음악(기본 3초)을 1~2000번 반복해야 하는 영상 길이에 대해
+기존 방식(concatenate_audioclips([clip] * loops))과
+PCM 버퍼 인덱스 반복 방식(LoopedAudioClip)의 구성 시간과
+타임라인 끝부분 청크 생성 시간을 비교합니다.
+
+사용법 (저장소 루트에서):
+    python benchmarks/bench_audio_loop.py [--jingle 3] [--loops 1 10 100 500 1000 2000]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+
+from _env import prepare_workdir
+
+_workdir = prepare_workdir('bench-audio-loop-')
+
+import app  # noqa: E402
+
+
+def make_jingle(path, seconds):
+    subprocess.run(
+        [app.config.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+         '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}', path],
+        check=True
+    )
+
+
+def render_window(clip, start, seconds, fps=44100, chunksize=2000):
+    """write_audiofile과 같은 크기의 청크로 [start, start + seconds) 구간 샘플 생성"""
+    total = int(seconds * fps)
+    for offset in range(0, total, chunksize):
+        count = min(chunksize, total - offset)
+        tt = start + (offset + np.arange(count)) / fps
+        clip.get_frame(tt)
+
+
+def bench_legacy(jingle_path, duration, window):
+    started = time.perf_counter()
+    audio_clip = app.safe_load_audio(jingle_path)
+    looped = app.fit_audio_to_duration(audio_clip, duration)
+    built = time.perf_counter()
+    render_window(looped, duration - window, window)
+    finished = time.perf_counter()
+    audio_clip.close()
+    return built - started, finished - built
+
+
+def bench_looped(jingle_path, duration, window):
+    started = time.perf_counter()
+    looped = app.load_soundtrack(jingle_path, duration)
+    built = time.perf_counter()
+    render_window(looped, duration - window, window)
+    finished = time.perf_counter()
+    return built - started, finished - built
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jingle', type=float, default=3.0, help='반복할 음악 길이(초)')
+    parser.add_argument('--loops', type=int, nargs='+', default=[1, 10, 100, 500, 1000, 2000])
+    parser.add_argument('--window', type=float, default=2.0, help='측정할 타임라인 끝부분 길이(초)')
+    args = parser.parse_args()
+
+    jingle_path = os.path.join(_workdir, 'jingle.wav')
+    make_jingle(jingle_path, args.jingle)
+
+    print(f"{'loops':>6} {'duration':>9} | {'legacy build':>12} {'legacy mix':>10} | {'looped build':>12} {'looped mix':>10}")
+    for loops in args.loops:
+        duration = args.jingle * loops
+        window = min(args.window, duration)
+        legacy_build, legacy_mix = bench_legacy(jingle_path, duration, window)
+        looped_build, looped_mix = bench_looped(jingle_path, duration, window)
+        print(f"{loops:>6} {duration:>8.0f}s | {legacy_build:>11.3f}s {legacy_mix:>9.3f}s | "
+              f"{looped_build:>11.3f}s {looped_mix:>9.3f}s")
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
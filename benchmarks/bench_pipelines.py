@@ -0,0 +1,272 @@
+"""/process 작업별 렌더 파이프라인 벤치마크
+
+합성 미디어(해상도별 컬러바 영상 + 사인파 오디오, 사인파 배경음악, 이미지)를 로컬에서 만들고
+concatenate / add_audio / add_subtitle / create_final_video 파이프라인 함수를 직접 실행해
+소요 시간, 인코딩 fps(출력 프레임 수 / 소요 시간), 최대 RSS(이 프로세스와 ffmpeg 등 자식 프로세스 합),
+실행한 하위 프로세스 수를 JSON 결과 파일로 기록합니다.
+
+--baseline으로 이전 결과 파일을 주면 항목별로 비교해, 소요 시간이나 최대 RSS가
+--threshold 비율보다 크게 늘어난 항목이 있으면 종료 코드 1로 끝납니다.
+
+사용법 (저장소 루트에서):
+    python benchmarks/bench_pipelines.py [--resolutions 480p 720p] [--duration 5] [--output results.json]
+    python benchmarks/bench_pipelines.py --baseline baseline.json [--threshold 0.2]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from _env import prepare_workdir
+
+_workdir = prepare_workdir('bench-pipelines-')
+
+import app  # noqa: E402
+import moviepy  # noqa: E402
+from PIL import Image  # noqa: E402
+
+RESOLUTIONS = {'360p': (640, 360), '480p': (854, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+OPERATIONS = ['concatenate', 'add_audio', 'add_subtitle', 'create_final_video']
+# 이보다 작은 절대 증가는 측정 잡음으로 보고 회귀로 치지 않음 (짧은 작업의 비율 변동 방지)
+NOISE_FLOOR = {'wall_seconds': 0.1, 'peak_rss_mb': 10.0}
+
+
+class SubprocessCounter:
+    """subprocess.Popen 호출 횟수 집계 (MoviePy와 app 모두 모듈 속성으로 Popen을 찾으므로 교체로 충분)"""
+    def __init__(self):
+        self.count = 0
+        original = subprocess.Popen
+
+        def counting_popen(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+
+        subprocess.Popen = counting_popen
+
+
+class RssSampler:
+    """측정 구간 동안 이 프로세스와 자손 프로세스의 RSS 합을 주기적으로 읽어 최댓값 기록 (/proc 기준)"""
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @staticmethod
+    def rss_kb(pid):
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    @staticmethod
+    def children(pid):
+        pids = []
+        try:
+            for tid in os.listdir(f'/proc/{pid}/task'):
+                with open(f'/proc/{pid}/task/{tid}/children') as f:
+                    pids += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+        return pids
+
+    def sample(self):
+        total, pending = 0, [os.getpid()]
+        while pending:
+            pid = pending.pop()
+            total += self.rss_kb(pid)
+            pending += self.children(pid)
+        self.peak = max(self.peak, total)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+
+
+def ffmpeg(*args):
+    subprocess.run([app.config.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y'] + list(args), check=True)
+
+
+def make_media(folder, resolutions, duration):
+    """해상도별 컬러바 영상 2개(사인파 오디오 포함), 배경음악, 이미지 생성 후 업로드처럼 인덱스에 등록"""
+    files = []
+    for name in resolutions:
+        width, height = RESOLUTIONS[name]
+        for i, source in enumerate(('testsrc2', 'smptebars')):
+            filename = f'{source}_{name}.mp4'
+            ffmpeg('-f', 'lavfi', '-i', f'{source}=size={width}x{height}:rate=24:duration={duration}',
+                   '-f', 'lavfi', '-i', f'sine=frequency={330 + 110 * i}:duration={duration}',
+                   '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+                   os.path.join(folder, filename))
+            files.append((filename, 'video'))
+    ffmpeg('-f', 'lavfi', '-i', f'sine=frequency=220:duration={max(2.0, duration / 2)}',
+           os.path.join(folder, 'music.mp3'))
+    files.append(('music.mp3', 'audio'))
+
+    y, x = np.mgrid[0:1080, 0:1440]
+    img = np.stack([x * 255 // 1440, y * 255 // 1080, (x + y) * 255 // 2520], axis=-1).astype(np.uint8)
+    Image.fromarray(img).save(os.path.join(folder, 'photo.jpg'), quality=90)
+    files.append(('photo.jpg', 'image'))
+
+    for filename, file_type in files:
+        app.index_upload(filename, file_type)
+
+
+def build_cases(resolutions, duration):
+    """(이름, 파이프라인 함수, 요청 데이터) 목록"""
+    cases = []
+    for name in resolutions:
+        first = {'filename': f'testsrc2_{name}.mp4', 'type': 'video'}
+        second = {'filename': f'smptebars_{name}.mp4', 'type': 'video'}
+        image = {'filename': 'photo.jpg', 'type': 'image', 'duration': 2}
+        subtitles = [{'text': '벤치마크 자막', 'start_time': 0, 'end_time': duration / 2},
+                     {'text': 'Benchmark subtitle', 'start_time': duration / 2, 'end_time': duration}]
+        cases += [
+            (f'concatenate-copy-{name}', app.concatenate_media_with_progress,
+             {'files': [first, second]}),
+            (f'concatenate-encode-{name}', app.concatenate_media_with_progress,
+             {'files': [first, image, second]}),
+            (f'add_audio-{name}', app.add_audio_to_video_with_progress,
+             {'files': [first], 'audio_file': 'music.mp3', 'audio_volume': 50}),
+            (f'add_subtitle-{name}', app.add_subtitle_to_video_with_progress,
+             {'video_file': first['filename'], 'subtitle_text': '벤치마크 자막', 'start_time': 0,
+              'end_time': duration / 2}),
+            (f'create_final_video-{name}', app.create_final_video_with_progress,
+             {'files': [first, image, second], 'audio_file': 'music.mp3', 'audio_volume': 50,
+              'subtitles': subtitles, 'output_quality': name if name in app.FINAL_VIDEO_CODEC_SETTINGS else '720p',
+              'video_title': 'bench'}),
+        ]
+    return cases
+
+
+def run_case(name, func, data, counter):
+    task_id = f'bench-{name}'
+    spawned = counter.count
+    started = time.perf_counter()
+    with RssSampler() as sampler:
+        func(data, task_id)
+    elapsed = time.perf_counter() - started
+
+    task = app.task_manager.tasks.get(task_id, {})
+    event = task.get('result_event')
+    if task.get('status') != 'completed' or not event or event[0] != 'task_completed':
+        raise RuntimeError(f'{name} 실패: {task.get("status")} {task.get("message")}')
+    output_path = os.path.join(app.app.config['OUTPUT_FOLDER'], event[1]['output_file'])
+    infos = app.probe_media(output_path)
+    frames = round(infos['duration'] * infos['fps']) if infos['fps'] else 0
+    os.remove(output_path)
+    return {
+        'wall_seconds': round(elapsed, 3),
+        'frames': frames,
+        'encode_fps': round(frames / elapsed, 1) if elapsed else 0.0,
+        'peak_rss_mb': round(sampler.peak / 1024, 1),
+        'subprocesses': counter.count - spawned
+    }
+
+
+def environment():
+    version = subprocess.run([app.config.FFMPEG_BINARY, '-version'], capture_output=True, text=True).stdout
+    return {
+        'python': platform.python_version(),
+        'moviepy': moviepy.__version__,
+        'ffmpeg': version.splitlines()[0] if version else None,
+        'cpu_count': os.cpu_count(),
+        'encoder_profile': app.app.config['ENCODER_PROFILE'],
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+
+def compare(results, baseline, threshold):
+    """기준 결과 대비 소요 시간/최대 RSS 증가율을 출력하고 회귀 항목 목록을 반환"""
+    regressions = []
+    print(f"\n기준 결과와 비교 (허용 증가율 {threshold:.0%})")
+    print(f"{'case':<32} {'wall':>21} {'peak rss':>21}")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"{name:<32} {'(기준 없음)':>17}")
+            continue
+        row = f"{name:<32}"
+        for key in ('wall_seconds', 'peak_rss_mb'):
+            change = result[key] / base[key] - 1 if base[key] else 0.0
+            regressed = change > threshold and result[key] - base[key] > NOISE_FLOOR[key]
+            row += f" {base[key]:>7.2f}->{result[key]:>7.2f}{'!' if regressed else ' '}{change:>+5.0%}"
+            if regressed:
+                regressions.append((name, key, change))
+        print(row)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--resolutions', nargs='+', default=['480p', '720p'], choices=list(RESOLUTIONS))
+    parser.add_argument('--duration', type=float, default=5.0, help='합성 영상 길이(초)')
+    parser.add_argument('--operations', nargs='+', default=OPERATIONS, choices=OPERATIONS)
+    parser.add_argument('--output', default='bench_results.json', help='결과 JSON 파일')
+    parser.add_argument('--baseline', help='비교할 이전 결과 JSON 파일')
+    parser.add_argument('--threshold', type=float, default=0.2, help='회귀로 볼 증가율 (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    upload_dir = os.path.join(_workdir, 'uploads')
+    output_dir = os.path.join(_workdir, 'outputs')
+    os.makedirs(upload_dir)
+    os.makedirs(output_dir)
+    app.app.config['UPLOAD_FOLDER'] = upload_dir
+    app.app.config['OUTPUT_FOLDER'] = output_dir
+
+    print(f"합성 미디어 생성 중... ({_workdir})")
+    make_media(upload_dir, args.resolutions, args.duration)
+
+    counter = SubprocessCounter()
+    results = {}
+    print(f"{'case':<32} {'wall':>8} {'frames':>7} {'fps':>7} {'peak rss':>9} {'procs':>6}")
+    for name, func, data in build_cases(args.resolutions, args.duration):
+        if not any(name.startswith(operation) for operation in args.operations):
+            continue
+        result = run_case(name, func, data, counter)
+        results[name] = result
+        print(f"{name:<32} {result['wall_seconds']:>7.2f}s {result['frames']:>7} {result['encode_fps']:>7.1f} "
+              f"{result['peak_rss_mb']:>7.1f}MB {result['subprocesses']:>6}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'environment': environment(), 'duration': args.duration, 'results': results},
+                  f, ensure_ascii=False, indent=2)
+    print(f"\n결과 저장: {args.output}")
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n회귀 {len(regressions)}건:")
+            for name, key, change in regressions:
+                print(f"  {name} {key} {change:+.0%}")
+            sys.exit(1)
+        print("\n회귀 없음")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""이미지 슬라이드쇼 인코딩 벤치마크
+
+합성 이미지(기본 100장)로 만든 슬라이드쇼를
+기존 프레임 단위 경로(build_final_timeline + write_videofile)와
+정지 화면 전용 경로(render_still_slideshow)로 각각 인코딩해 소요 시간을 비교합니다.
+
+사용법 (저장소 루트에서):
+    python benchmarks/bench_slideshow.py [--images 100] [--duration 2] [--quality 720p]
+"""
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+
+from _env import prepare_workdir
+
+_workdir = prepare_workdir('bench-slideshow-')
+
+import app  # noqa: E402
+from PIL import Image  # noqa: E402
+
+
+def make_images(folder, count):
+    """크기와 형식이 섞인 사진 대용 이미지 생성 (가로/세로 JPEG, 투명 PNG)"""
+    rng = np.random.default_rng(0)
+    sizes = [(1920, 1080), (1080, 1350), (1600, 1200)]
+    files = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        y, x = np.mgrid[0:height, 0:width]
+        base = rng.integers(0, 255, 3)
+        img = np.stack([(x * 255 // width + base[0]) % 256,
+                        (y * 255 // height + base[1]) % 256,
+                        ((x + y) * 255 // (width + height) + base[2]) % 256], axis=-1).astype(np.uint8)
+        img = np.clip(img.astype(np.int16) + rng.integers(-12, 12, img.shape), 0, 255).astype(np.uint8)
+        if i % 10 == 9:
+            filename = f'photo_{i:03d}.png'
+            alpha = np.full((height, width, 1), 255, dtype=np.uint8)
+            alpha[: height // 4] = 128
+            Image.fromarray(np.concatenate([img, alpha], axis=-1)).save(os.path.join(folder, filename))
+        else:
+            filename = f'photo_{i:03d}.jpg'
+            Image.fromarray(img).save(os.path.join(folder, filename), quality=90)
+        files.append(filename)
+    return files
+
+
+def bench_frame_path(data, output_path):
+    task_id = 'bench-frames'
+    app.task_manager.create_task(task_id, 'benchmark')
+    started = time.perf_counter()
+    with app.TaskResources(task_id) as resources:
+        final_clip = app.build_final_timeline(data, task_id, resources)
+        app.safe_write_videofile(final_clip, output_path, bitrate=app.get_output_setting(data)['bitrate'])
+        elapsed = time.perf_counter() - started
+    return elapsed
+
+
+def bench_still_path(data, output_path):
+    task_id = 'bench-still'
+    app.task_manager.create_task(task_id, 'benchmark')
+    setting = app.get_output_setting(data)
+    started = time.perf_counter()
+    finished = app.render_still_slideshow(
+        data['files'], output_path, task_id, (0, 100),
+        output_size=(setting['width'], setting['height']), bitrate=setting['bitrate']
+    )
+    elapsed = time.perf_counter() - started
+    assert finished, "정지 화면 전용 경로를 적용하지 못했습니다"
+    return elapsed
+
+
+def frame_count(path):
+    infos = app.probe_media(path)
+    return round(infos['duration'] * infos['fps'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=2.0, help='이미지 한 장의 표시 시간(초)')
+    parser.add_argument('--quality', default='720p', choices=['480p', '720p', '1080p'])
+    args = parser.parse_args()
+
+    upload_dir = os.path.join(_workdir, 'uploads')
+    os.makedirs(upload_dir)
+    app.app.config['UPLOAD_FOLDER'] = upload_dir
+    print(f"이미지 {args.images}장 생성 중... ({_workdir})")
+    filenames = make_images(upload_dir, args.images)
+    data = {
+        'files': [{'filename': name, 'type': 'image', 'duration': args.duration} for name in filenames],
+        'output_quality': args.quality
+    }
+
+    # 두 경로 모두 같은 디코딩 캐시 상태에서 시작하도록 각각 비운 뒤 측정
+    app.clip_pool.images.clear()
+    app.clip_pool.image_bytes = 0
+    frame_output = os.path.join(_workdir, 'frames.mp4')
+    frame_seconds = bench_frame_path(data, frame_output)
+
+    app.clip_pool.images.clear()
+    app.clip_pool.image_bytes = 0
+    still_output = os.path.join(_workdir, 'still.mp4')
+    still_seconds = bench_still_path(data, still_output)
+
+    total = args.images * args.duration
+    print(f"슬라이드쇼 {args.images}장 x {args.duration}초 = {total:.0f}초, {args.quality}")
+    print(f"{'path':<12} {'time':>9} {'frames':>7} {'size':>9}")
+    for name, seconds, path in (('frame', frame_seconds, frame_output), ('still', still_seconds, still_output)):
+        print(f"{name:<12} {seconds:>8.2f}s {frame_count(path):>7} {os.path.getsize(path) / 1e6:>7.2f}MB")
+    print(f"speedup: {frame_seconds / still_seconds:.1f}x")
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""작업 진행상황 이벤트 전송 벤치마크
+
+여러 렌더 작업이 동시에 진행상황을 보고할 때, 기존 방식(lock 안에서 모든 클라이언트에게
+즉시 broadcast)과 작업 방 + 전용 전송 스레드 + 작업별 전송 빈도 제한 방식을 비교합니다.
+실제 소켓 대신 수신자 한 명당 일정 시간이 걸리는 가짜 emit을 사용하고,
+클라이언트에게 전달된 메시지 수와 TaskManager lock 점유 시간을 측정합니다.
+
+사용법 (저장소 루트에서):
+    python benchmarks/bench_task_events.py [--tasks 4] [--updates 2000] [--clients 200]
+"""
+import argparse
+import os
+import shutil
+import threading
+import time
+
+from _env import prepare_workdir
+
+_workdir = prepare_workdir('bench-task-events-')
+
+import app  # noqa: E402
+
+
+class TimedLock:
+    """RLock을 감싸 가장 바깥쪽 획득부터 해제까지의 점유 시간을 기록"""
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.holds = []
+
+    def __enter__(self):
+        self.lock.acquire()
+        depth = getattr(self.local, 'depth', 0)
+        if depth == 0:
+            self.local.started = time.perf_counter()
+        self.local.depth = depth + 1
+        return self
+
+    def __exit__(self, *exc):
+        self.local.depth -= 1
+        if self.local.depth == 0:
+            self.holds.append(time.perf_counter() - self.local.started)
+        self.lock.release()
+
+
+class LegacyTaskManager(app.TaskManager):
+    """변경 전 동작: lock을 잡은 채로 모든 클라이언트에게 바로 broadcast"""
+    def update_progress(self, task_id, current_step, message=""):
+        with self.lock:
+            if task_id in self.tasks:
+                task = self.tasks[task_id]
+                task['current_step'] = current_step
+                task['progress'] = int((current_step / task['total_steps']) * 100)
+                if message:
+                    task['message'] = message
+                app.socketio.emit('task_progress', self.progress_event(task_id))
+
+    def set_status(self, task_id, status, message=""):
+        with self.lock:
+            if task_id in self.tasks:
+                self.tasks[task_id]['status'] = status
+                app.socketio.emit('task_status', {'task_id': task_id, 'status': status, 'message': message})
+
+
+class FakeSocketIO:
+    """수신자 수에 비례해 시간이 걸리는 emit (room 지정 시 그 작업을 보는 클라이언트만 수신)"""
+    def __init__(self, clients, per_client_seconds):
+        self.clients = clients
+        self.per_client_seconds = per_client_seconds
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.deliveries = 0
+
+    def emit(self, event, data=None, to=None, **kwargs):
+        recipients = 1 if to else self.clients
+        deadline = time.perf_counter() + recipients * self.per_client_seconds
+        while time.perf_counter() < deadline:
+            pass
+        with self.lock:
+            self.messages += 1
+            self.deliveries += recipients
+
+
+def run(manager, fake, tasks, updates, interval):
+    manager.lock = TimedLock()
+    task_ids = [f'bench-{i}' for i in range(tasks)]
+    for task_id in task_ids:
+        manager.create_task(task_id, 'benchmark', updates)
+
+    def worker(task_id):
+        for step in range(1, updates + 1):
+            manager.update_progress(task_id, step, f"프레임 {step}")
+            if interval:
+                time.sleep(interval)
+        manager.set_status(task_id, 'completed', '작업이 완료되었습니다')
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(task_id,)) for task_id in task_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    producer_seconds = time.perf_counter() - started
+    # 전용 전송 스레드가 남은 이벤트를 모두 보낼 때까지 대기
+    while manager.events.stats()['pending'] or fake.messages < manager.events.stats()['emitted']:
+        time.sleep(0.01)
+    holds = sorted(manager.lock.holds)
+    return {
+        'producer': producer_seconds,
+        'messages': fake.messages,
+        'deliveries': fake.deliveries,
+        'hold_total': sum(holds),
+        'hold_p99': holds[int(len(holds) * 0.99) - 1] if holds else 0.0,
+        'hold_max': holds[-1] if holds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=4, help='동시에 진행되는 작업 수')
+    parser.add_argument('--updates', type=int, default=2000, help='작업당 진행상황 보고 횟수')
+    parser.add_argument('--interval', type=float, default=0.002, help='보고 간격(초), 인코딩 프레임 간격에 해당')
+    parser.add_argument('--clients', type=int, default=200, help='접속한 대시보드 수')
+    parser.add_argument('--per-client-us', type=float, default=20.0, help='수신자 한 명에게 보내는 비용(마이크로초)')
+    args = parser.parse_args()
+
+    results = {}
+    for name, manager_class in (('before', LegacyTaskManager), ('after', app.TaskManager)):
+        fake = FakeSocketIO(args.clients, args.per_client_us / 1e6)
+        app.socketio = fake
+        results[name] = run(manager_class(), fake, args.tasks, args.updates, args.interval)
+
+    print(f"작업 {args.tasks}개 x 진행상황 {args.updates}회, 대시보드 {args.clients}개, "
+          f"전송 비용 {args.per_client_us:.0f}us/수신자, 작업당 최대 {app.app.config['TASK_PROGRESS_RATE']:g}회/초")
+    print(f"{'':<8} {'wall':>8} {'emits':>7} {'deliveries':>11} {'lock total':>11} {'lock p99':>9} {'lock max':>9}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['producer']:>7.2f}s {result['messages']:>7} {result['deliveries']:>11} "
+              f"{result['hold_total'] * 1000:>9.1f}ms {result['hold_p99'] * 1e6:>7.0f}us {result['hold_max'] * 1e6:>7.0f}us")
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
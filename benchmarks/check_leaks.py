@@ -0,0 +1,282 @@
+"""렌더 파이프라인 자원 누수 검사
+
+합성 미디어로 파이프라인 함수를 정상 완료, 로딩 중 취소, 인코딩 중 취소(단일/구간 병렬),
+인코딩 중 오류, 입력 파일 누락 상황에서 실행한 뒤 매번 다음을 확인합니다.
+
+- 클립 풀에서 빌린 채 반납되지 않은 리더가 없는지
+- 풀에서 쉬고 있는 리더의 ffmpeg를 제외하고 남아 있는 하위 프로세스가 없는지
+- 회수되지 않은 좀비 프로세스가 없는지
+- 작업 디렉터리, temp 폴더, 출력 폴더에 새 파일(임시 오디오, 중단된 출력 등)이 남지 않았는지
+  (완료된 작업의 결과 파일은 제외)
+
+스크립트는 임시 디렉터리로 이동해 app을 불러오므로 저장소에는 파일을 만들지 않습니다.
+마지막으로 풀을 비운 뒤 열린 파일 디스크립터 수가 처음과 같은지 확인하고,
+누수가 하나라도 있으면 종료 코드 1로 끝납니다.
+
+사용법 (저장소 루트에서):
+    python benchmarks/check_leaks.py [--duration 6]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from _env import prepare_workdir
+
+# MoviePy 기본 임시 파일과 app의 temp 폴더가 현재 디렉터리 기준이므로 임시 디렉터리에서 실행
+_workdir = prepare_workdir('check-leaks-', chdir=True)
+
+import app  # noqa: E402
+
+
+def ffmpeg(*args):
+    subprocess.run([app.config.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y'] + list(args), check=True)
+
+
+def make_media(folder, duration):
+    """컬러바 영상 2개(사인파 오디오 포함), 배경음악, 이미지 생성 후 업로드처럼 인덱스에 등록"""
+    files = []
+    for i, source in enumerate(('testsrc2', 'smptebars')):
+        filename = f'{source}.mp4'
+        ffmpeg('-f', 'lavfi', '-i', f'{source}=size=640x360:rate=24:duration={duration}',
+               '-f', 'lavfi', '-i', f'sine=frequency={330 + 110 * i}:duration={duration}',
+               '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+               os.path.join(folder, filename))
+        files.append((filename, 'video'))
+    ffmpeg('-f', 'lavfi', '-i', 'sine=frequency=220:duration=2', os.path.join(folder, 'music.mp3'))
+    files.append(('music.mp3', 'audio'))
+    ffmpeg('-f', 'lavfi', '-i', 'testsrc=size=800x600', '-frames:v', '1', os.path.join(folder, 'photo.png'))
+    files.append(('photo.png', 'image'))
+    for filename, file_type in files:
+        app.index_upload(filename, file_type)
+
+
+def final_video_data(duration, **extra):
+    return {
+        'files': [{'filename': 'testsrc2.mp4', 'type': 'video'},
+                  {'filename': 'photo.png', 'type': 'image', 'duration': 1},
+                  {'filename': 'smptebars.mp4', 'type': 'video'}],
+        'audio_file': 'music.mp3',
+        'subtitles': [{'text': '누수 검사', 'start_time': 0, 'end_time': duration / 2},
+                      {'text': 'leak check', 'start_time': duration / 2, 'end_time': duration}],
+        'output_quality': '480p',
+        **extra
+    }
+
+
+# 실행 중 개입: 작업 ID를 받아 준비하고, 끝난 뒤 되돌릴 함수(없으면 None)를 반환
+
+def cancel_when_encoding(task_id):
+    """인코딩이 시작되면 잠시 뒤 작업을 취소"""
+    def watch():
+        deadline = time.time() + 60
+        while app.active_encodes.value == 0 and time.time() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.5)
+        app.task_manager.cancel_task(task_id)
+
+    threading.Thread(target=watch, daemon=True).start()
+    return None
+
+
+def cancel_on_subtitle(task_id):
+    """첫 자막을 만드는 순간 취소 (파일을 모두 불러온 뒤 타임라인 구성 중간에 빠져나가는 경로)"""
+    original = app.rasterize_subtitle
+
+    def rasterize_and_cancel(*args, **kwargs):
+        app.task_manager.cancel_task(task_id)
+        return original(*args, **kwargs)
+
+    app.rasterize_subtitle = rasterize_and_cancel
+    return lambda: setattr(app, 'rasterize_subtitle', original)
+
+
+def fail_while_encoding(task_id):
+    """오디오를 임시 파일로 다 쓰고 영상 프레임을 몇 개 인코딩한 뒤 진행 로거에서 예외를 발생시킴"""
+    original = app.TaskProgressLogger.bars_callback
+    calls = {'count': 0}
+
+    def callback_and_fail(self, bar, attr, value, old_value=None):
+        if bar == 'frame_index' and attr == 'index':
+            calls['count'] += 1
+            if calls['count'] > 10:
+                raise RuntimeError('누수 검사용 인코딩 오류')
+        return original(self, bar, attr, value, old_value)
+
+    app.TaskProgressLogger.bars_callback = callback_and_fail
+    return lambda: setattr(app.TaskProgressLogger, 'bars_callback', original)
+
+
+def build_cases(duration):
+    """(이름, 파이프라인 함수, 요청 데이터, 실행 중 개입, 기대 상태) 목록"""
+    both_videos = [{'filename': 'testsrc2.mp4', 'type': 'video'}, {'filename': 'smptebars.mp4', 'type': 'video'}]
+    return [
+        ('concatenate', app.concatenate_media_with_progress,
+         {'files': [both_videos[0], {'filename': 'photo.png', 'type': 'image', 'duration': 1}]}, None, 'completed'),
+        ('add_audio', app.add_audio_to_video_with_progress,
+         {'files': both_videos, 'audio_file': 'music.mp3'}, None, 'completed'),
+        ('add_subtitle', app.add_subtitle_to_video_with_progress,
+         {'video_file': 'testsrc2.mp4', 'subtitle_text': '누수 검사', 'start_time': 0, 'end_time': 2}, None, 'completed'),
+        ('final', app.create_final_video_with_progress, final_video_data(duration), None, 'completed'),
+        ('final-segments', app.create_final_video_with_progress, final_video_data(duration, segments=2), None, 'completed'),
+        ('final-cancel-build', app.create_final_video_with_progress, final_video_data(duration),
+         cancel_on_subtitle, 'cancelled'),
+        ('final-cancel-encode', app.create_final_video_with_progress, final_video_data(duration),
+         cancel_when_encoding, 'cancelled'),
+        ('final-segments-cancel', app.create_final_video_with_progress, final_video_data(duration, segments=2),
+         cancel_when_encoding, 'cancelled'),
+        ('concatenate-cancel', app.concatenate_media_with_progress,
+         {'files': [both_videos[0], {'filename': 'photo.png', 'type': 'image', 'duration': 1}]},
+         cancel_when_encoding, 'cancelled'),
+        ('add_audio-error', app.add_audio_to_video_with_progress,
+         {'files': both_videos, 'audio_file': 'music.mp3'}, fail_while_encoding, 'error'),
+        ('final-missing-input', app.create_final_video_with_progress,
+         {'files': both_videos + [{'filename': 'missing.mp4', 'type': 'video'}], 'output_quality': '480p'},
+         None, 'error'),
+    ]
+
+
+def pool_reader_pids():
+    """풀에서 쉬고 있는 리더가 쓰는 ffmpeg pid (재사용을 위해 살아 있어야 하는 프로세스)"""
+    pids = set()
+    with app.clip_pool.lock:
+        clips = [clip for _, clip, _ in app.clip_pool.idle_readers.values()]
+    for clip in clips:
+        for reader in (getattr(clip, 'reader', None), getattr(getattr(clip, 'audio', None), 'reader', None)):
+            process = getattr(reader, 'proc', None)
+            if process is not None and process.poll() is None:
+                pids.add(process.pid)
+    return pids
+
+
+def zombie_children():
+    zombies = []
+    try:
+        for tid in os.listdir(f'/proc/{os.getpid()}/task'):
+            with open(f'/proc/{os.getpid()}/task/{tid}/children') as f:
+                for pid in f.read().split():
+                    status = app.read_proc_status(int(pid))
+                    if status is not None and status[1] == 'Z':
+                        zombies.append(int(pid))
+    except OSError:
+        pass
+    return zombies
+
+
+def scratch_files():
+    """작업 디렉터리(최상위), temp 폴더와 출력 폴더(하위 폴더 포함)에 있는 파일 경로"""
+    files = {os.path.abspath(name) for name in os.listdir('.') if os.path.isfile(name)}
+    for folder in (app.config.TEMP_FOLDER, app.app.config['OUTPUT_FOLDER']):
+        for root, _, names in os.walk(folder):
+            files.update(os.path.join(root, name) for name in names)
+    return files
+
+
+def result_file(task_id):
+    """완료된 작업의 결과 파일 경로 (없으면 None)"""
+    event = app.task_manager.tasks[task_id].get('result_event')
+    if not event or event[0] != 'task_completed' or 'output_file' not in event[1]:
+        return None
+    return os.path.abspath(os.path.join(app.app.config['OUTPUT_FOLDER'], event[1]['output_file']))
+
+
+def leftovers():
+    """(빌린 채 남은 리더 수, 풀 밖에 남은 하위 프로세스 [(pid, 이름)], 좀비 pid 목록)"""
+    # 방금 종료 신호를 받은 프로세스가 정리될 시간을 잠깐 줌
+    deadline = time.time() + 2
+    while True:
+        allowed = pool_reader_pids()
+        extra = [(pid, name) for pid, name, _ in app.process_tree() if pid not in allowed]
+        zombies = zombie_children()
+        if (not extra and not zombies) or time.time() > deadline:
+            return app.clip_pool.stats()['readers_in_use'], extra, zombies
+        time.sleep(0.1)
+
+
+def run_case(index, name, func, data, intervene):
+    """(작업 상태, 남은 새 파일 목록) - 완료된 작업의 결과 파일은 확인 후 삭제"""
+    task_id = f'leak-{index}-{name}'
+    before = scratch_files()
+    app.task_manager.create_task(task_id, name, status='queued')
+    restore = intervene(task_id) if intervene is not None else None
+    try:
+        func(data, task_id)
+    finally:
+        if restore is not None:
+            restore()
+    output = result_file(task_id)
+    if output is not None and os.path.exists(output):
+        os.remove(output)
+    files = sorted(os.path.relpath(path, _workdir) for path in scratch_files() - before - {output})
+    return app.task_manager.tasks[task_id]['status'], files
+
+
+def open_fds():
+    return len(os.listdir(f'/proc/{os.getpid()}/fd'))
+
+
+def drain_pool():
+    with app.clip_pool.lock:
+        idle = [clip for _, clip, _ in app.clip_pool.idle_readers.values()]
+        app.clip_pool.idle_readers.clear()
+    app.clip_pool._close_all(idle)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=6.0, help='합성 영상 길이(초)')
+    args = parser.parse_args()
+
+    upload_dir = os.path.join(_workdir, 'uploads')
+    output_dir = os.path.join(_workdir, 'outputs')
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    app.app.config['UPLOAD_FOLDER'] = upload_dir
+    app.app.config['OUTPUT_FOLDER'] = output_dir
+    # 짧은 합성 영상에서도 구간 병렬 경로를 타도록 구간 최소 길이를 낮춤
+    app.app.config['SEGMENT_MIN_DURATION'] = 1
+    print(f"합성 미디어 생성 중... ({_workdir})")
+    make_media(upload_dir, args.duration)
+
+    cases = build_cases(args.duration)
+    # 연결/캐시 초기화가 끝난 상태를 기준으로 파일 디스크립터 수를 비교
+    run_case(0, 'warmup', *cases[0][1:4])
+    # 렌더 캐시는 최종 영상 작업에서 처음 연결되므로 미리 열어 둠 (작업 내내 유지되는 연결)
+    with app.render_cache.lock:
+        app.render_cache.connect()
+    drain_pool()
+    baseline_fds = open_fds()
+
+    leaks = []
+    print(f"{'case':<24} {'status':<10} {'leased':>6} {'procs':>6} {'zombies':>8} {'files':>6}")
+    for index, (name, func, data, intervene, expected) in enumerate(cases, start=1):
+        status, files = run_case(index, name, func, data, intervene)
+        leased, extra, zombies = leftovers()
+        print(f"{name:<24} {status:<10} {leased:>6} {len(extra):>6} {len(zombies):>8} {len(files):>6}"
+              f"{'' if status == expected else f'  (예상 상태 {expected})'}")
+        if leased or extra or zombies or files:
+            leaks.append((name, leased, extra, zombies, files))
+
+    drain_pool()
+    fds = open_fds()
+    killed = sum(app.metrics.metrics['video_editor_leaked_processes_total']['series'].values())
+    print(f"\n열린 파일 디스크립터: {baseline_fds} -> {fds}")
+    print(f"작업이 끝날 때 강제로 정리된 하위 프로세스: {int(killed)}")
+    os.chdir(os.path.dirname(_workdir))
+    shutil.rmtree(_workdir, ignore_errors=True)
+
+    if fds > baseline_fds:
+        leaks.append(('file descriptors', fds - baseline_fds, [], [], []))
+    if leaks:
+        print(f"\n누수 {len(leaks)}건:")
+        for name, leased, extra, zombies, files in leaks:
+            print(f"  {name}: 빌린 리더 {leased}, 남은 프로세스 {extra}, 좀비 {zombies}, 남은 파일 {files}")
+        sys.exit(1)
+    print("\n누수 없음")
+
+
+if __name__ == '__main__':
+    main()
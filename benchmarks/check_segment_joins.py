@@ -0,0 +1,137 @@
+"""구간 렌더링 이음새 검사
+
+합성 미디어로 create_final_video를 체크포인트 구간 경로(순서대로 인코딩)와 구간 병렬 경로로 실행하고
+한 번에 인코딩한 결과와 비교해 다음을 확인합니다.
+
+- 구간을 이어붙인 결과에서 모든 구간 시작 시각이 키프레임인지
+- 한 번의 인코딩으로 대체(SegmentJoinError)되지 않았는지
+- 길이와 프레임 수가 한 번에 인코딩한 결과와 같은지
+
+하나라도 어긋나면 종료 코드 1로 끝납니다.
+
+사용법 (저장소 루트에서):
+    python benchmarks/check_segment_joins.py [--duration 8] [--segment 3]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+from _env import prepare_workdir
+
+# app의 temp 폴더가 현재 디렉터리 기준이므로 임시 디렉터리에서 실행
+_workdir = prepare_workdir('check-segment-joins-', chdir=True)
+
+import app  # noqa: E402
+
+
+def ffmpeg(*args):
+    subprocess.run([app.config.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y'] + list(args), check=True)
+
+
+def make_media(folder, duration):
+    """컬러바 영상 2개(사인파 오디오 포함)와 배경음악 생성 후 업로드처럼 인덱스에 등록"""
+    files = []
+    for i, source in enumerate(('testsrc2', 'smptebars')):
+        filename = f'{source}.mp4'
+        ffmpeg('-f', 'lavfi', '-i', f'{source}=size=640x360:rate=24:duration={duration / 2}',
+               '-f', 'lavfi', '-i', f'sine=frequency={330 + 110 * i}:duration={duration / 2}',
+               '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+               os.path.join(folder, filename))
+        files.append((filename, 'video'))
+    ffmpeg('-f', 'lavfi', '-i', 'sine=frequency=220:duration=2', os.path.join(folder, 'music.mp3'))
+    files.append(('music.mp3', 'audio'))
+    for filename, file_type in files:
+        app.index_upload(filename, file_type)
+
+
+def render(name, segment_duration, segments):
+    """(출력 경로, 구간 시작 시각 목록, 대체 여부) - 구간 길이 0이면 한 번에 인코딩"""
+    app.app.config['CHECKPOINT_SEGMENT_DURATION'] = segment_duration
+    data = {
+        'files': [{'filename': 'testsrc2.mp4', 'type': 'video'}, {'filename': 'smptebars.mp4', 'type': 'video'}],
+        'audio_file': 'music.mp3',
+        'subtitles': [{'text': '이음새 검사', 'start_time': 0, 'end_time': 2}],
+        'output_quality': '480p',
+        'segments': segments
+    }
+    joins, fallbacks = [], []
+    original_verify, original_write = app.verify_segment_joins, app.safe_write_videofile
+
+    def verify(output_path, join_times, fps):
+        joins.extend(join_times)
+        return original_verify(output_path, join_times, fps)
+
+    def write(clip, output_path, *args, **kwargs):
+        # 구간 경로에서 최종 출력 파일을 직접 인코딩하면 한 번의 인코딩으로 대체된 것
+        if segment_duration and output_path.startswith(app.app.config['OUTPUT_FOLDER']):
+            fallbacks.append(output_path)
+        return original_write(clip, output_path, *args, **kwargs)
+
+    app.verify_segment_joins, app.safe_write_videofile = verify, write
+    task_id = f'joins-{name}'
+    try:
+        app.task_manager.create_task(task_id, name, status='queued')
+        app.create_final_video_with_progress(data, task_id)
+    finally:
+        app.verify_segment_joins, app.safe_write_videofile = original_verify, original_write
+    task = app.task_manager.tasks[task_id]
+    if task['status'] != 'completed':
+        raise RuntimeError(f'{name} 실패: {task["status"]} {task["message"]}')
+    output_path = os.path.join(app.app.config['OUTPUT_FOLDER'], task['result_event'][1]['output_file'])
+    return output_path, joins, bool(fallbacks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=8.0, help='합성 타임라인 길이(초)')
+    parser.add_argument('--segment', type=float, default=3.0, help='체크포인트 구간 길이(초)')
+    args = parser.parse_args()
+
+    upload_dir = os.path.join(_workdir, 'uploads')
+    output_dir = os.path.join(_workdir, 'outputs')
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    app.app.config['UPLOAD_FOLDER'] = upload_dir
+    app.app.config['OUTPUT_FOLDER'] = output_dir
+    app.app.config['SEGMENT_MIN_DURATION'] = 1
+    print(f"합성 미디어 생성 중... ({_workdir})")
+    make_media(upload_dir, args.duration)
+
+    reference, _, _ = render('single', 0, 1)
+    expected = app.probe_media(reference)
+    problems = []
+    print(f"{'case':<12} {'joins':>6} {'keyframes':>10} {'duration':>9} {'frames':>7} {'fallback':>9}")
+    print(f"{'single':<12} {'-':>6} {'-':>10} {expected['duration']:>8.2f}s "
+          f"{round(expected['duration'] * expected['fps']):>7} {'-':>9}")
+    for name, segments in (('checkpoint', 1), ('parallel', 2)):
+        output_path, joins, fallback = render(name, args.segment, segments)
+        infos = app.probe_media(output_path)
+        keyframes = app.read_keyframe_times(output_path)
+        tolerance = 0.5 / infos['fps']
+        aligned = sum(1 for t in joins if any(abs(k - t) <= tolerance for k in keyframes))
+        frames = round(infos['duration'] * infos['fps'])
+        print(f"{name:<12} {len(joins):>6} {aligned:>10} {infos['duration']:>8.2f}s {frames:>7} "
+              f"{'yes' if fallback else 'no':>9}")
+        if not joins:
+            problems.append(f'{name}: 구간 경로를 타지 않음')
+        if aligned != len(joins):
+            problems.append(f'{name}: 키프레임이 아닌 구간 경계 {len(joins) - aligned}곳')
+        if fallback:
+            problems.append(f'{name}: 한 번의 인코딩으로 대체됨')
+        if frames != round(expected['duration'] * expected['fps']) or abs(infos['duration'] - expected['duration']) > tolerance * 2:
+            problems.append(f"{name}: 길이 {infos['duration']:.3f}s / 기대 {expected['duration']:.3f}s")
+
+    os.chdir(os.path.dirname(_workdir))
+    shutil.rmtree(_workdir, ignore_errors=True)
+    if problems:
+        print(f"\n문제 {len(problems)}건:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("\n모든 구간 경계가 키프레임에 있음")
+
+
+if __name__ == '__main__':
+    main()